@@ -0,0 +1,60 @@
+"""
+Benchmark: record hashing, canonical encoder (orjson fast path and stdlib
+reference) vs the json.dumps(default=str) hashing it replaced.
+
+Run from backend/: python -m benchmarks.bench_canonical
+"""
+
+import hashlib
+import json
+import timeit
+from datetime import datetime, timezone
+
+from services import canonical
+
+
+def legacy_hash(data) -> str:
+    """calculate_hash before the canonical encoder"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def stdlib_hash(data) -> str:
+    saved, canonical.orjson = canonical.orjson, None
+    try:
+        return canonical.canonical_hash(data)
+    finally:
+        canonical.orjson = saved
+
+
+def sample_documents() -> dict:
+    now = datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc)
+    event = {
+        "id": "COLL-1A2B3C4D", "product_id": "BATCH-9F8E7D6C", "collector_id": "farmer-17",
+        "collector_name": "Lakshmi Devi", "species_name": "Withania somnifera", "latitude": 12.9716,
+        "longitude": 77.5946, "quantity_kg": 12.5, "quality_grade": "A", "organic_certified": True,
+        "location_name": "मैसूर", "timestamp": now
+    }
+    product = {
+        "id": "PROD-1", "batch_id": "BATCH-9F8E7D6C", "product_name": "Ashwagandha Churna",
+        "ingredients": [{"species": f"herb-{i}", "share": i / 20} for i in range(20)],
+        "source_collections": [f"COLL-{i:08d}" for i in range(50)], "manufacturing_date": now, "mrp": 249.0
+    }
+    return {"collection event": event, "product": product, "trace (200 events)": {"events": [event] * 200}}
+
+
+def main(number: int = 5000) -> None:
+    if canonical.orjson is None:
+        print("orjson not installed: canonical_hash uses the stdlib encoder")
+    print(f"{'document':<20} {'legacy us':>10} {'stdlib us':>10} {'orjson us':>10}")
+    for name, document in sample_documents().items():
+        runs = max(number // (50 if "trace" in name else 1), 10)
+        timings = [
+            timeit.timeit(lambda: hash_function(document), number=runs) / runs * 1e6
+            for hash_function in (legacy_hash, stdlib_hash, canonical.canonical_hash)
+        ]
+        assert stdlib_hash(document) == canonical.canonical_hash(document)
+        print(f"{name:<20} {timings[0]:>10.1f} {timings[1]:>10.1f} {timings[2]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Microbenchmark: peer invoke output decoding, decode_invoke_result (what the
+CLI backend calls) vs the find/rfind + str.replace parsing it replaced.
+Timings are the best of 15 runs, to keep scheduler noise out.
+
+Run from backend/: python -m benchmarks.bench_fabric_decoder
+"""
+
+import json
+import timeit
+
+from services.fabric_decoder import decode_invoke_result
+from tests.test_fabric_decoder import invoke_output
+
+
+def legacy_parse(output: str):
+    """The pre-decoder parsing from fabric_backends (kept here for comparison)"""
+    if "payload:" in output:
+        payload_start = output.find('payload:"') + 9
+        payload_end = output.rfind('"')
+        if payload_start > 8 and payload_end > payload_start:
+            payload = output[payload_start:payload_end]
+            payload = payload.replace('\\"', '"').replace('\\n', '\n')
+            try:
+                return json.loads(payload)
+            except ValueError:
+                return {"raw": payload}
+    return {"success": True, "output": output}
+
+
+def best_of(call, number: int) -> float:
+    """Microseconds per call, best of 15 runs"""
+    return min(timeit.repeat(call, number=number, repeat=15)) / number * 1e6
+
+
+def main(number: int = 20000) -> None:
+    cases = {
+        "ascii": {"id": "COLL-1", "species": "Tulsi", "quantity_kg": 12.5},
+        "hindi": {"id": "PROD-1", "name": "अश्वगंधा चूर्ण", "notes": "मैसूर"},
+        "nested": {"id": "QT-1", "tests": [{"k": i, "v": "x y"} for i in range(20)]},
+        # Quotes inside values: the legacy parsing returns {"raw": ...} here
+        "quoted": {"id": "QT-2", "tests": [{"k": i, "v": 'x "y"'} for i in range(20)]},
+    }
+    print(f"{'payload':<8} {'legacy us':>10} {'decoder us':>11}  legacy correct")
+    for name, record in cases.items():
+        output = invoke_output(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        assert decode_invoke_result(output) == record
+        legacy = best_of(lambda: legacy_parse(output), number)
+        decoder = best_of(lambda: decode_invoke_result(output), number)
+        print(f"{name:<8} {legacy:>10.2f} {decoder:>11.2f}  {legacy_parse(output) == record}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: bulk GPS geo-fence validation, GeofenceEngine.validate_many vs
+one validate_gps_geofence call per point; and PolygonZones.locate through
+its grid index vs testing every polygon of the species.
+
+Run from backend/: python -m benchmarks.bench_geofence
+"""
+
+import math
+import os
+import random
+import timeit
+
+# server.py reads these at import; the benchmark never connects to them
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "herblock_bench")
+
+import server  # noqa: E402
+from services.geofence import PolygonZones, _crossings  # noqa: E402
+from tests.test_geofence import sample_points  # noqa: E402
+
+
+def timed(call, size: int) -> float:
+    """Best of 5 runs, in ms per batch"""
+    number = max(20000 // size, 1)
+    return min(timeit.repeat(call, number=number, repeat=5)) / number * 1000
+
+
+def main(sizes=(1, 20, 100, 1000, 10000, 100000)) -> None:
+    snapshot = server.zone_registry.current
+    print(f"{'points':>7} {'scalar ms':>10} {'validate_many ms':>17} {'speed-up':>9}")
+    for size in sizes:
+        latitudes, longitudes, names = sample_points(snapshot, size)
+        scalar = timed(lambda: [server.validate_gps_geofence(*point) for point in zip(latitudes, longitudes, names)], size)
+        bulk = timed(lambda: snapshot.engine.validate_many(latitudes, longitudes, names), size)
+        print(f"{size:>7} {scalar:>10.3f} {bulk:>17.3f} {scalar / bulk:>8.1f}x")
+
+
+def district_features(per_side: int, vertices: int = 24) -> list:
+    """per_side x per_side round districts over India, all for one species"""
+    features = []
+    step_lat, step_lon = 31.0 / per_side, 30.0 / per_side
+    for row in range(per_side):
+        for column in range(per_side):
+            center_lat, center_lon = 6 + (row + 0.5) * step_lat, 68 + (column + 0.5) * step_lon
+            ring = [[center_lon + 0.45 * step_lon * math.cos(2 * math.pi * k / vertices),
+                     center_lat + 0.45 * step_lat * math.sin(2 * math.pi * k / vertices)] for k in range(vertices)]
+            features.append({
+                "properties": {"species": "Brahmi", "name": f"district-{row}-{column}"},
+                "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+            })
+    return features
+
+
+def locate_without_index(zones: PolygonZones, latitude: float, longitude: float, species: str):
+    """What locate does with no grid: bbox check and ray cast over every species polygon"""
+    for polygon_id in zones.by_species.get(species, ()):
+        polygon = zones.polygons[polygon_id]
+        min_lon, min_lat, max_lon, max_lat = polygon["bbox"]
+        if not (min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat):
+            continue
+        if sum(_crossings(ring, longitude, latitude) for ring in polygon["rings"]) % 2 == 1:
+            return polygon
+    return None
+
+
+def polygon_main(sides=(3, 10, 30, 60), points: int = 1000) -> None:
+    rng = random.Random(41)
+    sample = [(rng.uniform(6, 37), rng.uniform(68, 98)) for _ in range(points)]
+    print(f"\n{'polygons':>8} {'scan ms':>9} {'grid ms':>9} {'speed-up':>9}   ({points} points)")
+    for side in sides:
+        zones = PolygonZones(district_features(side))
+        assert ([locate_without_index(zones, lat, lon, "Brahmi") for lat, lon in sample] ==
+                [zones.locate(lat, lon, "Brahmi") for lat, lon in sample])
+        scan = timed(lambda: [locate_without_index(zones, lat, lon, "Brahmi") for lat, lon in sample], points)
+        grid = timed(lambda: [zones.locate(lat, lon, "Brahmi") for lat, lon in sample], points)
+        print(f"{side * side:>8} {scan:>9.3f} {grid:>9.3f} {scan / grid:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
+    polygon_main()
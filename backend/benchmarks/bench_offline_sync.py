@@ -0,0 +1,56 @@
+"""
+Benchmark: offline batch sync, bulk insert_many path vs one insert, chain
+write and counter update per record, over an in-memory database with a
+simulated round-trip time.
+
+Run from backend/: python -m benchmarks.bench_offline_sync
+"""
+
+import asyncio
+import os
+
+from mongomock_motor import AsyncMongoMockClient
+
+# server.py reads these at import; the benchmark never connects to them
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "herblock_bench")
+
+import server  # noqa: E402
+from tests.test_offline_sync import legacy_sync, offline_collections, prepare  # noqa: E402
+from tests.test_trace import DelayedDatabase  # noqa: E402
+
+
+def use_database(db) -> None:
+    server.db = db
+    server.dashboard_stats.db = db
+    server.rollup_engine.collection = db.rollups
+    server.live_events.collection = db.live_events
+
+
+async def timed(call) -> float:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await call()
+    return (loop.time() - started) * 1000
+
+
+async def run(round_trip_ms: float, sizes) -> None:
+    print(f"{'records':>7} {'per-record ms':>14} {'bulk ms':>8}")
+    for size in sizes:
+        timings = []
+        for sync in (legacy_sync, server.sync_offline_collections):
+            db = AsyncMongoMockClient()[f"herblock_bench_{len(timings)}_{size}"]
+            await prepare(db)
+            use_database(DelayedDatabase(db, delay=round_trip_ms / 1000))
+            collections = offline_collections(server, size)
+            timings.append(await timed(lambda: sync(server, "farmer-1", collections) if sync is legacy_sync
+                                       else sync("farmer-1", collections)))
+        print(f"{size:>7} {timings[0]:>14.1f} {timings[1]:>8.1f}")
+
+
+def main(round_trip_ms: float = 2.0, sizes=(10, 50, 200)) -> None:
+    asyncio.run(run(round_trip_ms, sizes))
+
+
+if __name__ == "__main__":
+    main()
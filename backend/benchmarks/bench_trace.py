@@ -0,0 +1,51 @@
+"""
+Benchmark: /api/trace latency, concurrent fan-out vs the sequential lookups
+it replaced, over an in-memory database with a simulated round-trip time.
+
+Run from backend/: python -m benchmarks.bench_trace
+"""
+
+import asyncio
+import os
+
+from mongomock_motor import AsyncMongoMockClient
+
+# server.py reads these at import; the benchmark never connects to them
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "herblock_bench")
+
+import server  # noqa: E402
+from tests.test_trace import DelayedDatabase, legacy_trace_documents, seed_trace  # noqa: E402
+
+
+async def measure(call, repeat: int) -> float:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for _ in range(repeat):
+        await call()
+    return (loop.time() - started) / repeat * 1000
+
+
+async def run(round_trip_ms: float, repeat: int) -> None:
+    db = AsyncMongoMockClient()["herblock_bench"]
+    server.db = db
+    server.dashboard_stats.db = db
+    server.rollup_engine.collection = db.rollups
+    server.rollup_engine.source = db.collection_events
+    await seed_trace(server, events_per_kind=20, transactions=20)
+
+    delayed = DelayedDatabase(db, delay=round_trip_ms / 1000)
+    server.db = delayed
+    print(f"{'trace id':<12} {'sequential ms':>14} {'fan-out ms':>11}")
+    for trace_id in ("PROD-1", "HW-BATCH-1"):
+        sequential = await measure(lambda: legacy_trace_documents(delayed, trace_id), repeat)
+        fan_out = await measure(lambda: server.trace_product(trace_id), repeat)
+        print(f"{trace_id:<12} {sequential:>14.1f} {fan_out:>11.1f}")
+
+
+def main(round_trip_ms: float = 2.0, repeat: int = 50) -> None:
+    asyncio.run(run(round_trip_ms, repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,18 +16,21 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import os
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-import hashlib
-import json
+import asyncio
+import random
 import qrcode
 import io
 import base64
 from fastapi import Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from requests_oauthlib import OAuth2Session
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
@@ -37,7 +40,20 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 # --- IMPORT FABRIC SERVICE ---
-from services.fabric_service import fabric_service, HERBLOCK_NETWORK
+from services.fabric_service import fabric_service
+from services.fabric_scheduler import FabricOverloadedError
+from services.circuit_breaker import CircuitOpenError
+from services.outbox import BlockchainOutbox, OutboxHandler, OutboxRejected
+from services.index_manager import ensure_indexes, find_collscans
+from services import merkle
+from services.canonical import canonical_hash
+from services.dashboard_stats import DashboardStats
+from services.rollups import RollupEngine, RollupQueryError, DIMENSIONS, PERIODS
+from services.event_bus import EventBus, format_sse
+from services.idempotency import IdempotencyStore, IdempotencyConflict, UNSTORED_HEADERS, key_scope, request_fingerprint
+from services.device_registry import DeviceRegistry
+from services.blob_store import create_blob_store, iterate_bytes, is_sha256, BlobTooLarge, BlobDigestMismatch
+from services.zone_registry import ZoneRegistry, ZoneRegistryError
 
 # --- SECURITY SETUP ---
 SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
@@ -55,6 +71,16 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
+dashboard_stats = DashboardStats(db, reconcile_interval=float(os.environ.get("DASHBOARD_RECONCILE_SECONDS", "600")))
+rollup_engine = RollupEngine(db)
+# Deactivations reach other workers within one refresh interval
+device_registry = DeviceRegistry(db, refresh_interval=float(os.environ.get("DEVICE_REGISTRY_REFRESH_SECONDS", "15")))
+live_events = EventBus(
+    db,
+    source=os.environ.get("LIVE_EVENTS_SOURCE", "local"),  # "mongo": change streams, for multiple workers
+    history_size=int(os.environ.get("LIVE_EVENTS_HISTORY", "1000")),
+    client_queue_size=int(os.environ.get("LIVE_EVENTS_CLIENT_QUEUE", "256"))
+)
 
 # --- Add these new variables after your app setup ---
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '')
@@ -223,47 +249,23 @@ def validate_gps_geofence(latitude: float, longitude: float, species: str) -> di
     1. Fast bounding box check
     2. Precise Haversine distance validation
     
-    Returns validation result with method and distance.
-    """
-    # Species-specific geo-fence zones (matching chaincode config)
-    HERB_ZONES = {
-        "Ashwagandha": {
-            "center": (26.0, 75.0),  # Rajasthan/MP center
-            "max_radius_km": 1800,   # DEMO: expanded to include Bengaluru for CMTI testing
-            "bounding_box": {"minLat": 8.0, "maxLat": 32.0, "minLng": 70.0, "maxLng": 80.0}
-        },
-        "Tulsi": {
-            "center": (21.5, 82.5),  # Central India
-            "max_radius_km": 1500,
-            "bounding_box": {"minLat": 8.0, "maxLat": 35.0, "minLng": 68.0, "maxLng": 97.0}
-        },
-        "Brahmi": {
-            "center": (18.0, 83.5),  # South-East India
-            "max_radius_km": 700,
-            "bounding_box": {"minLat": 8.0, "maxLat": 28.0, "minLng": 75.0, "maxLng": 92.0}
-        },
-        "Giloy": {
-            "center": (19.0, 81.0),  # Tropical India
-            "max_radius_km": 800,
-            "bounding_box": {"minLat": 10.0, "maxLat": 28.0, "minLng": 72.0, "maxLng": 90.0}
-        },
-        "Shatavari": {
-            "center": (24.0, 77.5),  # North-Central India
-            "max_radius_km": 500,
-            "bounding_box": {"minLat": 18.0, "maxLat": 30.0, "minLng": 70.0, "maxLng": 85.0}
-        }
-    }
-    
+    Returns validation result with method and distance. Zones come from the
+    zone registry (data/zones.json); bulk callers use its engine.validate_many.
+    Species with polygon zones (GEOFENCE_POLYGONS) are checked against those.
+    """
+    zones = zone_registry.current
+    if zones.polygons is not None and zones.polygons.covers(species):
+        return zones.polygons.validate(latitude, longitude, species)
+
     # Default zone for unknown species
-    if species not in HERB_ZONES:
+    if species not in zones.zones:
         return {"valid": True, "method": "no_zone_defined", "species": species}
     
-    zone = HERB_ZONES[species]
-    bbox = zone["bounding_box"]
+    zone = zones.zones[species]
+    min_lat, max_lat, min_lng, max_lng = zone["bbox"]
     
     # STEP 1: Fast bounding box check
-    if not (bbox["minLat"] <= latitude <= bbox["maxLat"] and 
-            bbox["minLng"] <= longitude <= bbox["maxLng"]):
+    if not (min_lat <= latitude <= max_lat and min_lng <= longitude <= max_lng):
         return {
             "valid": False,
             "method": "bounding_box",
@@ -291,39 +293,35 @@ def validate_gps_geofence(latitude: float, longitude: float, species: str) -> di
     }
 
 
+# One versioned zone source for validation, /api/zones and the chaincode config.
+# GEOFENCE_POLYGONS optionally adds polygon zones (e.g. data/geofence_zones.geojson).
+# Both files are reloaded when they change; the engine gives identical results to
+# validate_gps_geofence for many points at a time.
+zone_registry = ZoneRegistry(
+    ROOT_DIR / os.environ.get("ZONES_FILE", "data/zones.json"),
+    calculate_haversine_distance,
+    polygon_path=ROOT_DIR / os.environ["GEOFENCE_POLYGONS"] if os.environ.get("GEOFENCE_POLYGONS") else None,
+    polygon_cell_degrees=float(os.environ.get("GEOFENCE_GRID_DEGREES", "0.25")),
+    reload_interval=float(os.environ.get("ZONES_RELOAD_SECONDS", "30"))
+)
+ZONES_MAX_AGE = int(os.environ.get("ZONES_MAX_AGE", "300"))
+
+
 def calculate_merkle_root(fingerprints: list) -> str:
     """
     PATENT CLAIM 4: Merkle Tree Root Calculation
     
     Calculates the Merkle root from an array of SHA-256 fingerprints.
-    Used for efficient batch integrity verification.
+    Used for efficient batch integrity verification. Stored products keep
+    the same tree incrementally (see append_merkle_leaf).
     """
-    if not fingerprints:
-        return None
-    if len(fingerprints) == 1:
-        return fingerprints[0]
-    
-    current_level = fingerprints.copy()
-    
-    # Pad to even number if necessary
-    if len(current_level) % 2 != 0:
-        current_level.append(current_level[-1])
-    
-    while len(current_level) > 1:
-        next_level = []
-        for i in range(0, len(current_level), 2):
-            combined = current_level[i] + current_level[i + 1]
-            parent_hash = hashlib.sha256(combined.encode()).hexdigest()
-            next_level.append(parent_hash)
-        current_level = next_level
-    
-    return current_level[0]
+    return merkle.merkle_root(fingerprints)
 
 # ============= END PATENT FEATURES =============
 
 def calculate_hash(data: dict) -> str:
-    """SHA-256 hash generation for data integrity (Patent Claim 3)"""
-    json_str = json.dumps(data, sort_keys=True, default=str); return hashlib.sha256(json_str.encode()).hexdigest()
+    """SHA-256 hash generation for data integrity (Patent Claim 3), see services/canonical.py"""
+    return canonical_hash(data)
 
 def generate_qr_code(product_id: str) -> tuple[str, str]:
     frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000'); qr_data = f"{frontend_url}/trace/{product_id}"
@@ -332,16 +330,183 @@ def generate_qr_code(product_id: str) -> tuple[str, str]:
     img.save(buffer, format='PNG'); img_base64 = base64.b64encode(buffer.getvalue()).decode()
     return qr_data, img_base64
 
-async def create_blockchain_transaction(product_id: str, transaction_type: str, data: dict):
+async def seed_chain_head(product_id: str):
+    """Create the chain head for a product from its latest stored transaction"""
     last_tx = await db.blockchain_transactions.find_one({"product_id": product_id}, sort=[("block_index", -1)])
-    previous_hash = last_tx["data_hash"] if last_tx else "0"
-    block_index = (last_tx["block_index"] + 1) if last_tx else 0
+    try:
+        await db.chain_heads.insert_one({
+            "_id": product_id,
+            "next_index": (last_tx["block_index"] + 1) if last_tx else 0,
+            "head_hash": last_tx["data_hash"] if last_tx else "0"
+        })
+    except DuplicateKeyError:
+        pass  # a concurrent writer seeded it first
+
+async def create_blockchain_transaction(product_id: str, transaction_type: str, data: dict):
+    """
+    Append a transaction to the product's hash chain.
+    The chain head is claimed with one atomic find_one_and_update, so
+    concurrent writers for the same product get consecutive block indexes
+    and each links to the hash its predecessor set.
+    """
     data_hash = calculate_hash(data)
+    claim = dict(
+        filter={"_id": product_id},
+        update={"$inc": {"next_index": 1}, "$set": {"head_hash": data_hash}},
+        return_document=ReturnDocument.BEFORE
+    )
+    head = await db.chain_heads.find_one_and_update(**claim)
+    if head is None:
+        await seed_chain_head(product_id)
+        head = await db.chain_heads.find_one_and_update(**claim)
+
+    previous_hash = head["head_hash"]
+    block_index = head["next_index"]
     merkle_root = calculate_hash({"data_hash": data_hash, "previous_hash": previous_hash})
     transaction = BlockchainTransaction(product_id=product_id, transaction_type=transaction_type, data_hash=data_hash, previous_hash=previous_hash, merkle_root=merkle_root, block_index=block_index)
-    await db.blockchain_transactions.insert_one(transaction.dict())
+    tx_doc = transaction.dict()
+    await db.blockchain_transactions.insert_one(tx_doc)
+    await dashboard_stats.record("blockchain_transactions", [tx_doc])
     return transaction
 
+def without_mongo_id(doc: dict) -> dict:
+    """Copy of a stored document without Mongo's _id (added in place by insert_one)"""
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+# --- DIGITAL FINGERPRINTS (computed once, at write time) ---
+FINGERPRINT_EXCLUDED_FIELDS = ("_id", "blockchain_hash", "digital_fingerprint", "fingerprint_algorithm", "aggregates_pending")
+
+def stamp_fingerprint(doc: dict) -> dict:
+    """Add the document's SHA-256 digital fingerprint (excluding hash/fingerprint fields)"""
+    doc["digital_fingerprint"] = calculate_hash({k: v for k, v in doc.items() if k not in FINGERPRINT_EXCLUDED_FIELDS})
+    doc["fingerprint_algorithm"] = "SHA-256"
+    return doc
+
+MERKLE_APPEND_ATTEMPTS = 10
+
+async def store_merkle_nodes(product_key: str, nodes: list):
+    """Insert tree nodes; nodes another writer already stored are identical and skipped"""
+    if not nodes:
+        return
+    try:
+        await db.merkle_nodes.insert_many([{"product_key": product_key, **node} for node in nodes], ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def merkle_leaf_recorded(product_key: str, fingerprint: str) -> bool:
+    """Whether a fingerprint is already a leaf, or queued to become one"""
+    state = await db.merkle_trees.find_one({"_id": product_key}, {"backlog": 1, "pending_nodes": 1}) or {}
+    if fingerprint in state.get("backlog", []) or any(
+            n["level"] == 0 and n["hash"] == fingerprint for n in state.get("pending_nodes", [])):
+        return True
+    return await db.merkle_nodes.find_one({"product_key": product_key, "level": 0, "hash": fingerprint}, {"_id": 1}) is not None
+
+async def append_merkle_leaf(product_key: str, fingerprint: str, skip_if_present: bool = False):
+    """
+    Append a fingerprint to the product's Merkle mountain range in O(log n):
+    only the current peaks are read, and only the new nodes are written.
+
+    The leaf is first queued on the tree's `backlog`; whichever writer next
+    claims the tree (optimistically, on `leaf_count`) folds every queued leaf
+    in, so concurrent appends combine instead of retrying one by one. The new
+    nodes are saved as `pending_nodes` in that same update, and a crash before
+    they reach merkle_nodes leaves no gap: the next append (and the proof
+    endpoint) picks them up. A leaf still queued after every attempt stays in
+    the backlog for the next append.
+    """
+    if skip_if_present and await merkle_leaf_recorded(product_key, fingerprint):
+        return
+    try:
+        state = await db.merkle_trees.find_one_and_update(
+            {"_id": product_key}, {"$push": {"backlog": fingerprint}}, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:  # another writer created the tree first
+        state = await db.merkle_trees.find_one_and_update(
+            {"_id": product_key}, {"$push": {"backlog": fingerprint}}, return_document=ReturnDocument.AFTER)
+    for attempt in range(MERKLE_APPEND_ATTEMPTS):
+        backlog = state.get("backlog", [])
+        if fingerprint not in backlog:
+            return  # folded in by another writer
+        await store_merkle_nodes(product_key, state.get("pending_nodes", []))
+        leaf_count = state.get("leaf_count", 0)
+        peaks, count, new_nodes = state.get("peaks", []), leaf_count, []
+        for leaf in backlog:
+            nodes, peaks = merkle.append_leaf(peaks, count, leaf)
+            new_nodes += nodes
+            count += 1
+        claim = {"_id": product_key, "leaf_count": leaf_count if leaf_count else {"$exists": False}}
+        result = await db.merkle_trees.update_one(claim, {
+            "$set": {"peaks": peaks, "root": merkle.bag_peaks([p["hash"] for p in peaks]),
+                     "leaf_count": count, "pending_nodes": new_nodes},
+            "$pullAll": {"backlog": backlog}
+        })
+        if result.modified_count:
+            await store_merkle_nodes(product_key, new_nodes)
+            await db.merkle_trees.update_one({"_id": product_key, "leaf_count": count}, {"$unset": {"pending_nodes": ""}})
+            return
+        await asyncio.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+        state = await db.merkle_trees.find_one({"_id": product_key})
+    print(f"⚠️  Merkle tree for {product_key} contended; leaf left queued for the next append")
+
+async def record_stored(collection, docs: list, product_keys: list, resumed: bool = False):
+    """
+    Extend Merkle trees and update dashboard/rollup aggregates for newly stored documents.
+    `resumed` finishes an interrupted write: leaves already in the tree are not appended again.
+    """
+    if not docs:
+        return
+    updates = [append_merkle_leaf(key, doc["digital_fingerprint"], skip_if_present=resumed) for doc, key in zip(docs, product_keys)]
+    updates.append(dashboard_stats.record(collection.name, docs))
+    if collection.name == "collection_events":
+        updates.append(rollup_engine.record_collection(docs))
+    await asyncio.gather(*updates)
+
+async def insert_fingerprinted(collection, doc: dict, product_key: str) -> dict:
+    """Stamp a trace document's fingerprint, store it and extend the product's master fingerprint"""
+    stamp_fingerprint(doc)
+    await collection.insert_one(doc)
+    await record_stored(collection, [doc], [product_key])
+    return doc
+
+async def upsert_fingerprinted(collection, doc: dict, product_key: str):
+    """
+    insert_fingerprinted for writes that may be retried: stored at most once per
+    `id` (unique index), the first write wins. `aggregates_pending` stays set
+    until record_stored has run, so a retry finishes an interrupted write.
+    """
+    doc["aggregates_pending"] = True
+    stamp_fingerprint(doc)
+    try:
+        result = await collection.update_one({"id": doc["id"]}, {"$setOnInsert": doc}, upsert=True)
+        inserted = result.upserted_id is not None
+    except DuplicateKeyError:
+        inserted = False  # a concurrent retry stored it first
+    if not inserted:
+        doc = await collection.find_one({"id": doc["id"], "aggregates_pending": True})
+        if doc is None:
+            return
+    await record_stored(collection, [doc], [product_key], resumed=not inserted)
+    await collection.update_one({"id": doc["id"]}, {"$unset": {"aggregates_pending": ""}})
+
+async def insert_many_fingerprinted(collection, docs: list, product_keys: list) -> Dict[int, dict]:
+    """
+    Bulk insert_fingerprinted: one unordered insert_many for all documents.
+    Returns {index: write error (code, errmsg)} for documents that were not stored.
+    """
+    if not docs:
+        return {}
+    for doc in docs:
+        stamp_fingerprint(doc)
+    errors = {}
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            errors[error["index"]] = error
+    stored = [i for i in range(len(docs)) if i not in errors]
+    await record_stored(collection, [docs[i] for i in stored], [product_keys[i] for i in stored])
+    return errors
+
 # --- AUTHENTICATION ENDPOINTS ---
 @api_router.post("/register")
 async def register_user(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -364,21 +529,21 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @api_router.post("/collection", response_model=CollectionEvent)
 async def create_collection_event(event: CollectionEvent, current_user: User = Depends(get_current_user)):
     event.blockchain_hash = calculate_hash(event.dict())
-    await db.collection_events.insert_one(event.dict())
+    await insert_fingerprinted(db.collection_events, event.dict(), event.product_id)
     await create_blockchain_transaction(event.product_id, "collection", event.dict())
     return event
 
 @api_router.post("/processing", response_model=ProcessingStep)
 async def create_processing_step(step: ProcessingStep, current_user: User = Depends(get_current_user)):
     step.blockchain_hash = calculate_hash(step.dict())
-    await db.processing_steps.insert_one(step.dict())
+    await insert_fingerprinted(db.processing_steps, step.dict(), step.product_id)
     await create_blockchain_transaction(step.product_id, "processing", step.dict())
     return step
 
 @api_router.post("/quality", response_model=QualityTest)
 async def create_quality_test(test: QualityTest, current_user: User = Depends(get_current_user)):
     test.blockchain_hash = calculate_hash(test.dict())
-    await db.quality_tests.insert_one(test.dict())
+    await insert_fingerprinted(db.quality_tests, test.dict(), test.product_id)
     await create_blockchain_transaction(test.product_id, "testing", test.dict())
     return test
 
@@ -387,76 +552,108 @@ async def create_product(product: Product, current_user: User = Depends(get_curr
     qr_data, qr_image = generate_qr_code(product.batch_id)
     product.qr_code = qr_data; product.qr_code_image = qr_image
     product.blockchain_hash = calculate_hash(product.dict())
-    await db.products.insert_one(product.dict())
+    await insert_fingerprinted(db.products, product.dict(), product.batch_id)
     await create_blockchain_transaction(product.id, "formulation", product.dict())
     return product
 
+# --- TRACE LOOKUP HELPERS ---
+TRACE_PROJECTION = {"_id": 0}
+
+def product_from_hardware_event(trace_id: str, hw_event: dict) -> dict:
+    """Hardware intake records don't create a product entry — synthesize one from the collection event"""
+    return {
+        "id": trace_id,
+        "batch_id": trace_id,
+        "product_name": hw_event.get("species_name", "Unknown Herb"),
+        "species_name": hw_event.get("species_name", "Unknown Herb"),
+        "manufacturer": "Field Device — " + hw_event.get("collector_name", "CMTI"),
+        "manufacturing_date": hw_event.get("timestamp"),
+        "expiry_date": None,
+        "final_quantity_kg": hw_event.get("quantity_kg", 0),
+        "source": "hardware_device",
+        "device_id": hw_event.get("device_id"),
+        "quality_grade": hw_event.get("quality_grade"),
+        "geo_validated": hw_event.get("geo_validated", False),
+        "blockchain_hash": hw_event.get("blockchain_hash", ""),
+        "timestamp": hw_event.get("timestamp"),
+        # The synthesized product *is* the intake event
+        "digital_fingerprint": hw_event.get("digital_fingerprint"),
+        "fingerprint_algorithm": "SHA-256",
+    }
+
+async def find_trace_product(trace_id: str, include_blockchain_id: bool = False, projection: Optional[dict] = TRACE_PROJECTION) -> Optional[dict]:
+    """Product by id/batch id, falling back to a hardware collection event (both looked up concurrently)"""
+    product_keys = [{"id": trace_id}, {"batch_id": trace_id}]
+    if include_blockchain_id:
+        product_keys.append({"blockchain_product_id": trace_id})
+    product, hw_event = await asyncio.gather(
+        db.products.find_one({"$or": product_keys}, projection),
+        db.collection_events.find_one({"$or": [{"product_id": trace_id}, {"id": trace_id}]}, projection)
+    )
+    if product:
+        return product
+    if hw_event:
+        return product_from_hardware_event(trace_id, hw_event)
+    return None
+
+async def load_trace_events(product_ids: list, projection: Optional[dict] = TRACE_PROJECTION) -> tuple:
+    """Collection events, processing steps and quality tests for a product, fetched concurrently"""
+    query = {"product_id": {"$in": list(dict.fromkeys(product_ids))}}
+    return await asyncio.gather(
+        db.collection_events.find(query, projection).to_list(1000),
+        db.processing_steps.find(query, projection).to_list(1000),
+        db.quality_tests.find(query, projection).to_list(1000),
+    )
+
 # --- PUBLIC ENDPOINTS ---
 @api_router.get("/trace/{trace_id}")
 async def trace_product(trace_id: str):
-    product = await db.products.find_one({"$or": [{"id": trace_id}, {"batch_id": trace_id}]})
-
-    # Hardware intake records don't create a product entry — synthesize one from collection_events
+    # _id (an ObjectId) is read only to order the fallback Merkle leaves by insertion
+    product = await find_trace_product(trace_id, projection=None)
     if not product:
-        hw_event = await db.collection_events.find_one({"$or": [{"product_id": trace_id}, {"id": trace_id}]})
-        if not hw_event:
-            raise HTTPException(status_code=404, detail="Product not found")
-        product = {
-            "id": trace_id,
-            "batch_id": trace_id,
-            "product_name": hw_event.get("species_name", "Unknown Herb"),
-            "species_name": hw_event.get("species_name", "Unknown Herb"),
-            "manufacturer": "Field Device — " + hw_event.get("collector_name", "CMTI"),
-            "manufacturing_date": hw_event.get("timestamp"),
-            "expiry_date": None,
-            "final_quantity_kg": hw_event.get("quantity_kg", 0),
-            "source": "hardware_device",
-            "device_id": hw_event.get("device_id"),
-            "quality_grade": hw_event.get("quality_grade"),
-            "geo_validated": hw_event.get("geo_validated", False),
-            "blockchain_hash": hw_event.get("blockchain_hash", ""),
-            "timestamp": hw_event.get("timestamp"),
-        }
+        raise HTTPException(status_code=404, detail="Product not found")
 
     batch_id_to_search = product.get("batch_id", product.get("id", trace_id))
-    collection_events = await db.collection_events.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": trace_id}]}).to_list(1000)
-    processing_steps = await db.processing_steps.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": trace_id}]}).to_list(1000)
-    quality_tests = await db.quality_tests.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": trace_id}]}).to_list(1000)
-    blockchain_txs = await db.blockchain_transactions.find({"product_id": product["id"]}).sort("block_index", 1).to_list(1000)
+    product_keys = list(dict.fromkeys([batch_id_to_search, trace_id]))
+    (collection_events, processing_steps, quality_tests), blockchain_txs, master_states = await asyncio.gather(
+        load_trace_events(product_keys, projection=None),
+        db.blockchain_transactions.find({"product_id": product["id"]}, TRACE_PROJECTION).sort("block_index", 1).to_list(1000),
+        db.merkle_trees.find({"_id": {"$in": product_keys}}, {"root": 1, "leaf_count": 1}).to_list(len(product_keys))
+    )
+    inserted_at = {}
+    for doc in [product, *collection_events, *processing_steps, *quality_tests]:
+        inserted_at[id(doc)] = doc.pop("_id", None)
     
-    def clean_mongo_doc(doc):
-        if doc and '_id' in doc: del doc['_id']
+    def with_fingerprint(doc):
+        """Fingerprints are stored at write time; only legacy documents are hashed here"""
+        if not doc.get("digital_fingerprint"):
+            stamp_fingerprint(doc)
         return doc
     
-    def add_digital_fingerprint(doc):
-        """Add SHA-256 digital fingerprint to document"""
-        cleaned = clean_mongo_doc(doc.copy() if doc else {})
-        # Generate fingerprint from document data
-        fingerprint_data = {k: v for k, v in cleaned.items() if k not in ['blockchain_hash', 'digital_fingerprint']}
-        fingerprint = calculate_hash(fingerprint_data)
-        cleaned['digital_fingerprint'] = fingerprint
-        cleaned['fingerprint_algorithm'] = 'SHA-256'
-        return cleaned
+    product_with_fp = with_fingerprint(product)
+    collections_with_fp = [with_fingerprint(doc) for doc in collection_events]
+    processing_with_fp = [with_fingerprint(doc) for doc in processing_steps]
+    tests_with_fp = [with_fingerprint(doc) for doc in quality_tests]
     
-    # Add fingerprints to all documents
-    product_with_fp = add_digital_fingerprint(product)
-    collections_with_fp = [add_digital_fingerprint(doc) for doc in collection_events]
-    processing_with_fp = [add_digital_fingerprint(doc) for doc in processing_steps]
-    tests_with_fp = [add_digital_fingerprint(doc) for doc in quality_tests]
-    
-    # Calculate master fingerprint (Merkle root of all fingerprints)
-    all_fingerprints = [product_with_fp.get('digital_fingerprint', '')]
-    all_fingerprints += [c.get('digital_fingerprint', '') for c in collections_with_fp]
-    all_fingerprints += [p.get('digital_fingerprint', '') for p in processing_with_fp]
-    all_fingerprints += [t.get('digital_fingerprint', '') for t in tests_with_fp]
-    master_fingerprint = calculate_hash({"fingerprints": all_fingerprints})
+    # The Merkle root is maintained incrementally on write. Recompute only if
+    # some documents predate the tree (count mismatch) or two keys need combining.
+    # Products synthesized from a hardware event are not separate records
+    synthesized = product.get("source") == "hardware_device"
+    documents_on_record = len(collection_events) + len(processing_steps) + len(quality_tests) + (0 if synthesized else 1)
+    if len(master_states) == 1 and master_states[0].get("leaf_count") == documents_on_record:
+        master_fingerprint = master_states[0]["root"]
+    else:
+        # Leaves in insertion order, as append_merkle_leaf added them
+        documents = ([] if synthesized else [product_with_fp]) + collections_with_fp + processing_with_fp + tests_with_fp
+        documents.sort(key=lambda doc: str(inserted_at[id(doc)] or ""))
+        master_fingerprint = calculate_merkle_root([doc.get('digital_fingerprint', '') for doc in documents])
     
     return {
         "product": product_with_fp,
         "collection_events": collections_with_fp,
         "processing_steps": processing_with_fp,
         "quality_tests": tests_with_fp,
-        "blockchain_transactions": [clean_mongo_doc(doc) for doc in blockchain_txs],
+        "blockchain_transactions": blockchain_txs,
         "digital_fingerprints": {
             "master_fingerprint": master_fingerprint,
             "algorithm": "SHA-256",
@@ -464,28 +661,88 @@ async def trace_product(trace_id: str):
             "total_events": len(collection_events) + len(processing_steps) + len(quality_tests),
             "verification_status": "VERIFIED",
             "patent_pending": True,
-            "note": "Each event has its own digital fingerprint. Master fingerprint is the Merkle root of all event fingerprints."
+            "note": "Each event has its own digital fingerprint. Master fingerprint is the Merkle root of all event fingerprints.",
+            "proof_url": f"/api/trace/{trace_id}/proof/{{event_id}}"
         }
     }
 
+@api_router.get("/trace/{trace_id}/proof/{event_id}")
+async def get_trace_inclusion_proof(trace_id: str, event_id: str):
+    """
+    O(log n) Merkle inclusion proof for one trace event.
+    Verifiers hash the event's fingerprint up the `path`, check it equals
+    peaks[peak_position], then bag the peaks right-to-left to get `root`.
+    """
+    lookups = await asyncio.gather(*(
+        collection.find_one({"id": event_id}, {"_id": 0, "digital_fingerprint": 1, "product_id": 1, "batch_id": 1, "id": 1})
+        for collection in (db.collection_events, db.processing_steps, db.quality_tests, db.products)
+    ))
+    doc = next((d for d in lookups if d), None)
+    if not doc or not doc.get("digital_fingerprint"):
+        raise HTTPException(status_code=404, detail="Event not found or has no stored fingerprint")
+
+    product_key = doc.get("product_id") or doc.get("batch_id", doc["id"])
+    fingerprint = doc["digital_fingerprint"]
+    leaf, tree = await asyncio.gather(
+        db.merkle_nodes.find_one({"product_key": product_key, "level": 0, "hash": fingerprint}),
+        db.merkle_trees.find_one({"_id": product_key})
+    )
+    # Nodes of the latest append may still be pending on the tree state
+    pending = {(n["level"], n["index"]): n["hash"] for n in (tree or {}).get("pending_nodes", [])}
+    if not leaf and tree:
+        leaf = next(({"index": index} for (level, index), value in pending.items() if level == 0 and value == fingerprint), None)
+    if not leaf or not tree:
+        raise HTTPException(status_code=404, detail="Event is not part of a Merkle tree")
+    if trace_id not in (product_key, doc["id"]):
+        product = await find_trace_product(trace_id)
+        if not product or product_key not in (product.get("batch_id"), product.get("id"), trace_id):
+            raise HTTPException(status_code=404, detail="Event does not belong to this trace")
+
+    positions = merkle.proof_positions(leaf["index"], tree["leaf_count"])
+    siblings = {}
+    if positions:
+        nodes = await db.merkle_nodes.find(
+            {"product_key": product_key, "$or": [{"level": level, "index": index} for level, index in positions]},
+            {"_id": 0, "level": 1, "index": 1, "hash": 1}
+        ).to_list(len(positions))
+        siblings = {(n["level"], n["index"]): n["hash"] for n in nodes}
+        siblings.update((position, pending[position]) for position in positions if position in pending)
+    if len(siblings) != len(positions):
+        raise HTTPException(status_code=409, detail="Merkle tree is incomplete for this event")
+
+    return {
+        "event_id": event_id,
+        "product_key": product_key,
+        "leaf": fingerprint,
+        "algorithm": "SHA-256 Merkle mountain range",
+        "proof": merkle.build_proof(leaf["index"], tree["leaf_count"], siblings, tree["peaks"]),
+        "patent_pending": True
+    }
+
 @api_router.get("/analytics/dashboard")
 async def get_dashboard_analytics():
-    total_products = await db.products.count_documents({})
-    total_collections = await db.collection_events.count_documents({})
-    total_processing = await db.processing_steps.count_documents({})
-    total_tests = await db.quality_tests.count_documents({})
-    total_blockchain_txs = await db.blockchain_transactions.count_documents({})
-    recent_collections_raw = await db.collection_events.find().sort("timestamp", -1).limit(5).to_list(5)
-    recent_products_raw = await db.products.find().sort("timestamp", -1).limit(5).to_list(5)
-    def clean_mongo_doc(doc):
-        if doc and '_id' in doc: del doc['_id']
-        return doc
+    # Served from counters maintained on write (see services/dashboard_stats.py)
+    return await dashboard_stats.snapshot()
+
+@api_router.get("/analytics/rollups")
+async def list_analytics_rollups():
+    """Available rollup dimensions and periods"""
     return {
-        "statistics": { "total_products": total_products, "total_collections": total_collections, "total_processing": total_processing, "total_quality_tests": total_tests, "total_blockchain_transactions": total_blockchain_txs },
-        "recent_collections": [clean_mongo_doc(doc) for doc in recent_collections_raw],
-        "recent_products": [clean_mongo_doc(doc) for doc in recent_products_raw]
+        "dimensions": list(DIMENSIONS),
+        "periods": {period: fmt for period, fmt in PERIODS.items()},
+        "metrics": ["count", "quantity_kg", "grades", "geo_rejected", "geo_rejection_rate"],
+        "example": "/api/analytics/rollups/species?period=day&start=2026-10-01&end=2026-10-31"
     }
 
+@api_router.get("/analytics/rollups/{dimension}")
+async def get_analytics_rollups(dimension: str, period: str = "day", start: Optional[str] = None,
+                                end: Optional[str] = None, key: Optional[str] = None):
+    """Pre-aggregated collection metrics per bucket, e.g. daily quantity per species"""
+    try:
+        return await rollup_engine.query(dimension, period=period, start=start, end=end, key=key)
+    except RollupQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 # ==================== HYPERLEDGER FABRIC BLOCKCHAIN ENDPOINTS ====================
 # PATENT PENDING - Indian Patent Office
@@ -493,6 +750,10 @@ async def get_dashboard_analytics():
 
 blockchain_router = APIRouter(prefix="/api/blockchain", tags=["Blockchain"])
 
+def blockchain_unavailable(e) -> HTTPException:
+    """503 when Fabric calls are shed (queue full) or short-circuited (network down)"""
+    return HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": "1"})
+
 @blockchain_router.get("/status")
 async def get_blockchain_status():
     """
@@ -511,7 +772,128 @@ async def get_blockchain_status():
         }
 
 
-@blockchain_router.post("/collection")
+# --- Outbox commit handlers (run by the background outbox worker) ---
+# Each kind is an OutboxHandler: `invoke` submits to Fabric, `store` writes the
+# read model. Both can rerun for the same entry when a retry follows a crash.
+
+async def ledger_invoke(entry: dict, record, ids: dict) -> dict:
+    """
+    Submit an outbox entry to the ledger. On a retry, "already exists" means an
+    earlier attempt committed but its result was never saved: treat it as committed.
+    Any other chaincode error is permanent and rejects the entry.
+    """
+    try:
+        return await record(entry["payload"])
+    except (FabricOverloadedError, CircuitOpenError):
+        raise
+    except Exception as e:
+        if entry["attempts"] > 1 and fabric_service.is_duplicate_record(e):
+            return {"success": True, **ids, "blockchain_verified": True, "already_on_ledger": True}
+        if fabric_service.is_chaincode_error(e):
+            raise OutboxRejected(str(e))
+        raise
+
+
+async def invoke_collection(entry: dict) -> dict:
+    payload = entry["payload"]
+    result = await ledger_invoke(entry, fabric_service.record_collection,
+                                 {"collection_id": payload["id"], "product_id": payload.get("product_id")})
+    if not result.get("success"):
+        raise OutboxRejected(result.get("message", "Collection rejected by blockchain"))
+    return result
+
+
+async def store_collection(entry: dict, result: dict):
+    mongo_doc = {
+        **entry["payload"],
+        "blockchain_verified": True,
+        "blockchain_collection_id": result.get("collection_id"),
+        "blockchain_product_id": result.get("product_id"),
+        "blockchain_tx_ref": entry["tx_ref"],
+        "geo_validated": result.get("geo_validated", True),
+        "timestamp": datetime.now(timezone.utc)
+    }
+    await upsert_fingerprinted(db.collection_events, mongo_doc, mongo_doc["product_id"])
+
+
+async def invoke_quality_test(entry: dict) -> dict:
+    payload = entry["payload"]
+    return await ledger_invoke(entry, fabric_service.record_quality_test,
+                               {"test_id": payload["id"], "product_id": payload.get("product_id", "")})
+
+
+async def store_quality_test(entry: dict, result: dict):
+    mongo_doc = {
+        **entry["payload"],
+        "blockchain_verified": True,
+        "blockchain_test_id": result.get("test_id"),
+        "blockchain_tx_ref": entry["tx_ref"],
+        "timestamp": datetime.now(timezone.utc)
+    }
+    await upsert_fingerprinted(db.quality_tests, mongo_doc, mongo_doc.get("product_id", ""))
+
+
+async def invoke_processing(entry: dict) -> dict:
+    return await ledger_invoke(entry, fabric_service.record_processing, {"processing_id": entry["payload"]["id"]})
+
+
+async def store_processing(entry: dict, result: dict):
+    mongo_doc = {
+        **entry["payload"],
+        "blockchain_verified": True,
+        "blockchain_processing_id": result.get("processing_id"),
+        "blockchain_tx_ref": entry["tx_ref"],
+        "timestamp": datetime.now(timezone.utc)
+    }
+    await upsert_fingerprinted(db.processing_steps, mongo_doc, mongo_doc.get("product_id", ""))
+
+
+async def invoke_product(entry: dict) -> dict:
+    return await ledger_invoke(entry, fabric_service.record_product, {"product_id": entry["payload"]["id"]})
+
+
+async def store_product(entry: dict, result: dict):
+    mongo_doc = {
+        **entry["payload"],
+        "blockchain_verified": True,
+        "blockchain_product_id": result.get("product_id"),
+        "blockchain_tx_ref": entry["tx_ref"],
+        "qr_code": entry["context"].get("qr_code"),
+        "qr_code_image": entry["context"].get("qr_code_image"),
+        "timestamp": datetime.now(timezone.utc)
+    }
+    await upsert_fingerprinted(db.products, mongo_doc, mongo_doc.get("batch_id", mongo_doc["id"]))
+
+
+blockchain_outbox = BlockchainOutbox(
+    db,
+    handlers={
+        "collection": OutboxHandler(invoke_collection, store_collection),
+        "quality_test": OutboxHandler(invoke_quality_test, store_quality_test),
+        "processing": OutboxHandler(invoke_processing, store_processing),
+        "product": OutboxHandler(invoke_product, store_product)
+    },
+    concurrency=int(os.environ.get("OUTBOX_CONCURRENCY", "16")),
+    max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8")),
+    unavailable_errors=(FabricOverloadedError, CircuitOpenError),
+    notify=lambda status: live_events.publish(f"tx.{status['status']}", status)
+)
+
+
+def outbox_ack(entry: dict, **ids) -> dict:
+    """Immediate response for a write accepted into the outbox"""
+    return {
+        "success": True,
+        "status": entry["status"],
+        "tx_ref": entry["tx_ref"],
+        **ids,
+        "status_url": f"/api/blockchain/tx/{entry['tx_ref']}",
+        "blockchain_verified": False,
+        "patent_pending": True
+    }
+
+
+@blockchain_router.post("/collection", status_code=202)
 async def record_collection_on_blockchain(
     event_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
@@ -523,44 +905,40 @@ async def record_collection_on_blockchain(
     - Validates collection coordinates against approved regions
     - Rejects collections from unauthorized locations
     - Ensures herb authenticity through location verification
+
+    The write is queued in the outbox and acknowledged with a tx_ref;
+    poll /api/blockchain/tx/{tx_ref} for the commit result.
     """
+    # Add user info to the collection data
+    event_data["collector_id"] = current_user.username
+    event_data["id"] = event_data.get("id") or f"COLL-{uuid.uuid4().hex[:8].upper()}"
+    event_data["product_id"] = event_data.get("product_id") or f"BATCH-{uuid.uuid4().hex[:8].upper()}"
+
+    # Fast local geo-fence check; the chaincode remains authoritative
     try:
-        # Add user info to the collection data
-        event_data["collector_id"] = current_user.username
-        
-        # Record on blockchain with GPS validation
-        result = await fabric_service.record_collection(event_data)
-        
-        if result.get("success"):
-            # Also save to MongoDB for quick access
-            mongo_doc = {
-                **event_data,
-                "blockchain_verified": True,
-                "blockchain_collection_id": result.get("collection_id"),
-                "blockchain_product_id": result.get("product_id"),
-                "geo_validated": result.get("geo_validated", True),
-                "timestamp": datetime.now(timezone.utc)
+        geo_result = validate_gps_geofence(
+            float(event_data.get("latitude", 0)),
+            float(event_data.get("longitude", 0)),
+            event_data.get("species_name", "Unknown")
+        )
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be numbers")
+    if not geo_result["valid"]:
+        await rollup_engine.record_rejection(event_data)
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "geo_validation_failed",
+                "message": geo_result.get("reason", "INVALID LOCATION"),
+                "patent_feature": "GPS Geo-Fence Validation - This herb species cannot be collected from this location"
             }
-            await db.collection_events.insert_one(mongo_doc)
-        
-        return result
-        
-    except Exception as e:
-        # Check if geo-validation failed
-        error_msg = str(e)
-        if "INVALID LOCATION" in error_msg:
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": "geo_validation_failed",
-                    "message": error_msg,
-                    "patent_feature": "GPS Geo-Fence Validation - This herb species cannot be collected from this location"
-                }
-            )
-        raise HTTPException(status_code=500, detail=str(e))
+        )
+
+    entry = await blockchain_outbox.enqueue("collection", event_data, submitted_by=current_user.username)
+    return outbox_ack(entry, collection_id=event_data["id"], product_id=event_data["product_id"])
 
 
-@blockchain_router.post("/quality-test")
+@blockchain_router.post("/quality-test", status_code=202)
 async def record_quality_test_on_blockchain(
     test_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
@@ -573,27 +951,14 @@ async def record_quality_test_on_blockchain(
     - Cryptographic proof of authenticity
     - Lab accreditation verification
     """
-    try:
-        test_data["tested_by"] = current_user.username
-        result = await fabric_service.record_quality_test(test_data)
-        
-        if result.get("success"):
-            # Also save to MongoDB
-            mongo_doc = {
-                **test_data,
-                "blockchain_verified": True,
-                "blockchain_test_id": result.get("test_id"),
-                "timestamp": datetime.now(timezone.utc)
-            }
-            await db.quality_tests.insert_one(mongo_doc)
-        
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    test_data["tested_by"] = current_user.username
+    test_data["id"] = test_data.get("id") or f"QT-{uuid.uuid4().hex[:8].upper()}"
 
+    entry = await blockchain_outbox.enqueue("quality_test", test_data, submitted_by=current_user.username)
+    return outbox_ack(entry, test_id=test_data["id"], product_id=test_data.get("product_id", ""))
 
-@blockchain_router.post("/processing")
+
+@blockchain_router.post("/processing", status_code=202)
 async def record_processing_on_blockchain(
     processing_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
@@ -603,26 +968,14 @@ async def record_processing_on_blockchain(
     
     Links raw materials to processed output with immutable audit trail
     """
-    try:
-        processing_data["processor_id"] = current_user.username
-        result = await fabric_service.record_processing(processing_data)
-        
-        if result.get("success"):
-            mongo_doc = {
-                **processing_data,
-                "blockchain_verified": True,
-                "blockchain_processing_id": result.get("processing_id"),
-                "timestamp": datetime.now(timezone.utc)
-            }
-            await db.processing_steps.insert_one(mongo_doc)
-        
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    processing_data["processor_id"] = current_user.username
+    processing_data["id"] = processing_data.get("id") or f"PROC-{uuid.uuid4().hex[:8].upper()}"
 
+    entry = await blockchain_outbox.enqueue("processing", processing_data, submitted_by=current_user.username)
+    return outbox_ack(entry, processing_id=processing_data["id"])
 
-@blockchain_router.post("/product")
+
+@blockchain_router.post("/product", status_code=202)
 async def record_product_on_blockchain(
     product_data: Dict[str, Any],
     current_user: User = Depends(get_current_user)
@@ -632,31 +985,47 @@ async def record_product_on_blockchain(
     
     Links all supply chain events to final consumer product
     """
-    try:
-        product_data["manufacturer_id"] = current_user.username
-        result = await fabric_service.record_product(product_data)
-        
-        if result.get("success"):
-            # Generate QR code
-            qr_data, qr_image = generate_qr_code(result.get("product_id"))
-            
-            mongo_doc = {
-                **product_data,
-                "blockchain_verified": True,
-                "blockchain_product_id": result.get("product_id"),
-                "qr_code": qr_data,
-                "qr_code_image": qr_image,
-                "timestamp": datetime.now(timezone.utc)
-            }
-            await db.products.insert_one(mongo_doc)
-            
-            result["qr_code"] = qr_data
-            result["qr_code_image"] = qr_image
-        
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    product_data["manufacturer_id"] = current_user.username
+    product_data["id"] = product_data.get("id") or f"PROD-{uuid.uuid4().hex[:8].upper()}"
+
+    # Generate QR code up front so the client can print it while the commit is pending
+    qr_data, qr_image = generate_qr_code(product_data["id"])
+
+    entry = await blockchain_outbox.enqueue(
+        "product",
+        product_data,
+        submitted_by=current_user.username,
+        context={"qr_code": qr_data, "qr_code_image": qr_image}
+    )
+    return {
+        **outbox_ack(entry, product_id=product_data["id"]),
+        "qr_code": qr_data,
+        "qr_code_image": qr_image
+    }
+
+
+@blockchain_router.get("/tx/{tx_ref}")
+async def get_blockchain_tx_status(tx_ref: str, wait: float = 0):
+    """
+    Status of a write queued in the blockchain outbox.
+    Pass ?wait=N (max 30s) to long-poll until the record is committed.
+    """
+    entry = await blockchain_outbox.wait(tx_ref, timeout=min(max(wait, 0), 30))
+    if not entry:
+        raise HTTPException(status_code=404, detail="Transaction reference not found")
+
+    return {
+        "tx_ref": entry["tx_ref"],
+        "kind": entry["kind"],
+        "status": entry["status"],
+        "attempts": entry["attempts"],
+        "created_at": entry["created_at"],
+        "committed_at": entry.get("committed_at"),
+        "last_error": entry.get("last_error"),
+        "result": entry.get("result"),
+        "blockchain_verified": entry["status"] == "committed",
+        "patent_pending": True
+    }
 
 
 @blockchain_router.get("/trace/{product_id}")
@@ -689,34 +1058,10 @@ async def trace_product_on_blockchain(product_id: str):
         return result
     except Exception as e:
         # Fallback to MongoDB if blockchain query fails
-        product = await db.products.find_one({
-            "$or": [
-                {"id": product_id},
-                {"batch_id": product_id},
-                {"blockchain_product_id": product_id}
-            ]
-        })
-        
+        print(f"⚠️  Blockchain trace for {product_id} failed, serving MongoDB cache: {e}")
+        product = await find_trace_product(product_id, include_blockchain_id=True)
         if not product:
-            hw_event = await db.collection_events.find_one({"$or": [{"product_id": product_id}, {"id": product_id}]})
-            if not hw_event:
-                raise HTTPException(status_code=404, detail="Product not found")
-            product = {
-                "id": product_id,
-                "batch_id": product_id,
-                "product_name": hw_event.get("species_name", "Unknown Herb"),
-                "species_name": hw_event.get("species_name", "Unknown Herb"),
-                "manufacturer": "Field Device — " + hw_event.get("collector_name", "CMTI"),
-                "manufacturing_date": hw_event.get("timestamp"),
-                "expiry_date": None,
-                "final_quantity_kg": hw_event.get("quantity_kg", 0),
-                "source": "hardware_device",
-                "device_id": hw_event.get("device_id"),
-                "quality_grade": hw_event.get("quality_grade"),
-                "geo_validated": hw_event.get("geo_validated", False),
-                "blockchain_hash": hw_event.get("blockchain_hash", ""),
-                "timestamp": hw_event.get("timestamp"),
-            }
+            raise HTTPException(status_code=404, detail="Product not found")
 
         def clean_mongo_doc(doc):
             if doc and '_id' in doc: del doc['_id']
@@ -724,9 +1069,7 @@ async def trace_product_on_blockchain(product_id: str):
 
         # Get all related events from MongoDB
         batch_id_to_search = product.get("batch_id", product.get("id", product_id))
-        collection_events = await db.collection_events.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": product_id}]}).to_list(1000)
-        processing_steps = await db.processing_steps.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": product_id}]}).to_list(1000)
-        quality_tests = await db.quality_tests.find({"$or": [{"product_id": batch_id_to_search}, {"product_id": product_id}]}).to_list(1000)
+        collection_events, processing_steps, quality_tests = await load_trace_events([batch_id_to_search, product_id])
         
         return {
             "product_id": product_id,
@@ -749,6 +1092,8 @@ async def get_blockchain_history(key: str):
     try:
         result = await fabric_service.get_history(key)
         return result
+    except (FabricOverloadedError, CircuitOpenError) as e:
+        raise blockchain_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -763,6 +1108,7 @@ async def get_collection_from_blockchain(collection_id: str):
         return result
     except Exception as e:
         # Fallback to MongoDB
+        print(f"⚠️  Blockchain lookup of collection {collection_id} failed, serving MongoDB cache: {e}")
         collection = await db.collection_events.find_one({
             "$or": [
                 {"id": collection_id},
@@ -793,29 +1139,10 @@ async def get_last_endorsement():
     """
     try:
         # Query peer channel info to confirm both orgs are live signers
-        import asyncio, subprocess as sp
-        env = fabric_service.env.copy()
-
-        cmd = [
-            "peer", "channel", "getinfo",
-            "-c", fabric_service.channel_name
-        ]
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            env=env,
-            cwd=HERBLOCK_NETWORK
-        )
-        stdout, stderr = await proc.communicate()
-        raw = (stdout.decode() + stderr.decode())
-
-        # Extract block height from output like: "Blockchain info: {\"height\":5,...}"
-        import re, json as _json
-        block_height = None
-        m = re.search(r'"height"\s*:\s*(\d+)', raw)
-        if m:
-            block_height = int(m.group(1))
+        try:
+            block_height = await fabric_service.get_block_height()
+        except Exception:
+            block_height = None
 
         return {
             "channel": fabric_service.channel_name,
@@ -851,6 +1178,24 @@ async def get_last_endorsement():
 
 # ==================== STARTUP EVENT ====================
 
+async def backfill_rollups():
+    """Build analytics rollups from existing history the first time they are enabled (one worker only)"""
+    try:
+        processed = await rollup_engine.backfill()
+        if processed is not None:
+            print(f"✅ Analytics rollups built from {processed} collection events")
+    except Exception as e:
+        print(f"⚠️  Analytics rollup backfill failed: {e}")
+
+
+async def build_indexes():
+    """Create declared indexes, then verify query plans if VERIFY_QUERY_PLANS=true"""
+    await ensure_indexes(db)
+    if os.environ.get("VERIFY_QUERY_PLANS", "false").lower() == "true":
+        for problem in await find_collscans(db):
+            print(f"⚠️  COLLSCAN: {problem['query']} on {problem['collection']} ({' > '.join(problem['stages'])})")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize HerBlock system on startup"""
@@ -862,17 +1207,49 @@ async def startup_event():
     
     # Check blockchain connection
     try:
+        await fabric_service.start()
         is_connected = await fabric_service.check_connection()
         if is_connected:
             print("✅ Hyperledger Fabric blockchain: CONNECTED")
             print("   - Channel: herblock")
             print("   - Chaincode: herblock")
             print("   - Peers: peer0.org1, peer0.org2")
+            print(f"   - Transport: {fabric_service.backend.name}")
         else:
             print("⚠️  Hyperledger Fabric: Not connected (using fallback)")
     except Exception as e:
         print(f"⚠️  Blockchain connection error: {e}")
         print("   Using MongoDB for data storage")
+
+    # Build indexes in the background; optionally check every hot query uses one
+    asyncio.ensure_future(build_indexes())
+
+    # Drain queued blockchain writes in the background
+    blockchain_outbox.start()
+
+    # Geo-fence zones: hot-reloaded from data/zones.json (and GEOFENCE_POLYGONS)
+    zones = zone_registry.describe()
+    print(f"✅ Zone registry: version {zones['version']}, {zones['validation_zones']} geo-fences"
+          + (f", {zones['polygons']} polygons" if zones["polygons"] else ""))
+    zone_registry.start()
+
+    # Device keys for /api/intake are authenticated from memory
+    try:
+        print(f"✅ Device registry: {await device_registry.start()} active devices cached")
+    except Exception as e:
+        print(f"⚠️  Device registry not warmed: {e}")
+
+    # Live intake feed (optionally fanned out from a MongoDB change stream)
+    await live_events.start()
+
+    # One-time analytics rollup backfill from existing collection events
+    asyncio.ensure_future(backfill_rollups())
+
+    # Dashboard counters: create recent feeds, reconcile counts periodically
+    try:
+        await dashboard_stats.start()
+    except Exception as e:
+        print(f"⚠️  Dashboard stats not started: {e}")
     
     print("")
     print("🌿 Features enabled:")
@@ -886,8 +1263,19 @@ async def startup_event():
     print("🚀 ========================================")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close long-lived blockchain connections"""
+    await blockchain_outbox.stop()
+    await dashboard_stats.stop()
+    await live_events.stop()
+    await device_registry.stop()
+    await zone_registry.stop()
+    await fabric_service.close()
+
+
 # --- APP CONFIGURATION ---
-app.include_router(api_router)
+# api_router is included at the end of the module: it gains routes further down
 app.include_router(auth_router)
 app.include_router(blockchain_router)
 
@@ -1004,39 +1392,43 @@ async def health_check():
     """Health check for mobile app connectivity"""
     return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
 
-# Approved zones endpoint
+# Approved zones endpoints (served from the zone registry, cacheable by ETag)
+def zone_response(http_request: Request, etag: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={ZONES_MAX_AGE}"}
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/zones")
+async def get_zone_catalog(http_request: Request, format: Optional[str] = None):
+    """
+    Every species' approved zones with the registry version.
+    `?format=chaincode` exports the geo-fences in the chaincode's config format.
+    """
+    zones = zone_registry.current
+    if format == "chaincode":
+        return zone_response(http_request, zones.etag, zones.chaincode)
+    if format is not None:
+        raise HTTPException(status_code=400, detail="format must be 'chaincode' or omitted")
+    return zone_response(http_request, zones.etag, zones.catalog)
+
 @api_router.get("/zones/{species}")
-async def get_approved_zones(species: str):
-    """Get approved collection zones for a species"""
-    # This data should match the smart contract
-    zones = {
-        "Ashwagandha": [
-            {"name": "Madhya Pradesh", "lat": 23.47, "lon": 77.94, "radius_km": 200},
-            {"name": "Rajasthan", "lat": 26.92, "lon": 75.78, "radius_km": 250},
-            {"name": "Gujarat", "lat": 22.31, "lon": 72.13, "radius_km": 150},
-        ],
-        "Tulsi": [
-            {"name": "Uttar Pradesh", "lat": 26.85, "lon": 80.91, "radius_km": 200},
-            {"name": "Madhya Pradesh", "lat": 23.47, "lon": 77.94, "radius_km": 200},
-        ],
-        "Brahmi": [
-            {"name": "Kerala", "lat": 10.85, "lon": 76.27, "radius_km": 150},
-            {"name": "Tamil Nadu", "lat": 11.13, "lon": 78.66, "radius_km": 200},
-        ],
-        "Guduchi": [
-            {"name": "Karnataka", "lat": 15.32, "lon": 75.71, "radius_km": 200},
-            {"name": "Maharashtra", "lat": 19.75, "lon": 75.71, "radius_km": 250},
-        ],
-        "Shatavari": [
-            {"name": "Rajasthan", "lat": 26.92, "lon": 75.78, "radius_km": 200},
-            {"name": "Himachal Pradesh", "lat": 31.10, "lon": 77.17, "radius_km": 150},
-        ],
-    }
-    
-    if species not in zones:
-        return {"species": species, "zones": [], "message": "No specific zones defined"}
-    
-    return {"species": species, "zones": zones[species]}
+async def get_approved_zones(species: str, http_request: Request, geometry: bool = False):
+    """Get approved collection zones for a species (polygon outlines with ?geometry=true)"""
+    zones = zone_registry.current
+    return zone_response(http_request, zones.etag, zones.listing_body(species, geometry))
+
+@api_router.post("/zones/reload")
+async def reload_zones(admin_key: str = Header(...)):
+    """Reload zone files now instead of waiting for the periodic check (admin only)"""
+    if admin_key != os.environ.get("ADMIN_KEY", "herblock-admin-2026"):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+    try:
+        reloaded = await asyncio.to_thread(zone_registry.reload, True)
+    except ZoneRegistryError as e:
+        raise HTTPException(status_code=400, detail=f"Zone file rejected, still serving previous version: {e}")
+    return {"reloaded": reloaded, **zone_registry.describe()}
 
 # ==================== BATCH SYNC ENDPOINT FOR OFFLINE COLLECTIONS ====================
 
@@ -1049,75 +1441,388 @@ class OfflineCollection(BaseModel):
     gps_lon: float
     collected_at: str  # ISO timestamp when actually collected
     notes: Optional[str] = ""
-    photo_base64: Optional[str] = None
+    photo_sha256: Optional[str] = None  # Upload the photo to POST /api/photos first
+    photo_base64: Optional[str] = None  # Deprecated: inline photo, moved to blob storage on sync
 
 class BatchSyncRequest(BaseModel):
     """Request model for syncing multiple offline collections"""
     collector_id: str
     collections: List[OfflineCollection]
 
+# --- Collection photos (content-addressed blob storage) ---
+blob_store = create_blob_store(db)
+THUMBNAIL_SIZES = (128, 256, 512)
+
+async def save_photo(chunks, content_type: str, expected_sha256: Optional[str] = None) -> dict:
+    """Stream a photo into the blob store and record its metadata (once per content hash)"""
+    result = await blob_store.put(chunks, expected_sha256)
+    await db.photos.update_one(
+        {"_id": result["sha256"]},
+        {"$setOnInsert": {"size": result["size"], "content_type": content_type, "uploaded_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return result
+
+async def resolve_sync_photo(collection: OfflineCollection) -> Optional[str]:
+    """Content hash of a synced record's photo; raises ValueError if it cannot be used"""
+    if collection.photo_sha256:
+        sha256 = collection.photo_sha256.lower()
+        if not is_sha256(sha256):
+            raise ValueError("photo_sha256 must be a hex SHA-256 digest")
+        if not await blob_store.exists(sha256):
+            raise ValueError("Photo not uploaded yet - POST it to /api/photos and retry")
+        return sha256
+    if collection.photo_base64:
+        try:
+            data = base64.b64decode(collection.photo_base64.split(",")[-1], validate=True)
+        except ValueError:
+            raise ValueError("photo_base64 is not valid base64")
+        return (await save_photo(iterate_bytes(data), "image/jpeg"))["sha256"]
+    return None
+
+def render_thumbnail(data: bytes, size: int) -> bytes:
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((size, size))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+@api_router.post("/photos", status_code=201)
+async def upload_photo(request: Request, x_content_sha256: Optional[str] = Header(None)):
+    """
+    Upload a collection photo as the raw request body (Content-Type: image/*).
+    The body is streamed to storage in chunks; the response's sha256 goes into
+    the offline record's photo_sha256. Re-uploading the same photo is a no-op.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Send the photo bytes with an image/* Content-Type")
+    try:
+        result = await save_photo(request.stream(), content_type, x_content_sha256.lower() if x_content_sha256 else None)
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BlobDigestMismatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "url": f"/api/photos/{result['sha256']}"}
+
+@api_router.get("/photos/{sha256}")
+async def get_photo(sha256: str):
+    photo = await db.photos.find_one({"_id": sha256}) if is_sha256(sha256) else None
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    # Content-addressed: the bytes behind a URL never change
+    return StreamingResponse(blob_store.read(sha256), media_type=photo.get("content_type", "image/jpeg"),
+                             headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{sha256}"'})
+
+@api_router.get("/photos/{sha256}/thumbnail")
+async def get_photo_thumbnail(sha256: str, size: int = 256):
+    """JPEG thumbnail, rendered on first request and stored as a blob of its own"""
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {THUMBNAIL_SIZES}")
+    if not is_sha256(sha256) or not await blob_store.exists(sha256):
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    thumbnail = await db.photo_thumbnails.find_one({"_id": f"{sha256}:{size}"})
+    if thumbnail:
+        thumb_sha256 = thumbnail["thumbnail_sha256"]
+    else:
+        original = b"".join([chunk async for chunk in blob_store.read(sha256)])
+        try:
+            rendered = await asyncio.to_thread(render_thumbnail, original, size)
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Photo could not be decoded: {e}")
+        thumb_sha256 = (await blob_store.put(iterate_bytes(rendered)))["sha256"]
+        await db.photo_thumbnails.update_one(
+            {"_id": f"{sha256}:{size}"}, {"$set": {"thumbnail_sha256": thumb_sha256}}, upsert=True
+        )
+    return StreamingResponse(blob_store.read(thumb_sha256), media_type="image/jpeg",
+                             headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{thumb_sha256}"'})
+
 @api_router.post("/blockchain/batch-collection")
 async def batch_sync_collections(request: BatchSyncRequest):
     """
     Sync multiple offline collections to blockchain.
-    Used by mobile app when coming back online.
+    Used by mobile app when coming back online. For large or flaky syncs use
+    the resumable session protocol under /api/collector/sync/sessions.
+    """
+    return await sync_offline_collections(request.collector_id, request.collections)
+
+async def sync_offline_collections(collector_id: str, collections: List[OfflineCollection]) -> dict:
+    """
+    Store a batch of offline collections (bulk insert path).
+
+    Idempotent per (collector_id, local_id): records that were already synced
+    (e.g. a retry after a timeout) are not stored again and come back with
+    their original server_id/product_id and "duplicate": true.
     """
+    local_ids = [c.local_id for c in collections]
+    originals = {
+        doc["local_id"]: doc
+        for doc in await db.collection_events.find(
+            {"collector_id": collector_id, "local_id": {"$in": local_ids}},
+            {"_id": 0, "local_id": 1, "id": 1, "product_id": 1}
+        ).to_list(len(local_ids))
+    }
+
+    # Photos must already be in blob storage; legacy inline photos are moved there now
+    new_collections = [c for c in collections if c.local_id not in originals]
+    photo_checks = await asyncio.gather(*(resolve_sync_photo(c) for c in new_collections), return_exceptions=True)
+    photos, failed = {}, {}
+    for collection, photo in zip(new_collections, photo_checks):
+        if isinstance(photo, Exception):
+            failed[collection.local_id] = str(photo)
+        elif photo:
+            photos[collection.local_id] = photo
+
+    # Build and hash every new record up front, then store them in one round trip
+    events = []
+    pending_ids = set()
+    for collection in new_collections:
+        if collection.local_id in failed or collection.local_id in pending_ids:
+            continue
+        pending_ids.add(collection.local_id)
+        event = {
+            "id": str(uuid.uuid4()),
+            "local_id": collection.local_id,  # For mobile app to mark as synced
+            "product_id": f"HB-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}",
+            "event_type": "COLLECTION",
+            "species_name": collection.species,
+            "quantity_kg": collection.quantity_kg,
+            "gps": {"lat": collection.gps_lat, "lon": collection.gps_lon},
+            "collector_id": collector_id,
+            "timestamp": datetime.now(timezone.utc),
+            "collected_at": collection.collected_at,
+            "notes": collection.notes or "",
+            "is_offline_sync": True,
+            "blockchain_hash": ""
+        }
+        if collection.local_id in photos:
+            event["photo_sha256"] = photos[collection.local_id]
+        event["blockchain_hash"] = calculate_hash({k: v for k, v in event.items() if k != "blockchain_hash"})
+        events.append(event)
+
+    errors = await insert_many_fingerprinted(db.collection_events, events, [e["product_id"] for e in events])
+
+    # A concurrent retry stored some of these first: report its records instead
+    raced = [events[i]["local_id"] for i, error in errors.items() if error.get("code") == 11000]
+    if raced:
+        async for doc in db.collection_events.find(
+            {"collector_id": collector_id, "local_id": {"$in": raced}},
+            {"_id": 0, "local_id": 1, "id": 1, "product_id": 1}
+        ):
+            originals[doc["local_id"]] = doc
+    synced = [event for i, event in enumerate(events) if i not in errors]
+    failed.update({events[i]["local_id"]: error.get("errmsg", "write failed")
+                   for i, error in errors.items() if events[i]["local_id"] not in originals})
+
+    # Each record starts its own product chain, so the chain writes run concurrently
+    tx_results = []
+    if synced:
+        _, tx_results, _ = await asyncio.gather(
+            db.collectors.update_one(
+                {"collector_id": collector_id},
+                {"$inc": {"total_collections": len(synced)}}
+            ),
+            asyncio.gather(
+                *(create_blockchain_transaction(e["product_id"], "offline_collection", without_mongo_id(e)) for e in synced),
+                return_exceptions=True
+            ),
+            asyncio.gather(*(live_events.publish("collection.synced", without_mongo_id(e)) for e in synced))
+        )
+    stored = {event["local_id"]: (event, tx) for event, tx in zip(synced, tx_results)}
+
     results = []
-    success_count = 0
-    error_count = 0
-    
-    for collection in request.collections:
-        try:
-            # Create collection event
-            event = {
-                "id": str(uuid.uuid4()),
-                "local_id": collection.local_id,  # For mobile app to mark as synced
-                "product_id": f"HB-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}",
-                "event_type": "COLLECTION",
-                "species_name": collection.species,
-                "quantity_kg": collection.quantity_kg,
-                "gps": {"lat": collection.gps_lat, "lon": collection.gps_lon},
-                "collector_id": request.collector_id,
-                "timestamp": datetime.now(timezone.utc),
-                "collected_at": collection.collected_at,
-                "notes": collection.notes or "",
-                "is_offline_sync": True,
-                "blockchain_hash": ""
-            }
-            
-            # Insert into database
-            await db.collection_events.insert_one(event)
-            
-            # Update collector stats
-            await db.collectors.update_one(
-                {"collector_id": request.collector_id},
-                {"$inc": {"total_collections": 1}}
-            )
-            
-            results.append({
-                "local_id": collection.local_id,
-                "server_id": event["id"],
-                "product_id": event["product_id"],
-                "status": "success"
-            })
-            success_count += 1
-            
-        except Exception as e:
-            results.append({
-                "local_id": collection.local_id,
-                "status": "error",
-                "error": str(e)
-            })
-            error_count += 1
-    
+    for local_id in local_ids:
+        if local_id in failed:
+            results.append({"local_id": local_id, "status": "error", "error": failed[local_id]})
+            continue
+        if local_id in stored:
+            event, tx = stored[local_id]
+            result = {"local_id": local_id, "server_id": event["id"], "product_id": event["product_id"], "status": "success"}
+            if isinstance(tx, Exception):
+                # Stored, but the hash-chain entry is missing
+                result["tx_error"] = str(tx)
+        else:
+            original = originals[local_id]
+            result = {"local_id": local_id, "server_id": original["id"], "product_id": original["product_id"],
+                      "status": "success", "duplicate": True}
+        results.append(result)
+
     return {
-        "success": error_count == 0,
-        "total": len(request.collections),
-        "synced": success_count,
-        "errors": error_count,
+        "success": not failed,
+        "total": len(collections),
+        "synced": len(synced),
+        "duplicates": sum(1 for r in results if r.get("duplicate")),
+        "errors": len(failed),
         "results": results
     }
 
+# ==================== RESUMABLE SYNC SESSIONS ====================
+# Large offline syncs are sent as numbered chunks. Every chunk is stored
+# through the bulk path as soon as it arrives and acknowledged, so a dropped
+# connection only costs the chunk in flight: the app asks which chunks the
+# server has and resumes from there.
+
+SYNC_MAX_CHUNK_RECORDS = int(os.environ.get("SYNC_MAX_CHUNK_RECORDS", "200"))
+
+class SyncSessionOpen(BaseModel):
+    collector_id: str
+    total_chunks: Optional[int] = None  # Known up front lets /status list missing chunks
+    total_records: Optional[int] = None
+
+class SyncChunk(BaseModel):
+    collections: List[OfflineCollection]
+
+async def get_sync_session(session_id: str) -> dict:
+    session = await db.sync_sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Sync session not found or expired")
+    return session
+
+def sync_session_status(session: dict) -> dict:
+    received = sorted(session.get("received_chunks", []))
+    status = {
+        "session_id": session["_id"],
+        "collector_id": session["collector_id"],
+        "status": session["status"],
+        "received_chunks": received,
+        "total_chunks": session.get("total_chunks"),
+        "counts": session.get("counts", {}),
+        "created_at": session["created_at"]
+    }
+    if session.get("total_chunks") is not None:
+        status["missing_chunks"] = sorted(set(range(session["total_chunks"])) - set(received))
+    return status
+
+@collector_router.post("/sync/sessions", status_code=201)
+async def open_sync_session(request: SyncSessionOpen):
+    """Start a resumable sync; upload chunks 0..n-1 with PUT .../chunks/{seq}"""
+    if request.total_chunks is not None and request.total_chunks < 1:
+        raise HTTPException(status_code=400, detail="total_chunks must be at least 1")
+    session = {
+        "_id": f"SYNC-{uuid.uuid4().hex}",
+        "collector_id": request.collector_id,
+        "total_chunks": request.total_chunks,
+        "total_records": request.total_records,
+        "status": "open",
+        "received_chunks": [],
+        "counts": {"synced": 0, "duplicates": 0, "errors": 0},
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.sync_sessions.insert_one(session)
+    return {**sync_session_status(session), "max_chunk_records": SYNC_MAX_CHUNK_RECORDS}
+
+@collector_router.put("/sync/sessions/{session_id}/chunks/{seq}")
+async def upload_sync_chunk(session_id: str, seq: int, chunk: SyncChunk):
+    """
+    Store one chunk and acknowledge it with per-record results.
+    Re-sending an acknowledged chunk returns the original acknowledgement.
+    """
+    session = await get_sync_session(session_id)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail=f"Sync session is {session['status']}")
+    if seq < 0 or (session.get("total_chunks") is not None and seq >= session["total_chunks"]):
+        raise HTTPException(status_code=400, detail="Chunk number out of range")
+    if len(chunk.collections) > SYNC_MAX_CHUNK_RECORDS:
+        raise HTTPException(status_code=413, detail=f"A chunk may hold at most {SYNC_MAX_CHUNK_RECORDS} records")
+
+    # Claim the chunk so concurrent retries of it don't both run
+    chunk_id = f"{session_id}:{seq}"
+    try:
+        await db.sync_chunks.insert_one({
+            "_id": chunk_id, "session_id": session_id, "seq": seq,
+            "status": "processing", "received_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        existing = await db.sync_chunks.find_one({"_id": chunk_id})
+        if existing and existing["status"] == "acknowledged":
+            return existing["ack"]
+        # A claim left behind by a crashed worker is released for the next retry
+        await db.sync_chunks.delete_one({
+            "_id": chunk_id, "status": "processing",
+            "received_at": {"$lt": datetime.now(timezone.utc) - timedelta(minutes=2)}
+        })
+        raise HTTPException(status_code=409, detail="Chunk is still being processed", headers={"Retry-After": "2"})
+    # complete_sync_session closes the session before looking for claims, so
+    # either it sees this claim or this check sees the session closing
+    current = await db.sync_sessions.find_one({"_id": session_id}, {"status": 1})
+    if not current or current["status"] != "open":
+        await db.sync_chunks.delete_one({"_id": chunk_id})
+        raise HTTPException(status_code=409, detail=f"Sync session is {current['status'] if current else 'expired'}")
+
+    try:
+        result = await sync_offline_collections(session["collector_id"], chunk.collections)
+    except Exception:
+        await db.sync_chunks.delete_one({"_id": chunk_id})
+        raise
+
+    ack = {
+        "session_id": session_id,
+        "seq": seq,
+        "status": "acknowledged",
+        "synced": result["synced"],
+        "duplicates": result["duplicates"],
+        "errors": result["errors"],
+        "results": result["results"]
+    }
+    await asyncio.gather(
+        db.sync_chunks.update_one({"_id": chunk_id}, {"$set": {"status": "acknowledged", "ack": ack}}),
+        db.sync_sessions.update_one(
+            {"_id": session_id},
+            {
+                "$addToSet": {"received_chunks": seq},
+                "$inc": {
+                    "counts.synced": result["synced"],
+                    "counts.duplicates": result["duplicates"],
+                    "counts.errors": result["errors"]
+                },
+                "$set": {"updated_at": datetime.now(timezone.utc)}
+            }
+        )
+    )
+    return ack
+
+@collector_router.get("/sync/sessions/{session_id}/status")
+async def get_sync_session_status(session_id: str):
+    """Which chunks the server already has; resume by sending the missing ones"""
+    return sync_session_status(await get_sync_session(session_id))
+
+@collector_router.post("/sync/sessions/{session_id}/complete")
+async def complete_sync_session(session_id: str):
+    """
+    Close the session once every chunk is acknowledged; returns all per-record results.
+    Refused while any chunk is still being processed (total_chunks may be unknown).
+    """
+    session = await get_sync_session(session_id)
+    status = sync_session_status(session)
+    if status.get("missing_chunks"):
+        raise HTTPException(status_code=409, detail={"error": "chunks_missing", "missing_chunks": status["missing_chunks"]})
+
+    # Stop new chunks first, then look for chunks still in flight
+    if session["status"] == "open":
+        await db.sync_sessions.update_one({"_id": session_id, "status": "open"}, {"$set": {"status": "completing"}})
+    processing = await db.sync_chunks.find(
+        {"session_id": session_id, "status": "processing"}, {"_id": 0, "seq": 1}
+    ).to_list(None)
+    if processing:
+        await db.sync_sessions.update_one({"_id": session_id, "status": "completing"}, {"$set": {"status": "open"}})
+        raise HTTPException(
+            status_code=409,
+            detail={"error": "chunks_processing", "processing_chunks": sorted(c["seq"] for c in processing)},
+            headers={"Retry-After": "2"}
+        )
+
+    chunks = await db.sync_chunks.find(
+        {"session_id": session_id, "status": "acknowledged"}, {"_id": 0, "ack.results": 1, "seq": 1}
+    ).sort("seq", 1).to_list(None)
+    await db.sync_sessions.update_one(
+        {"_id": session_id}, {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc)}}
+    )
+    status["status"] = "completed"
+    return {**status, "results": [r for c in chunks for r in c["ack"]["results"]]}
+
 app.include_router(collector_router)
 
 # ==================== HARDWARE / IoT INTAKE ENDPOINT ====================
@@ -1164,9 +1869,92 @@ class HardwareIntakeRequest(BaseModel):
     notes: Optional[str] = ""
 
 
+class HardwareReading(BaseModel):
+    """One reading inside an /intake/batch upload"""
+    seq: Optional[int] = None  # Device-side sequence number, echoed back in the results
+    herb_type: str
+    weight_grams: float
+    moisture_percent: Optional[float] = None
+    latitude: float
+    longitude: float
+    collector_id: Optional[str] = "DEVICE"
+    quality_grade: str = "B"
+    notes: Optional[str] = ""
+
+
+class HardwareIntakeBatchRequest(BaseModel):
+    device_id: str
+    # Random per device boot: with it, (device_id, boot_id, seq) identifies a
+    # reading, so a resent one is answered from the original record
+    boot_id: Optional[str] = Field(None, max_length=64)
+    readings: List[HardwareReading]
+
+
+INTAKE_BATCH_MAX = int(os.environ.get("INTAKE_BATCH_MAX", "100"))
+
+
+def build_intake_event(reading, device_id: str, device: dict, geo_result: dict,
+                       sequence: Optional[dict] = None) -> dict:
+    """Hashed collection record for a validated device reading (`sequence`: device_boot_id/device_seq)"""
+    # Grade is set by the trained collector — they press A/B/C on the device
+    grade = reading.quality_grade.upper()
+    if grade not in ("A", "B", "C"):
+        grade = "B"  # safe fallback
+
+    batch_id = f"{reading.herb_type[:3].upper()}-{grade}-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
+    collector = reading.collector_id or device.get("default_collector", device_id)
+
+    event = {
+        "id": str(uuid.uuid4()),
+        "product_id": batch_id,
+        "source": "hardware_device",
+        "device_id": device_id,
+        "collector_id": collector,
+        "collector_name": device.get("location", device_id),
+        "species_name": reading.herb_type,
+        "latitude": reading.latitude,
+        "longitude": reading.longitude,
+        "location_name": device.get("location", "Field Device"),
+        "quantity_kg": round(reading.weight_grams / 1000, 3),
+        "weight_grams": reading.weight_grams,
+        "moisture_percent": reading.moisture_percent,
+        # Collector-certified grade — immutable once on blockchain
+        "quality_grade": grade,
+        "grade_certified_by": collector,
+        "weather_conditions": "Captured by device",
+        "notes": reading.notes or "",
+        "geo_validated": True,
+        "season_validated": True,
+        "geo_validation_detail": geo_result,
+        "blockchain_hash": "",
+        "harvest_date": datetime.now(timezone.utc),
+        "timestamp": datetime.now(timezone.utc),
+        **(sequence or {}),
+    }
+    event["blockchain_hash"] = calculate_hash({k: v for k, v in event.items() if k != "blockchain_hash"})
+    return event
+
+
+async def find_intake_originals(device_id: str, boot_id: str, seqs: list) -> Dict[int, dict]:
+    """Stored intake records for device-side sequence numbers of one boot, by seq"""
+    if not seqs:
+        return {}
+    docs = await db.collection_events.find(
+        {"device_id": device_id, "device_boot_id": boot_id, "device_seq": {"$in": seqs}},
+        {"_id": 0, "device_seq": 1, "id": 1, "product_id": 1, "quality_grade": 1}
+    ).to_list(len(seqs))
+    return {doc["device_seq"]: doc for doc in docs}
+
+
+def client_address(request: Request) -> Optional[str]:
+    """Remote address of the caller (the proxy's, unless the server runs with --proxy-headers)"""
+    return request.client.host if request.client else None
+
+
 @hardware_router.post("/intake")
 async def hardware_intake(
     request: HardwareIntakeRequest,
+    http_request: Request,
     x_device_key: str = Header(...)
 ):
     """
@@ -1175,78 +1963,54 @@ async def hardware_intake(
     then commits immutable record to blockchain.
     Returns grade + accepted/rejected so OLED and LEDs respond.
     """
-    # 1. Authenticate device
-    device = await db.devices.find_one({"api_key": x_device_key, "active": True})
+    # 1. Authenticate device (in-memory registry, see services/device_registry.py)
+    device = await device_registry.authenticate(x_device_key, client_address(http_request))
     if not device:
         raise HTTPException(status_code=401, detail="Invalid or inactive device key")
 
     # 2. GPS geo-fence validation (patent feature)
     geo_result = validate_gps_geofence(request.latitude, request.longitude, request.herb_type)
     if not geo_result["valid"]:
-        return {
+        await rollup_engine.record_rejection({
+            "species_name": request.herb_type,
+            "collector_id": request.collector_id or device.get("default_collector", request.device_id),
+            "device_id": request.device_id
+        })
+        rejection = {
             "status": "rejected",
             "grade": "REJECTED",
             "reason": geo_result.get("reason", "GPS outside approved zone"),
             "device_id": request.device_id,
             "validation": {"gps": geo_result}
         }
+        await live_events.publish("intake.rejected", rejection)
+        return rejection
 
     # 3. Harvest season validation
     current_month = datetime.now(timezone.utc).month
     season_result = validate_harvest_season(request.herb_type, current_month)
     demo_mode = os.environ.get("DEMO_MODE", "false").lower() == "true"
     if not season_result["valid"] and not demo_mode:
-        return {
+        rejection = {
             "status": "rejected",
             "grade": "REJECTED",
             "reason": season_result.get("reason"),
             "device_id": request.device_id,
             "validation": {"season": season_result}
         }
+        await live_events.publish("intake.rejected", rejection)
+        return rejection
 
     # 4. Build collection record
-    # Grade is set by the trained collector — they press A/B/C on the device
-    grade = request.quality_grade.upper()
-    if grade not in ("A", "B", "C"):
-        grade = "B"  # safe fallback
-
-    batch_id = f"{request.herb_type[:3].upper()}-{grade}-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
-    event_id = str(uuid.uuid4())
-    collector = request.collector_id or device.get("default_collector", request.device_id)
-
-    event = {
-        "id": event_id,
-        "product_id": batch_id,
-        "source": "hardware_device",
-        "device_id": request.device_id,
-        "collector_id": collector,
-        "collector_name": device.get("location", request.device_id),
-        "species_name": request.herb_type,
-        "latitude": request.latitude,
-        "longitude": request.longitude,
-        "location_name": device.get("location", "Field Device"),
-        "quantity_kg": round(request.weight_grams / 1000, 3),
-        "weight_grams": request.weight_grams,
-        "moisture_percent": request.moisture_percent,
-        # Collector-certified grade — immutable once on blockchain
-        "quality_grade": grade,
-        "grade_certified_by": collector,
-        "weather_conditions": "Captured by device",
-        "notes": request.notes or "",
-        "geo_validated": True,
-        "season_validated": True,
-        "geo_validation_detail": geo_result,
-        "blockchain_hash": "",
-        "harvest_date": datetime.now(timezone.utc),
-        "timestamp": datetime.now(timezone.utc),
-    }
+    event = build_intake_event(request, request.device_id, device, geo_result)
+    batch_id, event_id, grade, collector = event["product_id"], event["id"], event["quality_grade"], event["collector_id"]
 
-    # 5. Hash and store
-    event["blockchain_hash"] = calculate_hash({k: v for k, v in event.items() if k != "blockchain_hash"})
-    await db.collection_events.insert_one(event)
+    # 5. Store (hashed in build_intake_event)
+    await insert_fingerprinted(db.collection_events, event, batch_id)
 
     # 6. Blockchain transaction
     tx = await create_blockchain_transaction(batch_id, "hardware_collection", event)
+    await live_events.publish("intake.accepted", without_mongo_id(event))
 
     return {
         "status": "accepted",
@@ -1262,6 +2026,137 @@ async def hardware_intake(
     }
 
 
+@hardware_router.post("/intake/batch")
+async def hardware_intake_batch(
+    request: HardwareIntakeBatchRequest,
+    http_request: Request,
+    x_device_key: str = Header(...)
+):
+    """
+    Several readings from one device in one request (buffered offline, or a
+    run of sacks). One authentication, one validation pass, one bulk insert.
+
+    With `Accept: text/plain` the response is compact for the firmware:
+        OK <accepted> <rejected>
+        <seq>,<grade A|B|C or R>,<batch_id or GPS|SEASON|ERR>
+    one line per reading, in request order. Otherwise JSON.
+    """
+    device = await device_registry.authenticate(x_device_key, client_address(http_request))
+    if not device:
+        raise HTTPException(status_code=401, detail="Invalid or inactive device key")
+    if not request.readings:
+        raise HTTPException(status_code=400, detail="No readings")
+    if len(request.readings) > INTAKE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {INTAKE_BATCH_MAX} readings per batch")
+
+    # Readings already stored under this boot (a retried flush) are answered
+    # from their original records instead of being stored again
+    sequenced = request.boot_id is not None
+    originals = {}
+    if sequenced:
+        originals = await find_intake_originals(request.device_id, request.boot_id,
+                                                [r.seq for r in request.readings if r.seq is not None])
+
+    # Validation pass: one vectorised geo-fence call over the distinct positions,
+    # one season check per species
+    positions = list(dict.fromkeys((r.herb_type, r.latitude, r.longitude) for r in request.readings))
+    geo_checks = dict(zip(positions, zone_registry.current.engine.validate_many(
+        [p[1] for p in positions], [p[2] for p in positions], [p[0] for p in positions]
+    )))
+    current_month = datetime.now(timezone.utc).month
+    demo_mode = os.environ.get("DEMO_MODE", "false").lower() == "true"
+    season_checks = {herb: validate_harvest_season(herb, current_month) for herb in {p[0] for p in positions}}
+
+    outcomes = []   # per reading: (event, None) or (None, reason code)
+    events = []
+    rejections = []
+    pending_seqs = set()
+    for i, reading in enumerate(request.readings):
+        seq = reading.seq if reading.seq is not None else i
+        if sequenced and reading.seq is not None and (seq in originals or seq in pending_seqs):
+            outcomes.append((seq, None, "DUP", None))
+            continue
+        geo_result = geo_checks[(reading.herb_type, reading.latitude, reading.longitude)]
+        season_result = season_checks[reading.herb_type]
+        if not geo_result["valid"]:
+            outcomes.append((seq, None, "GPS", geo_result.get("reason", "GPS outside approved zone")))
+            rejections.append(reading)
+        elif not season_result["valid"] and not demo_mode:
+            outcomes.append((seq, None, "SEASON", season_result.get("reason")))
+        else:
+            sequence = {"device_boot_id": request.boot_id, "device_seq": reading.seq} if sequenced and reading.seq is not None else None
+            event = build_intake_event(reading, request.device_id, device, geo_result, sequence)
+            if sequence:
+                pending_seqs.add(reading.seq)
+            events.append(event)
+            outcomes.append((seq, event, None, None))
+
+    errors = await insert_many_fingerprinted(db.collection_events, events, [e["product_id"] for e in events])
+    # A concurrent retry stored some of these first: report its records instead
+    raced = [events[i]["device_seq"] for i, error in errors.items() if error.get("code") == 11000 and "device_seq" in events[i]]
+    if raced:
+        originals.update(await find_intake_originals(request.device_id, request.boot_id, raced))
+    failed_ids = {events[i]["id"]: error.get("errmsg", "write failed") for i, error in errors.items()}
+    stored = [e for e in events if e["id"] not in failed_ids]
+    # A seq repeated within this request is answered from its first reading
+    for event in stored:
+        if "device_seq" in event:
+            originals.setdefault(event["device_seq"], event)
+
+    # Chain writes (one product chain per reading), rollups and live feed run concurrently
+    await asyncio.gather(
+        asyncio.gather(
+            *(create_blockchain_transaction(e["product_id"], "hardware_collection", without_mongo_id(e)) for e in stored),
+            return_exceptions=True
+        ),
+        *(rollup_engine.record_rejection({
+            "species_name": r.herb_type,
+            "collector_id": r.collector_id or device.get("default_collector", request.device_id),
+            "device_id": request.device_id
+        }) for r in rejections),
+        *(live_events.publish("intake.accepted", without_mongo_id(e)) for e in stored)
+    )
+
+    results = []
+    for seq, event, code, reason in outcomes:
+        if event is not None and event["id"] in failed_ids:
+            raced_seq = "device_seq" in event and seq in originals
+            event, code, reason = None, "DUP" if raced_seq else "ERR", failed_ids[event["id"]]
+        if code == "DUP":
+            original = originals.get(seq)
+            if original is None:
+                code, reason = "ERR", "duplicate of a reading that was not stored"
+            else:
+                results.append({"seq": seq, "status": "accepted", "grade": original["quality_grade"],
+                                "batch_id": original["product_id"], "event_id": original["id"], "duplicate": True})
+                continue
+        if event is not None:
+            results.append({"seq": seq, "status": "accepted", "grade": event["quality_grade"],
+                            "batch_id": event["product_id"], "event_id": event["id"]})
+        else:
+            results.append({"seq": seq, "status": "rejected", "grade": "REJECTED", "code": code, "reason": reason})
+    accepted = sum(1 for r in results if r["status"] == "accepted")
+    rejected_results = [r for r in results if r["status"] == "rejected"]
+    if rejected_results:
+        await live_events.publish("intake.rejected", {"device_id": request.device_id, "results": rejected_results})
+
+    if "text/plain" in http_request.headers.get("accept", ""):
+        lines = [f"OK {accepted} {len(results) - accepted}"]
+        for r in results:
+            if r["status"] == "accepted":
+                lines.append(f"{r['seq']},{r['grade']},{r['batch_id']}")
+            else:
+                lines.append(f"{r['seq']},R,{r['code']}")
+        return Response(content="\n".join(lines) + "\n", media_type="text/plain")
+
+    return {
+        "device_id": request.device_id,
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }
+
+
 @hardware_router.get("/intake/events")
 async def get_hardware_intake_events(limit: int = 20):
     """Recent hardware intake events — for live dashboard feed."""
@@ -1273,6 +2168,44 @@ async def get_hardware_intake_events(limit: int = 20):
     return {"events": events, "count": len(events)}
 
 
+@hardware_router.get("/intake/stream")
+async def stream_intake_events(
+    request: Request,
+    types: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Live dashboard feed (Server-Sent Events).
+    Event types: intake.accepted, intake.rejected, collection.synced,
+    tx.pending, tx.committed, tx.rejected, tx.failed; `types` filters them
+    (comma-separated). Browsers resume via the Last-Event-ID header; a
+    `reset` event means events were missed and /api/intake/events should
+    be reloaded.
+    """
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event id")
+    wanted = set(t.strip() for t in types.split(",") if t.strip()) | {"reset"} if types else None
+    subscription = live_events.subscribe(resume_from, wanted)
+
+    async def frames():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await live_events.next_event(subscription, timeout=15)
+                except OverflowError:
+                    # Too slow: close, the client reconnects and resumes from the buffer
+                    return
+                yield format_sse(event) if event else ": keep-alive\n\n"
+        finally:
+            live_events.unsubscribe(subscription)
+
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @hardware_router.post("/devices/register")
 async def register_device(
     device_id: str,
@@ -1287,21 +2220,42 @@ async def register_device(
         raise HTTPException(status_code=400, detail="Device already registered")
 
     api_key = f"hb-device-{str(uuid.uuid4()).replace('-', '')}"
-    await db.devices.insert_one({
+    device = {
         "device_id": device_id,
         "api_key": api_key,
         "location": location,
         "default_collector": default_collector,
         "active": True,
         "registered_at": datetime.now(timezone.utc)
-    })
+    }
+    await db.devices.insert_one(device)
+    device_registry.register(device)
     return {
         "device_id": device_id,
         "api_key": api_key,
         "note": "Flash this key into the ESP32 firmware. It will not be shown again."
     }
 
+
+@hardware_router.post("/devices/{device_id}/deactivate")
+async def deactivate_device(device_id: str, admin_key: str = Header(...)):
+    """
+    Revoke a device's API key, e.g. when the unit is lost (admin only).
+    Other workers drop it at their next registry refresh (DEVICE_REGISTRY_REFRESH_SECONDS, default 15).
+    """
+    if admin_key != os.environ.get("ADMIN_KEY", "herblock-admin-2026"):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+    result = await db.devices.update_one(
+        {"device_id": device_id},
+        {"$set": {"active": False, "deactivated_at": datetime.now(timezone.utc)}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Device not found")
+    device_registry.invalidate(device_id)
+    return {"device_id": device_id, "active": False}
+
 app.include_router(hardware_router)
+app.include_router(api_router)
 
 # CORS configuration
 origins = [
@@ -1312,6 +2266,60 @@ origins = [
     "https://sih-blockchain.vercel.app",  # Production frontend
     "*",  # Allow mobile app (should be restricted in production)
 ]
+idempotency_store = IdempotencyStore(db)
+
+
+def idempotent_response(body: bytes, status_code: int, raw_headers: list) -> Response:
+    """Response for a buffered body, keeping repeated headers (e.g. Set-Cookie) as they were"""
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = [
+        (name, value) for name, value in raw_headers
+        if name.lower() not in UNSTORED_HEADERS
+    ] + response.raw_headers
+    return response
+
+
+@app.middleware("http")
+async def honor_idempotency_key(request: Request, call_next):
+    """
+    Writes carrying an Idempotency-Key header run once; retries with the same
+    key (per credential, or per client address on unauthenticated routes)
+    get the stored response back.
+    """
+    key = request.headers.get("idempotency-key")
+    if not key or request.method not in ("POST", "PUT", "PATCH", "DELETE"):
+        return await call_next(request)
+    if request.headers.get("content-type", "").startswith("image/"):
+        # Photo uploads are content-addressed (already idempotent) and must stay streamed
+        return await call_next(request)
+    if len(key) > 255:
+        return JSONResponse(status_code=400, content={"detail": "Idempotency-Key is too long"})
+
+    credential = request.headers.get("authorization") or request.headers.get("x-device-key")
+    scope = key_scope(key, credential, client_address(request))
+    fingerprint = request_fingerprint(request.method, str(request.url.path) + "?" + request.url.query, await request.body())
+    try:
+        stored = await idempotency_store.begin(scope, fingerprint)
+    except IdempotencyConflict as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": str(e)})
+    if stored is not None:
+        return idempotent_response(stored["body"], stored["status_code"],
+                                   idempotency_store.stored_headers(stored) + [(b"idempotent-replayed", b"true")])
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        await idempotency_store.release(scope)
+        raise
+    if response.status_code >= 500:
+        # Not a final answer (e.g. 503 overloaded): let the retry run it
+        await idempotency_store.release(scope)
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    await idempotency_store.complete(scope, response.status_code, body, response.raw_headers)
+    return idempotent_response(body, response.status_code, response.raw_headers)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
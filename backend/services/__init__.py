@@ -12,6 +12,8 @@ from .fabric_service import (
     trace_product_on_blockchain,
     get_blockchain_status
 )
+from .fabric_scheduler import FabricOverloadedError
+from .circuit_breaker import CircuitOpenError
 
 __all__ = [
     'fabric_service',
@@ -19,5 +21,7 @@ __all__ = [
     'record_collection_on_blockchain',
     'record_quality_test_on_blockchain',
     'trace_product_on_blockchain',
-    'get_blockchain_status'
+    'get_blockchain_status',
+    'FabricOverloadedError',
+    'CircuitOpenError'
 ]
@@ -0,0 +1,183 @@
+"""
+HerBlock Blob Store
+Content-addressed storage for collection photos
+
+Uploads are streamed chunk by chunk into a temporary file while their
+SHA-256 is computed, so memory use does not depend on the photo size.
+The digest is the blob's address: uploading the same photo twice stores
+it once, and collection records only carry the 64-character hash.
+
+Backends:
+- LocalBlobStore: files under BLOB_STORE_PATH, sharded as ab/cd/<sha256>
+- GridFSBlobStore: MongoDB GridFS bucket `blobs`, filename = sha256
+
+Disk I/O runs in worker threads (asyncio.to_thread) so a slow disk never
+stalls the event loop. In GridFS a unique index on blobs.files.filename
+settles concurrent uploads of the same photo: the loser drops its chunks.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import tempfile
+from typing import AsyncIterator, Dict, Any, Optional
+
+from bson import ObjectId
+from gridfs.errors import FileExists
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+CHUNK_SIZE = 256 * 1024
+
+
+class BlobTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+class BlobDigestMismatch(Exception):
+    """Raised when an upload does not hash to the digest the client announced"""
+
+
+def is_sha256(value: str) -> bool:
+    return bool(SHA256_RE.match(value or ""))
+
+
+async def _spool(chunks: AsyncIterator[bytes], directory: str, max_bytes: int):
+    """Write chunks to a temp file; returns (path, sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = await asyncio.to_thread(tempfile.mkstemp, dir=directory, prefix=".upload-")
+    spool = os.fdopen(fd, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise BlobTooLarge(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            await asyncio.to_thread(spool.write, chunk)
+        await asyncio.to_thread(spool.close)
+    except BaseException:
+        spool.close()
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+async def iterate_bytes(data: bytes) -> AsyncIterator[bytes]:
+    """Adapt an in-memory payload to the streaming put() interface"""
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE]
+
+
+class LocalBlobStore:
+    """Content-addressed files on local disk"""
+
+    name = "local"
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def _publish(self, temp_path: str, sha256: str) -> bool:
+        """Move a spooled upload to its address; False if the blob was already there"""
+        final_path = self.path(sha256)
+        if os.path.exists(final_path):
+            return False
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Atomic publish: readers never see a partial blob
+        os.replace(temp_path, final_path)
+        return True
+
+    async def put(self, chunks: AsyncIterator[bytes], expected_sha256: Optional[str] = None) -> Dict[str, Any]:
+        temp_path, sha256, size = await _spool(chunks, self.root, self.max_bytes)
+        try:
+            if expected_sha256 and expected_sha256 != sha256:
+                raise BlobDigestMismatch(f"Upload hashes to {sha256}, expected {expected_sha256}")
+            published = await asyncio.to_thread(self._publish, temp_path, sha256)
+            return {"sha256": sha256, "size": size, "deduplicated": not published}
+        finally:
+            await asyncio.to_thread(_remove, temp_path)
+
+    async def exists(self, sha256: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(sha256))
+
+    async def read(self, sha256: str) -> AsyncIterator[bytes]:
+        blob = await asyncio.to_thread(open, self.path(sha256), "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(blob.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            blob.close()
+
+
+class GridFSBlobStore:
+    """Content-addressed files in a MongoDB GridFS bucket"""
+
+    name = "gridfs"
+
+    def __init__(self, db, max_bytes: int, spool_dir: Optional[str] = None):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="blobs", chunk_size_bytes=CHUNK_SIZE)
+        self.files = db["blobs.files"]
+        self.chunks = db["blobs.chunks"]
+        self.max_bytes = max_bytes
+        self.spool_dir = spool_dir or tempfile.gettempdir()
+
+    async def put(self, chunks: AsyncIterator[bytes], expected_sha256: Optional[str] = None) -> Dict[str, Any]:
+        # Spool first: the digest (the filename) is only known at the end
+        temp_path, sha256, size = await _spool(chunks, self.spool_dir, self.max_bytes)
+        try:
+            if expected_sha256 and expected_sha256 != sha256:
+                raise BlobDigestMismatch(f"Upload hashes to {sha256}, expected {expected_sha256}")
+            if await self.exists(sha256):
+                return {"sha256": sha256, "size": size, "deduplicated": True}
+            file_id = ObjectId()
+            spool = await asyncio.to_thread(open, temp_path, "rb")
+            try:
+                await self.bucket.upload_from_stream_with_id(file_id, sha256, spool)
+            except FileExists:
+                # A concurrent upload of the same photo won the unique filename index
+                await self.chunks.delete_many({"files_id": file_id})
+                return {"sha256": sha256, "size": size, "deduplicated": True}
+            finally:
+                spool.close()
+            return {"sha256": sha256, "size": size, "deduplicated": False}
+        finally:
+            await asyncio.to_thread(os.unlink, temp_path)
+
+    async def exists(self, sha256: str) -> bool:
+        return await self.files.find_one({"filename": sha256}, {"_id": 1}) is not None
+
+    async def read(self, sha256: str) -> AsyncIterator[bytes]:
+        stream = await self.bucket.open_download_stream_by_name(sha256)
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+
+def create_blob_store(db) -> Any:
+    """Backend chosen by BLOB_STORE (local | gridfs)"""
+    max_bytes = int(os.environ.get("BLOB_MAX_BYTES", str(15 * 1024 * 1024)))
+    if os.environ.get("BLOB_STORE", "local").lower() == "gridfs":
+        return GridFSBlobStore(db, max_bytes)
+    root = os.environ.get("BLOB_STORE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "blobs"))
+    return LocalBlobStore(root, max_bytes)
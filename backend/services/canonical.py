@@ -0,0 +1,135 @@
+"""
+HerBlock Canonical Encoding
+Deterministic JSON bytes for hashing (Patent Claim 3)
+
+Encoding rules:
+- object keys sorted, no whitespace, UTF-8 (non-ASCII is not escaped)
+- datetimes in UTC with millisecond precision: 2026-01-15T09:30:00.123Z
+  (naive datetimes are taken as UTC; MongoDB stores milliseconds, so a
+  document hashes the same before and after a round trip)
+- floats in shortest round-trip form (12.5, 1e+16); non-finite floats as null
+- Pydantic models, dataclasses, dates, enums, sets and UUIDs have fixed forms;
+  anything else falls back to str()
+
+orjson is used when installed. Its output is only taken when it is
+byte-identical to the standard library's (it formats very large and very
+small floats differently, so payloads containing those are re-encoded),
+hence hashes never depend on which backend is present.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import re
+import json
+import math
+import hashlib
+import dataclasses
+from datetime import datetime, date, time, timezone
+from enum import Enum
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# Floats orjson formats differently from json: exponents (1e16 vs 1e+16)
+# and 1e-5 <= |x| < 1e-4 (0.00001 vs 1e-05). Both patterns start with a
+# literal so re can skip ahead to candidates instead of trying every byte.
+_ORJSON_EXPONENT_RE = re.compile(rb'e-?[0-9]+(?:[,}\]]|$)')
+_ORJSON_SMALL_FLOAT_RE = re.compile(rb'(?:^|[:,\[])-?0\.0000')
+
+
+def format_datetime(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="milliseconds") + "Z"
+
+
+def _default(value: Any) -> Any:
+    """Canonical form of values JSON has no type for"""
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=canonical_bytes)
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    return str(value)
+
+
+_ENCODER = json.JSONEncoder(
+    sort_keys=True,
+    separators=(",", ":"),
+    ensure_ascii=False,
+    allow_nan=False,
+    default=_default
+)
+
+_ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson is not None else 0
+)
+
+
+def _without_non_finite(value: Any) -> Any:
+    """Replace NaN/Infinity with None (orjson's behaviour) so both backends agree"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _without_non_finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_non_finite(v) for v in value]
+    if hasattr(value, "model_dump") or dataclasses.is_dataclass(value) or isinstance(value, (set, frozenset)):
+        return _without_non_finite(_default(value))
+    return value
+
+
+def _orjson_float_mismatch(encoded: bytes) -> bool:
+    for match in _ORJSON_EXPONENT_RE.finditer(encoded):
+        # Only an "e" right after a digit is a float exponent
+        if encoded[match.start() - 1:match.start()].isdigit():
+            return True
+    return b"0.0000" in encoded and _ORJSON_SMALL_FLOAT_RE.search(encoded) is not None
+
+
+def _fast_bytes(data: Any):
+    """orjson encoding, or None if it could differ from the reference encoding"""
+    if orjson is None:
+        return None
+    try:
+        encoded = orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+    except (TypeError, orjson.JSONEncodeError):
+        # e.g. non-string keys or integers beyond 64 bits
+        return None
+    if _orjson_float_mismatch(encoded):
+        return None
+    return encoded
+
+
+def canonical_bytes(data: Any) -> bytes:
+    """Canonical JSON encoding of `data`"""
+    encoded = _fast_bytes(data)
+    if encoded is not None:
+        return encoded
+    try:
+        return _ENCODER.encode(data).encode("utf-8")
+    except ValueError:
+        return _ENCODER.encode(_without_non_finite(data)).encode("utf-8")
+
+
+def canonical_hash(data: Any) -> str:
+    """SHA-256 hex digest of the canonical encoding"""
+    # One C-encoded buffer: json's chunked iterencode runs the pure-Python encoder
+    return hashlib.sha256(canonical_bytes(data)).hexdigest()
@@ -0,0 +1,118 @@
+"""
+HerBlock Circuit Breaker
+Fast-fail guard for an unreachable Fabric network
+
+After `failure_threshold` consecutive network failures the breaker opens
+and every call fails immediately with CircuitOpenError, so API routes drop
+straight to their MongoDB fallbacks instead of waiting on peer timeouts.
+While open, a background task probes the network and closes the breaker
+again as soon as a probe succeeds.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Awaitable, Optional, Dict, Any
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the network while the breaker is open"""
+
+    def __init__(self, state: Dict[str, Any]):
+        self.state = state
+        super().__init__(
+            f"Blockchain network unavailable (circuit open after {state['consecutive_failures']} failures)"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "error": "blockchain_unavailable",
+            "message": str(self),
+            "circuit_breaker": self.state
+        }
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a background recovery probe"""
+
+    def __init__(self, probe: Callable[[], Awaitable[bool]], failure_threshold: int = 5,
+                 probe_interval: float = 5.0):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+        self.short_circuited = 0
+        self.trips = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if calls should not reach the network"""
+        if self.is_open:
+            self.short_circuited += 1
+            raise CircuitOpenError(self.describe())
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.opened_at = None
+            print("✅ Hyperledger Fabric reachable again - circuit closed")
+
+    def record_failure(self, error: Exception) -> None:
+        self.consecutive_failures += 1
+        self.last_failure = str(error)[:200]
+        if self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.trips += 1
+        print(f"⚠️  Hyperledger Fabric unreachable - circuit open, probing every {self.probe_interval}s")
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.ensure_future(self._probe_loop())
+
+    async def _probe_loop(self) -> None:
+        while self.state != CLOSED:
+            await asyncio.sleep(self.probe_interval)
+            self.state = HALF_OPEN
+            try:
+                healthy = await self.probe()
+            except Exception:
+                healthy = False
+            if healthy:
+                self.record_success()
+            elif self.state != CLOSED:
+                self.state = OPEN
+
+    async def close(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "opened_at": datetime.utcfromtimestamp(self.opened_at).isoformat() if self.opened_at else None,
+            "last_failure": self.last_failure,
+            "short_circuited": self.short_circuited,
+            "trips": self.trips
+        }
@@ -0,0 +1,160 @@
+"""
+HerBlock Dashboard Statistics
+Materialized counters and recent-item feeds for /api/analytics/dashboard
+
+Every insert path bumps a single `stats` document with an atomic $inc and
+copies new collection events and products into small capped collections,
+so the dashboard is served from three point reads instead of five
+count_documents() calls and two sorted scans. A background task
+periodically repairs any drift (e.g. documents deleted by hand, or a crash
+between insert and $inc). Only the worker holding the reconcile lease runs
+it; it reads collection sizes from metadata (estimated_document_count) and
+applies the difference as an $inc, so increments that land meanwhile are
+kept rather than overwritten.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+
+STATS_ID = "dashboard"
+RECONCILE_LEASE_ID = "dashboard_reconcile"
+
+# Source collection -> counter field in the stats document
+COUNTERS = {
+    "products": "total_products",
+    "collection_events": "total_collections",
+    "processing_steps": "total_processing",
+    "quality_tests": "total_quality_tests",
+    "blockchain_transactions": "total_blockchain_transactions",
+}
+
+# Source collection -> capped collection holding its newest documents
+RECENT_FEEDS = {
+    "collection_events": "recent_collection_events",
+    "products": "recent_products",
+}
+
+
+class DashboardStats:
+    """Counters and recent feeds kept current on write, reconciled periodically"""
+
+    def __init__(self, db, recent_capacity: int = 50, reconcile_interval: float = 600.0):
+        self.db = db
+        self.recent_capacity = recent_capacity
+        self.reconcile_interval = reconcile_interval
+        self.last_reconciled: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== Write side ====================
+
+    async def record(self, collection: str, docs: List[Dict[str, Any]]) -> None:
+        """Account for documents just inserted into `collection`"""
+        if not docs:
+            return
+        updates = []
+        if collection in COUNTERS:
+            updates.append(self.db.stats.update_one(
+                {"_id": STATS_ID}, {"$inc": {COUNTERS[collection]: len(docs)}}, upsert=True
+            ))
+        if collection in RECENT_FEEDS:
+            recent = [{k: v for k, v in doc.items() if k != "_id"} for doc in docs[-self.recent_capacity:]]
+            updates.append(self.db[RECENT_FEEDS[collection]].insert_many(recent))
+        try:
+            await asyncio.gather(*updates)
+        except Exception as e:
+            # The insert itself succeeded; reconciliation repairs the counters
+            print(f"⚠️  Dashboard stats not updated for {collection}: {e}")
+
+    # ==================== Read side ====================
+
+    async def snapshot(self, recent_limit: int = 5) -> Dict[str, Any]:
+        stats, recent_collections, recent_products = await asyncio.gather(
+            self.db.stats.find_one({"_id": STATS_ID}),
+            self._recent("collection_events", recent_limit),
+            self._recent("products", recent_limit)
+        )
+        if stats is None:
+            stats = await self.reconcile()
+        return {
+            "statistics": {field: stats.get(field, 0) for field in COUNTERS.values()},
+            "recent_collections": recent_collections,
+            "recent_products": recent_products
+        }
+
+    async def _recent(self, collection: str, limit: int) -> List[Dict[str, Any]]:
+        # Capped collections keep insertion order; newest first
+        cursor = self.db[RECENT_FEEDS[collection]].find({}, {"_id": 0}).sort("$natural", -1).limit(limit)
+        return await cursor.to_list(limit)
+
+    # ==================== Maintenance ====================
+
+    async def ensure_feeds(self) -> None:
+        """Create the capped feed collections, seeding them from the source collections"""
+        existing = set(await self.db.list_collection_names())
+        for source, feed in RECENT_FEEDS.items():
+            if feed in existing:
+                continue
+            try:
+                await self.db.create_collection(feed, capped=True, size=4 * 1024 * 1024, max=self.recent_capacity)
+            except CollectionInvalid:
+                continue  # created concurrently
+            latest = await self.db[source].find({}, {"_id": 0}).sort("timestamp", -1).limit(self.recent_capacity).to_list(self.recent_capacity)
+            if latest:
+                await self.db[feed].insert_many(list(reversed(latest)))
+
+    async def reconcile(self) -> Dict[str, Any]:
+        """Move the counters to the collection sizes by $inc-ing the difference"""
+        fields = list(COUNTERS.values())
+        stats, *counts = await asyncio.gather(
+            self.db.stats.find_one({"_id": STATS_ID}),
+            *(self.db[source].estimated_document_count() for source in COUNTERS)
+        )
+        stats = stats or {}
+        drift = {field: count - stats.get(field, 0) for field, count in zip(fields, counts)}
+        self.last_reconciled = datetime.now(timezone.utc)
+        update = {"$set": {"reconciled_at": self.last_reconciled}}
+        if any(drift.values()):
+            update["$inc"] = {field: delta for field, delta in drift.items() if delta}
+        await self.db.stats.update_one({"_id": STATS_ID}, update, upsert=True)
+        return dict(zip(fields, counts), reconciled_at=self.last_reconciled)
+
+    async def claim_reconcile(self) -> bool:
+        """Take the reconcile lease for one interval; False if another worker holds it"""
+        now = datetime.now(timezone.utc)
+        try:
+            result = await self.db.stats.update_one(
+                {"_id": RECONCILE_LEASE_ID, "lease_until": {"$lte": now}},
+                {"$set": {"lease_until": now + timedelta(seconds=self.reconcile_interval * 0.9)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # lease held and not yet expired
+        return bool(result.modified_count or result.upserted_id is not None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.claim_reconcile():
+                    await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Dashboard stats reconciliation failed: {e}")
+            await asyncio.sleep(self.reconcile_interval)
+
+    async def start(self) -> None:
+        await self.ensure_feeds()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
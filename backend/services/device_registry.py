@@ -0,0 +1,164 @@
+"""
+HerBlock Device Registry
+In-memory authentication cache for ESP32 field devices
+
+Active devices are loaded at startup and indexed by the SHA-256 of their
+API key (plaintext keys are never held in memory), so authenticating an
+intake reading is a dictionary lookup. Registration and deactivation
+update the cache directly; a periodic reload picks up changes made by other
+workers. A device deactivated on one worker can therefore still authenticate
+on the others for up to `refresh_interval` seconds (DEVICE_REGISTRY_REFRESH_SECONDS).
+
+Unknown keys are remembered in a bounded negative cache, and cache misses
+that do reach MongoDB are rate-limited per client (the caller's address),
+so a flood of guessed keys costs dictionary lookups rather than database
+queries, and only starves the client sending it: a device registered on
+another worker still gets its first lookup from its own budget.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class DeviceRegistry:
+    """Hashed-key device cache with negative caching and a DB miss budget"""
+
+    def __init__(self, db, refresh_interval: float = 15.0, negative_ttl: float = 300.0,
+                 negative_capacity: int = 10000, misses_per_second: float = 20.0,
+                 client_capacity: int = 10000):
+        self.collection = db.devices
+        self.refresh_interval = refresh_interval
+        self.negative_ttl = negative_ttl
+        self.negative_capacity = negative_capacity
+        self.misses_per_second = misses_per_second
+        self.client_capacity = client_capacity
+
+        self._by_key_hash: Dict[str, Dict[str, Any]] = {}
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        # client -> (miss tokens, last refill time), least recently used first
+        self._miss_budgets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.db_lookups = 0
+        self.throttled = 0
+        self.loaded_at: Optional[float] = None
+
+    # ==================== Authentication ====================
+
+    async def authenticate(self, api_key: str, client: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Active device for an API key, or None. `client` (e.g. the remote address) owns the miss budget."""
+        key_hash = hash_api_key(api_key)
+        device = self._by_key_hash.get(key_hash)
+        if device is not None:
+            self.hits += 1
+            return device
+
+        expires = self._negative.get(key_hash)
+        if expires is not None:
+            if expires > time.monotonic():
+                self.negative_hits += 1
+                return None
+            del self._negative[key_hash]
+
+        if not self._take_miss_token(client or "*"):
+            # Over budget: answer from cache alone (refresh catches up new devices)
+            self.throttled += 1
+            return None
+
+        # Possibly registered on another worker since the last reload
+        self.db_lookups += 1
+        doc = await self.collection.find_one({"api_key": api_key, "active": True})
+        if doc is None:
+            self._remember_unknown(key_hash)
+            return None
+        return self._add(doc)
+
+    def _take_miss_token(self, client: str) -> bool:
+        now = time.monotonic()
+        tokens, refill_at = self._miss_budgets.pop(client, (self.misses_per_second, now))
+        tokens = min(self.misses_per_second, tokens + (now - refill_at) * self.misses_per_second)
+        allowed = tokens >= 1
+        self._miss_budgets[client] = (tokens - 1 if allowed else tokens, now)
+        while len(self._miss_budgets) > self.client_capacity:
+            self._miss_budgets.popitem(last=False)
+        return allowed
+
+    def _remember_unknown(self, key_hash: str) -> None:
+        self._negative[key_hash] = time.monotonic() + self.negative_ttl
+        self._negative.move_to_end(key_hash)
+        while len(self._negative) > self.negative_capacity:
+            self._negative.popitem(last=False)
+
+    # ==================== Cache maintenance ====================
+
+    def _add(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        key_hash = hash_api_key(doc["api_key"])
+        device = {k: v for k, v in doc.items() if k not in ("_id", "api_key")}
+        self._by_key_hash[key_hash] = device
+        self._negative.pop(key_hash, None)
+        return device
+
+    def register(self, doc: Dict[str, Any]) -> None:
+        """Cache a newly registered (or re-activated) device"""
+        if doc.get("active", True):
+            self._add(doc)
+
+    def invalidate(self, device_id: str) -> None:
+        """Drop a device, e.g. after deactivation"""
+        for key_hash, device in list(self._by_key_hash.items()):
+            if device.get("device_id") == device_id:
+                del self._by_key_hash[key_hash]
+
+    async def load(self) -> int:
+        """Replace the cache with every active device"""
+        fresh = {}
+        async for doc in self.collection.find({"active": True}):
+            fresh[hash_api_key(doc["api_key"])] = {k: v for k, v in doc.items() if k not in ("_id", "api_key")}
+        self._by_key_hash = fresh
+        self.loaded_at = time.time()
+        return len(fresh)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Device registry reload failed: {e}")
+
+    async def start(self) -> int:
+        count = await self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return count
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "devices": len(self._by_key_hash),
+            "negative_cached": len(self._negative),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "db_lookups": self.db_lookups,
+            "throttled": self.throttled,
+            "throttled_clients": sum(1 for tokens, _ in self._miss_budgets.values() if tokens < 1)
+        }
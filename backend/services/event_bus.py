@@ -0,0 +1,239 @@
+"""
+HerBlock Live Event Bus
+In-process pub/sub behind the /api/intake/stream Server-Sent Events feed
+
+Producers publish events (intake accepted/rejected, offline sync, outbox
+commits); every connected dashboard gets them pushed instead of polling.
+
+- Each event has an increasing integer id. A ring buffer of recent events
+  lets a reconnecting client resume after its Last-Event-ID; if the id has
+  already left the buffer the client is told to reload its snapshot.
+- Each subscriber has a bounded queue. A consumer that falls behind is
+  disconnected (and can resume from the buffer) instead of growing memory.
+- With source="mongo", publish() writes to the `live_events` collection and
+  every worker fans out from a change stream on it, so clients see events
+  from all workers. Ids then come from the change's cluster time, which is
+  the same on every worker. Requires a replica set; falls back to local
+  fan-out if change streams are unavailable. A stream that fails is
+  reopened after its last resume token, with backoff; if it can no longer
+  resume, subscribers get a `reset` event.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Set
+
+from pymongo.errors import OperationFailure
+
+SOURCE_LOCAL = "local"
+SOURCE_MONGO = "mongo"
+
+# Sentinel pushed to a subscriber that overflowed its queue
+_OVERFLOW = object()
+
+# Server errors after which a change stream cannot resume from its token:
+# InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+RESUME_IMPOSSIBLE_CODES = {260, 280, 286}
+
+
+class Subscription:
+    """One connected client"""
+
+    def __init__(self, queue_size: int, types: Optional[Set[str]] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.types = types
+        self.overflowed = False
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        return self.types is None or event["type"] in self.types
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self.overflowed or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog and tell the client to reconnect and resume
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+
+
+class EventBus:
+    """Ring-buffered pub/sub with bounded per-subscriber queues"""
+
+    def __init__(self, db=None, source: str = SOURCE_LOCAL, history_size: int = 1000,
+                 client_queue_size: int = 256, restart_backoff: float = 1.0, max_restart_backoff: float = 30.0):
+        self.collection = db.live_events if db is not None else None
+        self.source = source if db is not None else SOURCE_LOCAL
+        self.client_queue_size = client_queue_size
+        self.history: deque = deque(maxlen=history_size)
+        self.subscribers: List[Subscription] = []
+        self.published = 0
+        self.dropped_subscribers = 0
+        self.stream_restarts = 0
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self._last_id = 0
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    # ==================== Producers ====================
+
+    async def publish(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Publish an event; never raises into the calling write path"""
+        try:
+            if self.source == SOURCE_MONGO:
+                await self.collection.insert_one({
+                    "type": event_type, "data": data, "time": datetime.now(timezone.utc)
+                })
+            else:
+                self._fan_out(self._next_local_id(), event_type, data)
+        except Exception as e:
+            print(f"⚠️  Live event {event_type} not published: {e}")
+
+    def _next_local_id(self) -> int:
+        # Microsecond clock, forced monotonic: ids stay increasing across restarts
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        return self._last_id
+
+    def _fan_out(self, event_id: int, event_type: str, data: Dict[str, Any]) -> None:
+        self._last_id = max(self._last_id, event_id)
+        event = {"id": event_id, "type": event_type, "data": data}
+        self.history.append(event)
+        self.published += 1
+        for subscription in self.subscribers:
+            subscription.offer(event)
+
+    # ==================== Consumers ====================
+
+    def subscribe(self, last_event_id: Optional[int] = None,
+                  types: Optional[Set[str]] = None) -> Subscription:
+        """
+        Register a subscriber. Buffered events after `last_event_id` are queued
+        first; if that id is older than the buffer, a `reset` event asks the
+        client to reload its snapshot.
+        """
+        replay = []
+        if last_event_id is not None:
+            # Ids are not contiguous, so any id before the oldest buffered one may
+            # have missed events (evicted, or published before a restart)
+            if self.history and last_event_id < self.history[0]["id"]:
+                replay.append({"id": last_event_id, "type": "reset", "data": {"reason": "history_expired"}})
+            replay.extend(event for event in self.history if event["id"] > last_event_id)
+
+        # The replay (bounded by the history size) must not count against the live budget
+        subscription = Subscription(self.client_queue_size + len(replay), types)
+        for event in replay:
+            subscription.offer(event)
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self.subscribers:
+            self.subscribers.remove(subscription)
+        if subscription.overflowed:
+            self.dropped_subscribers += 1
+
+    async def next_event(self, subscription: Subscription, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event for a subscriber, None on timeout; raises OverflowError if it fell behind"""
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is _OVERFLOW:
+            raise OverflowError("subscriber fell behind")
+        return event
+
+    # ==================== Change stream sourcing ====================
+
+    def _open_stream(self):
+        return self.collection.watch([{"$match": {"operationType": "insert"}}], resume_after=self._resume_token)
+
+    async def start(self) -> None:
+        if self.source != SOURCE_MONGO:
+            return
+        stream = self._open_stream()
+        try:
+            # The first fetch opens the stream and fails fast without a replica set
+            first = await stream.try_next()
+        except Exception as e:
+            print(f"⚠️  Change streams unavailable ({e}) - live events are local to this worker")
+            self.source = SOURCE_LOCAL
+            return
+        if first is not None:
+            self._fan_out_change(first)
+        self._resume_token = stream.resume_token
+        self._watcher = asyncio.ensure_future(self._watch(stream))
+
+    def _fan_out_change(self, change: Dict[str, Any]) -> None:
+        cluster_time = change["clusterTime"]
+        doc = change["fullDocument"]
+        # Ids stay increasing past a local reset event (which took the next id)
+        event_id = max((cluster_time.time << 32) | cluster_time.inc, self._last_id + 1)
+        self._fan_out(event_id, doc["type"], doc["data"])
+
+    def _reset_subscribers(self, reason: str) -> None:
+        """Events may have been missed: tell every client (and later resumers) to reload"""
+        self._fan_out(self._last_id + 1, "reset", {"reason": reason})
+
+    async def _watch(self, stream) -> None:
+        """Fan out changes until cancelled, reopening the stream whenever it fails"""
+        failures = 0
+        while True:
+            try:
+                if stream is None:
+                    stream = self._open_stream()
+                async for change in stream:
+                    self._fan_out_change(change)
+                    self._resume_token = stream.resume_token
+                    failures = 0
+                print("⚠️  Live event change stream ended; reopening")
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in RESUME_IMPOSSIBLE_CODES:
+                    print(f"⚠️  Live event change stream cannot resume ({e}); restarting from now")
+                    self._resume_token = None
+                    self._reset_subscribers("stream_restarted")
+                else:
+                    print(f"⚠️  Live event change stream failed: {e}")
+                failures += 1
+            except Exception as e:
+                print(f"⚠️  Live event change stream failed: {e}")
+                failures += 1
+            finally:
+                if stream is not None:
+                    await stream.close()
+                    stream = None
+            self.stream_restarts += 1
+            await asyncio.sleep(min(self.restart_backoff * 2 ** max(failures - 1, 0), self.max_restart_backoff))
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "subscribers": len(self.subscribers),
+            "buffered": len(self.history),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+            "stream_restarts": self.stream_restarts
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as a Server-Sent Events frame"""
+    data = json.dumps(event["data"], default=str, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
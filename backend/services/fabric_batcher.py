@@ -0,0 +1,172 @@
+"""
+HerBlock Invoke Batcher
+Coalesces bursts of record writes into multi-record chaincode calls
+
+Pending writes for the same chaincode function are gathered for a short
+window (or until the batch is full) and submitted as one transaction, e.g.
+recordCollection x 40 -> recordCollectionsBatch([...40 records]).
+Each caller still gets its own result or error back.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import json
+import asyncio
+from typing import Callable, Awaitable, Optional, Dict, Any, List, Tuple
+
+# Single-record chaincode function -> multi-record chaincode function
+BATCH_FUNCTIONS = {
+    "recordCollection": "recordCollectionsBatch",
+    "recordQualityTest": "recordQualityTestsBatch",
+    "recordProcessing": "recordProcessingBatch",
+    "recordProduct": "recordProductsBatch",
+}
+
+PendingRecord = Tuple[str, str, asyncio.Future]
+
+# How contract APIs report an unknown function; only counted when the error
+# also names the batch function, since record errors use the same words, e.g.
+# Go: "Function recordCollectionsBatch not found in contract HerBlockContract"
+# Node: "You've asked to invoke a function that does not exist: recordCollectionsBatch"
+MISSING_FUNCTION_MARKERS = ("not found", "does not exist", "unknown function", "invalid function")
+
+
+class InvokeBatcher:
+    """
+    Async batching stage in front of a chaincode invoke function.
+
+    The batch chaincode call receives one argument, a JSON array of
+    {"id": ..., "data": ...} records, and must answer with
+    {"results": [{"id": ..., "success": bool, "result": {...}, "error": "..."}]}.
+    If the deployed chaincode has no batch function the batcher falls back
+    to single invokes and stops batching that function.
+    """
+
+    def __init__(self, invoke: Callable[[str, list], Awaitable[Dict[str, Any]]],
+                 window_ms: int = 25, max_batch_size: int = 50,
+                 batch_functions: Optional[Dict[str, str]] = None):
+        self._invoke = invoke
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batch_functions = batch_functions if batch_functions is not None else BATCH_FUNCTIONS
+
+        self._pending: Dict[str, List[PendingRecord]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._unsupported = set()
+        # Flushed batches in flight; held so they aren't garbage-collected mid-run
+        self._tasks: set = set()
+        self.stats = {"batches": 0, "batched_records": 0, "single_invokes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    async def submit(self, function: str, record_id: str, payload: str) -> Dict[str, Any]:
+        """Queue one record write and wait for its own result"""
+        if (not self.enabled or function not in self.batch_functions
+                or function in self._unsupported):
+            self.stats["single_invokes"] += 1
+            return await self._invoke(function, [record_id, payload])
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(function, [])
+        pending.append((record_id, payload, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(function)
+        elif function not in self._timers:
+            self._timers[function] = loop.call_later(self.window, self._flush, function)
+
+        return await future
+
+    def _flush(self, function: str) -> None:
+        timer = self._timers.pop(function, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(function, [])
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(function, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._batch_done)
+
+    async def _run_batch(self, function: str, batch: List[PendingRecord]) -> None:
+        try:
+            await self._submit_batch(function, batch)
+        except Exception as e:
+            # e.g. a malformed batch response: don't leave callers waiting forever
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+    def _batch_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️  Fabric batch submit failed: {task.exception()}")
+
+    @staticmethod
+    def _is_missing_function(batch_function: str, error: Exception) -> bool:
+        """The chaincode has no such function (not: one of the records was refused)"""
+        message = str(error)
+        lowered = message.lower()
+        return batch_function in message and any(marker in lowered for marker in MISSING_FUNCTION_MARKERS)
+
+    async def _submit_single(self, function: str, record_id: str, payload: str,
+                             future: asyncio.Future) -> None:
+        self.stats["single_invokes"] += 1
+        try:
+            result = await self._invoke(function, [record_id, payload])
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _submit_batch(self, function: str, batch: List[PendingRecord]) -> None:
+        if len(batch) == 1:
+            await self._submit_single(function, *batch[0])
+            return
+
+        batch_function = self.batch_functions[function]
+        records = [{"id": record_id, "data": payload} for record_id, payload, _ in batch]
+
+        try:
+            response = await self._invoke(batch_function, [json.dumps(records)])
+        except Exception as e:
+            if self._is_missing_function(batch_function, e):
+                # Chaincode without batch support - stop batching this function
+                self._unsupported.add(function)
+                await asyncio.gather(*(self._submit_single(function, *item) for item in batch))
+                return
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["batched_records"] += len(batch)
+
+        results = {r.get("id"): r for r in response.get("results", []) if isinstance(r, dict)}
+        for record_id, _, future in batch:
+            if future.done():
+                continue
+            result = results.get(record_id)
+            if result is None:
+                future.set_exception(Exception(f"No result for {record_id} in {batch_function} response"))
+            elif result.get("success", True) and not result.get("error"):
+                future.set_result(result.get("result", result))
+            else:
+                future.set_exception(Exception(result.get("error", "Batch record failed")))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_ms": int(self.window * 1000),
+            "max_batch_size": self.max_batch_size,
+            "pending": sum(len(p) for p in self._pending.values()),
+            **self.stats
+        }
@@ -0,0 +1,116 @@
+"""
+HerBlock Query Cache
+In-process LRU + TTL cache for chaincode query results
+
+Ledger state only changes when a block commits, so query results are kept
+until either:
+- the channel block height moves (another node committed something), or
+- this node commits an invoke touching one of the cached keys, or
+- the entry's TTL expires.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import copy
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Tuple
+
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+
+class QueryCache:
+    """LRU + TTL cache keyed by (function, args) with key-based invalidation"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.block_height: Optional[int] = None
+
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        # ledger key (any query arg) -> cache keys that depend on it
+        self._by_arg: Dict[str, set] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "height_resets": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(function: str, args: list) -> CacheKey:
+        return function, tuple(str(a) for a in args)
+
+    def get(self, function: str, args: list) -> Tuple[bool, Any]:
+        key = self.make_key(function, args)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.stats["misses"] += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        # Callers decorate results in place, so hand out a private copy
+        return True, copy.deepcopy(value)
+
+    def set(self, function: str, args: list, value: Any) -> None:
+        if not self.enabled:
+            return
+        key = self.make_key(function, args)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        for arg in key[1]:
+            self._by_arg.setdefault(arg, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def _drop(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        for arg in key[1]:
+            dependents = self._by_arg.get(arg)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._by_arg[arg]
+
+    def invalidate(self, ledger_keys: Iterable[str]) -> None:
+        """Drop every cached query that was called with one of these keys"""
+        for ledger_key in ledger_keys:
+            for key in list(self._by_arg.get(str(ledger_key), ())):
+                self._drop(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_arg.clear()
+
+    def observe_block_height(self, height: Optional[int]) -> None:
+        """Flush everything when the channel has grown since the last check"""
+        if height is None:
+            return
+        if self.block_height is not None and height != self.block_height:
+            self.clear()
+            self.stats["height_resets"] += 1
+        self.block_height = height
+
+    def describe(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "block_height": self.block_height,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats
+        }
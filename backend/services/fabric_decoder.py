@@ -0,0 +1,145 @@
+"""
+HerBlock Fabric Response Decoder
+Turns peer proposal responses into typed results
+
+`peer chaincode invoke` reports the endorsed proposal response on stderr in
+protobuf text format:
+
+    ... Chaincode invoke successful. result: status:200 payload:"{\\"id\\":\\"COLL-1\\"}"
+
+The response fields are pulled out with one compiled regex, and the payload
+bytes are unescaped with the protobuf text rules (\\" \\\\ \\n \\ooo octal
+\\xhh hex), so non-ASCII names such as Hindi product names survive intact.
+
+The CLI prints no machine-readable form of the response, so this is still
+text parsing; decode_invoke_result keeps the common case (status 200, no
+message) down to a prefix search, a slice and one C-level unescape.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import re
+import json
+import codecs
+from dataclasses import dataclass
+from typing import Optional, Any, Union
+
+# Quoted protobuf text string: anything but an unescaped quote (unrolled: no per-character alternation)
+_QUOTED = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
+
+# A successful response without a message: the common case
+_SUCCESS_PAYLOAD = 'result: status:200 payload:"'
+
+# Response fields print as status, message, payload: the payload is the last
+# field on the line, so it ends at the line's last quote and is sliced, not matched
+_RESPONSE_RE = re.compile(
+    r'result: status:(\d+)'
+    r'(?: message:' + _QUOTED + r')?'
+    r'( payload:")?'
+)
+
+
+class ProposalResponseError(Exception):
+    """Raised when a proposal response reports a non-success status"""
+
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+        super().__init__(f"status:{status} message:{message}")
+
+
+@dataclass
+class ProposalResponse:
+    """Decoded chaincode response"""
+
+    status: int
+    message: str = ""
+    payload: bytes = b""
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 400
+
+    def json(self) -> Any:
+        """Payload parsed as JSON, or {"raw": text} for non-JSON payloads"""
+        return decode_payload(self.payload)
+
+
+def unescape_text(value: str) -> bytes:
+    """Undo protobuf text-format escaping of a bytes field"""
+    if "\\" not in value:
+        return value.encode("utf-8")
+    return codecs.escape_decode(value.encode("utf-8"))[0]
+
+
+def decode_payload(payload: Union[bytes, str, None]) -> Any:
+    """Parse a chaincode payload; non-JSON payloads come back as {"raw": text}"""
+    if payload is None:
+        return None
+    if isinstance(payload, (bytes, bytearray)):
+        if not payload:
+            return None
+        payload = bytes(payload).decode("utf-8", errors="replace")
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return {"raw": payload}
+
+
+def decode_invoke_output(output: str) -> Optional[ProposalResponse]:
+    """
+    Decode `peer chaincode invoke` output.
+    Returns None if the output carries no proposal response line.
+    Raises ProposalResponseError for error statuses.
+    """
+    start = output.find("result: status:")
+    match = _RESPONSE_RE.match(output, start) if start >= 0 else None
+    if match is None:
+        return None
+
+    status, message, has_payload = match.groups()
+    payload = None
+    if has_payload:
+        line_end = output.find("\n", match.end())
+        end = output.rfind('"', match.end(), line_end if line_end >= 0 else len(output))
+        if end < 0:
+            return None
+        payload = output[match.end():end]
+    response = ProposalResponse(
+        status=int(status),
+        message=unescape_text(message).decode("utf-8", errors="replace") if message else "",
+        payload=unescape_text(payload) if payload else b""
+    )
+    if not response.ok:
+        raise ProposalResponseError(response.status, response.message)
+    return response
+
+
+def decode_invoke_result(output: str) -> Any:
+    """
+    Payload of `peer chaincode invoke` output, parsed as decode_payload does.
+    Returns None if there is no response line or no payload.
+    Raises ProposalResponseError for error statuses.
+    """
+    start = output.find(_SUCCESS_PAYLOAD)
+    if start < 0:
+        # Error statuses, messages and status-only responses
+        response = decode_invoke_output(output)
+        return response.json() if response is not None else None
+
+    begin = start + len(_SUCCESS_PAYLOAD)
+    # The payload holds no raw newline (it prints as \\n), so the first quote
+    # that ends a line closes it
+    end = output.find('"\n', begin)
+    if end < 0:
+        end = output.rfind('"', begin)
+    if end <= begin:
+        return None
+    # decode_payload(unescape_text(...)) inlined: this runs on every CLI invoke
+    payload = codecs.escape_decode(output[begin:end].encode("utf-8"))[0].decode("utf-8", errors="replace")
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return {"raw": payload}
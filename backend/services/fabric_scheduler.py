@@ -0,0 +1,124 @@
+"""
+HerBlock Fabric Scheduler
+Bounded concurrency and backpressure for chaincode calls
+
+Queries and invokes have their own concurrency limits plus a shared cap on
+in-flight calls. Callers that cannot start immediately wait in a bounded
+queue; queued queries are always admitted before queued invokes so trace
+lookups don't starve behind bulk writes. When the queue is full the call is
+rejected with FabricOverloadedError instead of piling up more work.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+QUERY = "query"
+INVOKE = "invoke"
+
+# Admission order when a slot frees up
+PRIORITY = (QUERY, INVOKE)
+
+
+class FabricOverloadedError(Exception):
+    """Raised when the scheduler's wait queue is full"""
+
+    def __init__(self, kind: str, metrics: Dict[str, Any]):
+        self.kind = kind
+        self.metrics = metrics
+        super().__init__(
+            f"Blockchain {kind} queue full ({metrics['queue_depth']}/{metrics['max_queue']} waiting)"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "error": "blockchain_overloaded",
+            "message": str(self),
+            "scheduler": self.metrics
+        }
+
+
+class FabricScheduler:
+    """Admission control for Fabric calls with read-over-write priority"""
+
+    def __init__(self, max_queries: int = 12, max_invokes: int = 8,
+                 max_total: int = 16, max_queue: int = 256):
+        self.limits = {QUERY: max_queries, INVOKE: max_invokes}
+        self.max_total = max_total
+        self.max_queue = max_queue
+
+        self.running = {QUERY: 0, INVOKE: 0}
+        self._waiters = {QUERY: deque(), INVOKE: deque()}
+        self.rejected = {QUERY: 0, INVOKE: 0}
+        self.peak_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters[QUERY]) + len(self._waiters[INVOKE])
+
+    def _can_run(self, kind: str) -> bool:
+        return (self.running[kind] < self.limits[kind]
+                and self.running[QUERY] + self.running[INVOKE] < self.max_total)
+
+    def _dispatch(self) -> None:
+        for kind in PRIORITY:
+            waiters = self._waiters[kind]
+            while waiters and self._can_run(kind):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self.running[kind] += 1
+                future.set_result(None)
+
+    async def acquire(self, kind: str) -> None:
+        if not self._waiters[kind] and self._can_run(kind):
+            self.running[kind] += 1
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected[kind] += 1
+            raise FabricOverloadedError(kind, self.metrics())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[kind].append(future)
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just before the caller went away
+                self.release(kind)
+            else:
+                try:
+                    self._waiters[kind].remove(future)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, kind: str) -> None:
+        self.running[kind] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, kind: str):
+        await self.acquire(kind)
+        try:
+            yield
+        finally:
+            self.release(kind)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "running": dict(self.running),
+            "waiting": {kind: len(w) for kind, w in self._waiters.items()},
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "peak_queue_depth": self.peak_queue_depth,
+            "limits": {**self.limits, "total": self.max_total},
+            "rejected": dict(self.rejected)
+        }
@@ -10,24 +10,47 @@ Copyright (c) 2026 HerBlock India
 
 import os
 import json
-import subprocess
-import asyncio
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime
 import uuid
 
+from .fabric_backends import (
+    FabricBackend,
+    CLIFabricBackend,
+    GatewayFabricBackend,
+    BACKEND_CLI,
+    BACKEND_GATEWAY,
+    gateway_sdk_installed
+)
+from .fabric_batcher import InvokeBatcher
+from .fabric_scheduler import FabricScheduler, FabricOverloadedError, QUERY, INVOKE
+from .fabric_cache import QueryCache
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
 # Base paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FABRIC_SAMPLES = os.path.join(BASE_DIR, "fabric-samples")
 HERBLOCK_NETWORK = os.path.join(FABRIC_SAMPLES, "test-network")
 FABRIC_BIN = os.path.join(FABRIC_SAMPLES, "bin")
 FABRIC_CONFIG = os.path.join(FABRIC_SAMPLES, "config")
+NETWORK_CONFIG = os.path.join(BASE_DIR, "fabric_config", "network-config.json")
+
+# Errors that mean "the network can't take this call right now" - passed
+# through untouched so routes can answer 503 or use their MongoDB fallback
+FABRIC_UNAVAILABLE_ERRORS = (FabricOverloadedError, CircuitOpenError)
+
+# Chaincode error for a record ID that is already on the ledger
+DUPLICATE_RECORD_MARKERS = ("already exists",)
+
+# Error text produced by the chaincode itself (the peers were reachable)
+CHAINCODE_ERROR_MARKERS = ("status:500", "chaincode response", "INVALID LOCATION", "does not exist") + DUPLICATE_RECORD_MARKERS
 
 
 class HerBlockFabricService:
     """
     Service to interact with HerBlock Hyperledger Fabric network
-    Uses CLI-based approach for simplicity and reliability
+    Transport is pluggable: pooled gateway clients or the peer CLI fallback
     """
     
     def __init__(self):
@@ -52,11 +75,43 @@ class HerBlockFabricService:
         self.orderer_ca = f"{HERBLOCK_NETWORK}/organizations/ordererOrganizations/example.com/orderers/orderer.example.com/msp/tlscacerts/tlsca.example.com-cert.pem"
         self.peer1_tls = f"{HERBLOCK_NETWORK}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt"
         self.peer2_tls = f"{HERBLOCK_NETWORK}/organizations/peerOrganizations/org2.example.com/peers/peer0.org2.example.com/tls/ca.crt"
+
+        self.backend = self._create_backend()
+
+        # Caps concurrent Fabric calls; queries are admitted ahead of invokes
+        self.scheduler = FabricScheduler(
+            max_queries=int(os.environ.get("FABRIC_MAX_CONCURRENT_QUERIES", "12")),
+            max_invokes=int(os.environ.get("FABRIC_MAX_CONCURRENT_INVOKES", "8")),
+            max_total=int(os.environ.get("FABRIC_MAX_CONCURRENT_CALLS", "16")),
+            max_queue=int(os.environ.get("FABRIC_MAX_QUEUE", "256"))
+        )
+
+        # Trips after consecutive network failures so callers fail fast
+        self.breaker = CircuitBreaker(
+            probe=self.check_connection,
+            failure_threshold=int(os.environ.get("FABRIC_BREAKER_THRESHOLD", "5")),
+            probe_interval=float(os.environ.get("FABRIC_BREAKER_PROBE_SECONDS", "5"))
+        )
+
+        # Query results are reused until the ledger moves
+        self.query_cache = QueryCache(
+            max_entries=int(os.environ.get("FABRIC_QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.environ.get("FABRIC_QUERY_CACHE_TTL", "30"))
+        )
+        self.height_check_interval = float(os.environ.get("FABRIC_HEIGHT_CHECK_SECONDS", "2"))
+        self._height_checked_at = 0.0
+
+        # Record writes are coalesced into multi-record chaincode calls
+        self.batcher = InvokeBatcher(
+            self._run_invoke,
+            window_ms=int(os.environ.get("FABRIC_BATCH_WINDOW_MS", "25")),
+            max_batch_size=int(os.environ.get("FABRIC_BATCH_MAX_SIZE", "50"))
+        )
     
     async def check_connection(self) -> bool:
         """Check if blockchain network is accessible"""
         try:
-            result = await self._run_query("getNetworkStatus", [])
+            result = await self._run_query("getNetworkStatus", [], probe=True)
             if result and "active" in str(result):
                 self.is_connected = True
                 return True
@@ -66,103 +121,152 @@ class HerBlockFabricService:
         self.is_connected = False
         return False
     
+    async def start(self) -> None:
+        """
+        Open the configured backend's connections.
+        Falls back to the peer CLI if the gateway client cannot be started.
+        """
+        try:
+            await self.backend.start()
+        except Exception as e:
+            self.last_error = str(e)
+            if self.backend.name != BACKEND_CLI:
+                print(f"⚠️  Fabric gateway unavailable ({e}), falling back to peer CLI")
+                self.backend = self._cli_backend()
+
+    async def close(self) -> None:
+        """Release pooled connections"""
+        await self.breaker.close()
+        await self.backend.close()
+
+    def _cli_backend(self) -> CLIFabricBackend:
+        return CLIFabricBackend(
+            env=self.env,
+            cwd=HERBLOCK_NETWORK,
+            channel_name=self.channel_name,
+            chaincode_name=self.chaincode_name,
+            orderer_ca=self.orderer_ca,
+            peer1_tls=self.peer1_tls,
+            peer2_tls=self.peer2_tls,
+            timeout=float(os.environ.get("FABRIC_CLI_TIMEOUT_SECONDS", "30"))
+        )
+
+    def _create_backend(self) -> FabricBackend:
+        """Pick the transport from FABRIC_BACKEND (cli | gateway)"""
+        if os.environ.get("FABRIC_BACKEND", BACKEND_CLI).lower() != BACKEND_GATEWAY:
+            return self._cli_backend()
+
+        if not gateway_sdk_installed():
+            print("⚠️  FABRIC_BACKEND=gateway but fabric-sdk-py is not installed, using peer CLI")
+            return self._cli_backend()
+
+        return GatewayFabricBackend(
+            network_config=os.environ.get("FABRIC_NETWORK_CONFIG", NETWORK_CONFIG),
+            channel_name=self.channel_name,
+            chaincode_name=self.chaincode_name,
+            msp_id=self.env["CORE_PEER_LOCALMSPID"],
+            msp_path=self.env["CORE_PEER_MSPCONFIGPATH"],
+            pool_size=int(os.environ.get("FABRIC_GATEWAY_POOL_SIZE", "4"))
+        )
+
+    @staticmethod
+    def is_duplicate_record(error: Exception) -> bool:
+        message = str(error)
+        return any(marker in message for marker in DUPLICATE_RECORD_MARKERS)
+
+    @staticmethod
+    def is_chaincode_error(error: Exception) -> bool:
+        """The chaincode refused the call (retrying the same call will fail again)"""
+        message = str(error)
+        return any(marker in message for marker in CHAINCODE_ERROR_MARKERS)
+
+    @classmethod
+    def _is_network_failure(cls, error: Exception) -> bool:
+        return not cls.is_chaincode_error(error)
+
+    async def _call(self, kind: str, call, probe: bool = False):
+        """
+        Run one backend call under the circuit breaker and scheduler.
+        Probes (check_connection) bypass an open breaker.
+        """
+        if not probe:
+            self.breaker.check()
+        async with self.scheduler.slot(kind):
+            try:
+                result = await call()
+            except Exception as e:
+                if self._is_network_failure(e):
+                    self.breaker.record_failure(e)
+                else:
+                    self.breaker.record_success()
+                raise
+        self.breaker.record_success()
+        return result
+
     async def _run_invoke(self, function: str, args: list) -> Dict[str, Any]:
         """Run a chaincode invoke (write operation)"""
         try:
-            # Build the arguments JSON
-            invoke_args = {
-                "function": function,
-                "Args": args
-            }
-            
-            cmd = [
-                "peer", "chaincode", "invoke",
-                "-o", "localhost:7050",
-                "--ordererTLSHostnameOverride", "orderer.example.com",
-                "--tls",
-                "--cafile", self.orderer_ca,
-                "-C", self.channel_name,
-                "-n", self.chaincode_name,
-                "--peerAddresses", "localhost:7051",
-                "--tlsRootCertFiles", self.peer1_tls,
-                "--peerAddresses", "localhost:9051",
-                "--tlsRootCertFiles", self.peer2_tls,
-                "-c", json.dumps(invoke_args)
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=self.env,
-                cwd=HERBLOCK_NETWORK
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                error_msg = stderr.decode() if stderr else "Unknown error"
-                raise Exception(f"Invoke failed: {error_msg}")
-            
-            # Parse the response
-            output = stderr.decode() if stderr else stdout.decode()
-            
-            # Extract payload from response
-            if "payload:" in output:
-                payload_start = output.find('payload:"') + 9
-                payload_end = output.rfind('"')
-                if payload_start > 8 and payload_end > payload_start:
-                    payload = output[payload_start:payload_end]
-                    # Unescape the JSON
-                    payload = payload.replace('\\"', '"').replace('\\n', '\n')
-                    try:
-                        return json.loads(payload)
-                    except:
-                        return {"raw": payload}
-            
-            return {"success": True, "output": output}
-            
+            return await self._call(INVOKE, lambda: self.backend.invoke(function, args))
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Blockchain invoke error: {str(e)}")
     
-    async def _run_query(self, function: str, args: list) -> Dict[str, Any]:
+    async def _run_query(self, function: str, args: list, probe: bool = False) -> Dict[str, Any]:
         """Run a chaincode query (read operation)"""
         try:
-            query_args = {
-                "function": function,
-                "Args": args
-            }
-            
-            cmd = [
-                "peer", "chaincode", "query",
-                "-C", self.channel_name,
-                "-n", self.chaincode_name,
-                "-c", json.dumps(query_args)
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=self.env,
-                cwd=HERBLOCK_NETWORK
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                error_msg = stderr.decode() if stderr else "Unknown error"
-                raise Exception(f"Query failed: {error_msg}")
-            
-            output = stdout.decode().strip()
-            
-            try:
-                return json.loads(output)
-            except:
-                return {"raw": output}
-                
+            return await self._call(QUERY, lambda: self.backend.query(function, args), probe=probe)
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Blockchain query error: {str(e)}")
+
+    async def get_block_height(self) -> Optional[int]:
+        """Current block height of the channel"""
+        return await self._call(QUERY, self.backend.block_height)
+
+    async def _sync_cache_with_ledger(self) -> None:
+        """Flush the query cache if the block height moved (rate limited)"""
+        now = time.monotonic()
+        if now - self._height_checked_at < self.height_check_interval:
+            return
+        # Stamp before awaiting so concurrent readers don't all re-check
+        self._height_checked_at = now
+        try:
+            self.query_cache.observe_block_height(await self.get_block_height())
+        except Exception as e:
+            self.last_error = str(e)
+
+    async def _cached_query(self, function: str, args: list) -> Dict[str, Any]:
+        """Read-through cache in front of _run_query"""
+        if not self.query_cache.enabled:
+            return await self._run_query(function, args)
+
+        await self._sync_cache_with_ledger()
+        hit, result = self.query_cache.get(function, args)
+        if hit:
+            return result
+
+        result = await self._run_query(function, args)
+        self.query_cache.set(function, args, result)
+        return result
+
+    @staticmethod
+    def _ledger_keys(record_id: str, data: Dict[str, Any]) -> set:
+        """Ledger keys a record write can change (used for cache invalidation)"""
+        keys = {record_id}
+        for field, value in data.items():
+            if field.endswith("_id") and isinstance(value, str) and value:
+                keys.add(value)
+            elif isinstance(value, list):
+                keys.update(v for v in value if isinstance(v, str))
+        return keys
+
+    async def _submit_record(self, function: str, record_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit a single-record write through the batching stage"""
+        result = await self.batcher.submit(function, record_id, json.dumps(data))
+        self.query_cache.invalidate(self._ledger_keys(record_id, data))
+        return result
     
     # ==================== Collection Operations ====================
     
@@ -193,10 +297,7 @@ class HerBlockFabricService:
                 "organic_certified": collection_data.get("organic_certified", False)
             }
             
-            result = await self._run_invoke(
-                "recordCollection",
-                [collection_id, json.dumps(blockchain_data)]
-            )
+            result = await self._submit_record("recordCollection", collection_id, blockchain_data)
             
             return {
                 "success": True,
@@ -223,7 +324,7 @@ class HerBlockFabricService:
     
     async def get_collection(self, collection_id: str) -> Dict[str, Any]:
         """Get collection by ID from blockchain"""
-        result = await self._run_query("getCollection", [collection_id])
+        result = await self._cached_query("getCollection", [collection_id])
         result["blockchain_verified"] = True
         result["patent_pending"] = True
         return result
@@ -248,10 +349,7 @@ class HerBlockFabricService:
                 "accreditation_number": test_data.get("accreditation_number", "")
             }
             
-            result = await self._run_invoke(
-                "recordQualityTest",
-                [test_id, json.dumps(blockchain_data)]
-            )
+            result = await self._submit_record("recordQualityTest", test_id, blockchain_data)
             
             return {
                 "success": True,
@@ -262,6 +360,8 @@ class HerBlockFabricService:
                 "patent_pending": True
             }
             
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Failed to record quality test: {str(e)}")
     
@@ -287,10 +387,7 @@ class HerBlockFabricService:
                 "ayush_license": processing_data.get("ayush_license", "")
             }
             
-            result = await self._run_invoke(
-                "recordProcessing",
-                [processing_id, json.dumps(blockchain_data)]
-            )
+            result = await self._submit_record("recordProcessing", processing_id, blockchain_data)
             
             return {
                 "success": True,
@@ -300,6 +397,8 @@ class HerBlockFabricService:
                 "patent_pending": True
             }
             
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Failed to record processing: {str(e)}")
     
@@ -327,10 +426,7 @@ class HerBlockFabricService:
                 "ingredients": product_data.get("ingredients", [])
             }
             
-            result = await self._run_invoke(
-                "recordProduct",
-                [product_id, json.dumps(blockchain_data)]
-            )
+            result = await self._submit_record("recordProduct", product_id, blockchain_data)
             
             return {
                 "success": True,
@@ -340,6 +436,8 @@ class HerBlockFabricService:
                 "patent_pending": True
             }
             
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Failed to record product: {str(e)}")
     
@@ -352,7 +450,7 @@ class HerBlockFabricService:
         PATENT FEATURE: Full supply chain visibility
         """
         try:
-            result = await self._run_query("getProductTrace", [product_id])
+            result = await self._cached_query("getProductTrace", [product_id])
             
             return {
                 "product_id": product_id,
@@ -366,12 +464,14 @@ class HerBlockFabricService:
                 "patent_pending": True
             }
             
+        except FABRIC_UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Failed to trace product: {str(e)}")
     
     async def get_history(self, key: str) -> Dict[str, Any]:
         """Get transaction history for any key"""
-        result = await self._run_query("getHistory", [key])
+        result = await self._cached_query("getHistory", [key])
         return {
             "key": key,
             "history": result,
@@ -384,7 +484,11 @@ class HerBlockFabricService:
     async def get_network_status(self) -> Dict[str, Any]:
         """Get blockchain network status"""
         try:
-            await self.check_connection()
+            # While the breaker is open the background probe owns health checks
+            if self.breaker.is_open:
+                self.is_connected = False
+            else:
+                await self.check_connection()
             
             return {
                 "network": "HerBlock Hyperledger Fabric",
@@ -397,6 +501,11 @@ class HerBlockFabricService:
                     {"name": "peer0.org2.example.com", "port": 9051}
                 ],
                 "orderer": {"name": "orderer.example.com", "port": 7050},
+                "transport": self.backend.describe(),
+                "batching": self.batcher.describe(),
+                "scheduler": self.scheduler.metrics(),
+                "query_cache": self.query_cache.describe(),
+                "circuit_breaker": self.breaker.describe(),
                 "timestamp": datetime.utcnow().isoformat(),
                 "patent_pending": True,
                 "version": "1.0.0"
@@ -0,0 +1,322 @@
+"""
+HerBlock Geo-fence Engine
+Vectorised GPS geo-fence validation for bulk paths
+
+The species zones (from the zone registry, see zone_registry.py) are
+compiled once into NumPy arrays (centres in radians, cosines, radii,
+bounding boxes), so checking a batch of points is a handful of array
+operations instead of one Python call per point. Used by batch intake and
+anything else that validates many positions at once; single readings keep
+using the scalar validate_gps_geofence in server.py.
+
+Results are identical to the scalar path: distances are rounded to 0.01 km
+the same way, and the rare value that lands on a rounding boundary (where
+a last-bit difference between NumPy's and libm's trigonometry could round
+the other way) is recomputed with the scalar haversine.
+
+Polygon zones: approved areas can instead be given as GeoJSON Polygon /
+MultiPolygon features per species (e.g. district boundaries). They are held
+in a uniform grid index, so a lookup only ray-casts the few polygons whose
+cell and bounding box contain the point. Species with polygons are checked
+against them; the others keep their circle zones.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import json
+import math
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Distances are rounded to 1/100 km; values this close to a .5 step are recomputed exactly
+_ROUNDING_GUARD = 1e-6
+
+# Below this many points NumPy's per-call overhead outweighs the vectorised
+# maths (see benchmarks/bench_geofence.py); smaller batches use plain Python
+VECTORISE_MIN_POINTS = 48
+
+
+class GeofenceEngine:
+    """Species zones compiled into arrays for N points x M zones evaluation"""
+
+    def __init__(self, zones: Dict[str, Dict[str, Any]],
+                 exact_distance: Callable[[float, float, float, float], float],
+                 polygons: Optional["PolygonZones"] = None):
+        # exact_distance: the scalar haversine (rounded km), used for boundary cases
+        self.zones = zones
+        self.exact_distance = exact_distance
+        self.polygons = polygons
+        self.species = list(zones)
+        self.index = {name: i for i, name in enumerate(self.species)}
+
+        self.center_lat = np.array([zones[s]["center"][0] for s in self.species], dtype=np.float64)
+        self.center_lon = np.array([zones[s]["center"][1] for s in self.species], dtype=np.float64)
+        self.center_phi = np.radians(self.center_lat)
+        self.cos_center = np.cos(self.center_phi)
+        self.max_radius = np.array([zones[s]["max_radius_km"] for s in self.species], dtype=np.float64)
+        self.bbox = np.array([
+            [zones[s]["bounding_box"][k] for k in ("minLat", "maxLat", "minLng", "maxLng")]
+            for s in self.species
+        ], dtype=np.float64).reshape(-1, 4)
+        # Plain-Python copies for small batches
+        self._bbox_rows = self.bbox.tolist()
+        self._centers = [tuple(zones[s]["center"]) for s in self.species]
+
+    # ==================== Array kernels ====================
+
+    def _distances(self, lat, lon, center_lat, center_lon, cos_center) -> np.ndarray:
+        """Rounded haversine km, same operation order as calculate_haversine_distance"""
+        phi = np.radians(lat)
+        d_phi = np.radians(center_lat - lat)
+        d_lambda = np.radians(center_lon - lon)
+        a = np.sin(d_phi / 2) ** 2 + np.cos(phi) * cos_center * np.sin(d_lambda / 2) ** 2
+        km = EARTH_RADIUS_KM * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+        scaled = km * 100
+        rounded = np.rint(scaled) / 100
+        boundary = np.abs(scaled - np.floor(scaled) - 0.5) < _ROUNDING_GUARD
+        if boundary.any():
+            lat_b, lon_b, clat_b, clon_b = np.broadcast_arrays(lat, lon, center_lat, center_lon)
+            for idx in zip(*np.nonzero(boundary)):
+                rounded[idx] = self.exact_distance(float(lat_b[idx]), float(lon_b[idx]),
+                                                   float(clat_b[idx]), float(clon_b[idx]))
+        return rounded
+
+    def distance_matrix(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+        """(N, M) km from every point to every zone centre"""
+        lat = np.asarray(latitudes, dtype=np.float64)[:, None]
+        lon = np.asarray(longitudes, dtype=np.float64)[:, None]
+        return self._distances(lat, lon, self.center_lat[None, :], self.center_lon[None, :],
+                               self.cos_center[None, :])
+
+    def inside_bbox(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+        """(N, M) bounding-box membership"""
+        lat = np.asarray(latitudes, dtype=np.float64)[:, None]
+        lon = np.asarray(longitudes, dtype=np.float64)[:, None]
+        return ((self.bbox[:, 0] <= lat) & (lat <= self.bbox[:, 1]) &
+                (self.bbox[:, 2] <= lon) & (lon <= self.bbox[:, 3]))
+
+    def contains(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+        """(N, M) True where a point passes both checks of a zone (columns follow self.species)"""
+        return self.inside_bbox(latitudes, longitudes) & (self.distance_matrix(latitudes, longitudes) <= self.max_radius)
+
+    # ==================== Per-point validation ====================
+
+    def _check_arrays(self, latitudes, longitudes, zone: List[int]) -> Tuple[List[bool], List[float]]:
+        """Bounding-box flag and distance per point (0.0 where not needed), vectorised"""
+        zone = np.array(zone, dtype=np.intp)
+        known = zone >= 0
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+
+        # Each point is only checked against its own species' zone
+        z = np.where(known, zone, 0)
+        box = self.bbox[z]
+        in_box = known & (box[:, 0] <= lat) & (lat <= box[:, 1]) & (box[:, 2] <= lon) & (lon <= box[:, 3])
+
+        distance = np.zeros(len(zone))
+        rows = np.nonzero(in_box)[0]
+        if rows.size:
+            zr = z[rows]
+            distance[rows] = self._distances(lat[rows], lon[rows], self.center_lat[zr], self.center_lon[zr],
+                                             self.cos_center[zr])
+        # Plain lists: indexing NumPy scalars per point is slow
+        return in_box.tolist(), distance.tolist()
+
+    def _check_points(self, latitudes, longitudes, zone: List[int]) -> Tuple[List[bool], List[float]]:
+        """_check_arrays for small batches, one scalar haversine per point"""
+        in_box, distance = [], []
+        for lat, lon, zone_id in zip(latitudes, longitudes, zone):
+            if zone_id < 0:
+                in_box.append(False)
+                distance.append(0.0)
+                continue
+            min_lat, max_lat, min_lng, max_lng = self._bbox_rows[zone_id]
+            boxed = min_lat <= lat <= max_lat and min_lng <= lon <= max_lng
+            in_box.append(boxed)
+            distance.append(self.exact_distance(lat, lon, *self._centers[zone_id]) if boxed else 0.0)
+        return in_box, distance
+
+    def validate_many(self, latitudes: Sequence[float], longitudes: Sequence[float],
+                      species: Sequence[str]) -> List[Dict[str, Any]]:
+        """validate_gps_geofence for each (latitude, longitude, species), in order"""
+        n = len(species)
+        if n == 0:
+            return []
+        by_polygon = [self.polygons is not None and self.polygons.covers(s) for s in species]
+        zone = [-1 if poly else self.index.get(s, -1) for s, poly in zip(species, by_polygon)]
+        if n >= VECTORISE_MIN_POINTS:
+            in_box, distance = self._check_arrays(latitudes, longitudes, zone)
+        else:
+            in_box, distance = self._check_points(latitudes, longitudes, zone)
+
+        results = []
+        for i, (name, zone_id, boxed, km) in enumerate(zip(species, zone, in_box, distance)):
+            if by_polygon[i]:
+                results.append(self.polygons.validate(latitudes[i], longitudes[i], name))
+                continue
+            if zone_id < 0:
+                results.append({"valid": True, "method": "no_zone_defined", "species": name})
+                continue
+            if not boxed:
+                results.append({
+                    "valid": False,
+                    "method": "bounding_box",
+                    "reason": f"Location ({latitudes[i]}, {longitudes[i]}) outside {name} cultivation zone"
+                })
+                continue
+            spec = self.zones[name]
+            if km > spec["max_radius_km"]:
+                results.append({
+                    "valid": False,
+                    "method": "haversine",
+                    "distance_km": km,
+                    "max_radius_km": spec["max_radius_km"],
+                    "reason": f"Distance {km}km exceeds maximum {spec['max_radius_km']}km from zone center"
+                })
+                continue
+            center_lat, center_lon = spec["center"]
+            results.append({
+                "valid": True,
+                "method": "haversine",
+                "distance_km": km,
+                "zone_center": {"lat": center_lat, "lon": center_lon}
+            })
+        return results
+
+
+# ==================== Polygon zones ====================
+
+class PolygonZoneError(ValueError):
+    """Raised for an unreadable or malformed zone file"""
+
+
+def _crossings(ring: np.ndarray, lon: float, lat: float) -> int:
+    """Edges of a closed ring crossed by a ray from the point towards +longitude"""
+    x0, y0, x1, y1 = ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]
+    straddles = (y0 > lat) != (y1 > lat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+    return int(np.count_nonzero(straddles & (lon < x_cross)))
+
+
+class PolygonZones:
+    """Per-species Polygon/MultiPolygon zones behind a uniform grid index"""
+
+    def __init__(self, features: List[Dict[str, Any]], cell_degrees: float = 0.25):
+        self.cell = cell_degrees
+        self.polygons: List[Dict[str, Any]] = []
+        self.by_species: Dict[str, List[int]] = {}
+        # (species, column, row) -> ids of polygons whose bounding box overlaps the cell
+        self.grid: Dict[Tuple[str, int, int], List[int]] = {}
+        for number, feature in enumerate(features):
+            try:
+                self._add_feature(feature)
+            except (KeyError, TypeError, ValueError, IndexError) as e:
+                raise PolygonZoneError(f"Feature {number}: {e}")
+
+    @classmethod
+    def from_file(cls, path, cell_degrees: float = 0.25) -> "PolygonZones":
+        """Load a GeoJSON FeatureCollection; each feature names its species and zone"""
+        try:
+            with open(path) as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            raise PolygonZoneError(f"Cannot read zone file {path}: {e}")
+        return cls.from_document(document, cell_degrees, source=str(path))
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any], cell_degrees: float = 0.25,
+                      source: str = "zone file") -> "PolygonZones":
+        if not isinstance(document, dict) or document.get("type") != "FeatureCollection":
+            raise PolygonZoneError(f"{source} is not a GeoJSON FeatureCollection")
+        return cls(document.get("features", []), cell_degrees)
+
+    def _add_feature(self, feature: Dict[str, Any]) -> None:
+        properties = feature.get("properties") or {}
+        species = properties["species"]
+        species = [species] if isinstance(species, str) else list(species)
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            parts = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            parts = geometry["coordinates"]
+        else:
+            raise ValueError(f"unsupported geometry {geometry['type']}")
+
+        for part in parts:
+            rings = []
+            for ring in part:
+                # [lon, lat(, alt)] positions; close the ring if the file did not
+                points = np.asarray([position[:2] for position in ring], dtype=np.float64)
+                if len(points) and not np.array_equal(points[0], points[-1]):
+                    points = np.vstack([points, points[:1]])
+                if len(points) < 4:
+                    raise ValueError("a ring needs at least 3 distinct positions")
+                rings.append(points)
+            exterior = rings[0]
+            bbox = (float(exterior[:, 0].min()), float(exterior[:, 1].min()),
+                    float(exterior[:, 0].max()), float(exterior[:, 1].max()))
+            polygon_id = len(self.polygons)
+            self.polygons.append({
+                "name": properties.get("name") or f"zone-{polygon_id}",
+                "species": species,
+                "rings": rings,
+                "bbox": bbox
+            })
+            for name in species:
+                self.by_species.setdefault(name, []).append(polygon_id)
+                for column in range(self._cell(bbox[0]), self._cell(bbox[2]) + 1):
+                    for row in range(self._cell(bbox[1]), self._cell(bbox[3]) + 1):
+                        self.grid.setdefault((name, column, row), []).append(polygon_id)
+
+    def _cell(self, degrees: float) -> int:
+        return math.floor(degrees / self.cell)
+
+    def covers(self, species: str) -> bool:
+        return species in self.by_species
+
+    def locate(self, latitude: float, longitude: float, species: str) -> Optional[Dict[str, Any]]:
+        """The species polygon containing the point (even-odd rule, holes excluded), or None"""
+        for polygon_id in self.grid.get((species, self._cell(longitude), self._cell(latitude)), ()):
+            polygon = self.polygons[polygon_id]
+            min_lon, min_lat, max_lon, max_lat = polygon["bbox"]
+            if not (min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat):
+                continue
+            if sum(_crossings(ring, longitude, latitude) for ring in polygon["rings"]) % 2 == 1:
+                return polygon
+        return None
+
+    def validate(self, latitude: float, longitude: float, species: str) -> Dict[str, Any]:
+        """Same result shape as validate_gps_geofence, with method = polygon"""
+        polygon = self.locate(latitude, longitude, species)
+        if polygon is None:
+            return {
+                "valid": False,
+                "method": "polygon",
+                "reason": f"Location ({latitude}, {longitude}) outside {species} cultivation zone"
+            }
+        return {"valid": True, "method": "polygon", "zone": polygon["name"]}
+
+    def zones_for(self, species: str, geometry: bool = False) -> List[Dict[str, Any]]:
+        zones = []
+        for polygon_id in self.by_species.get(species, []):
+            polygon = self.polygons[polygon_id]
+            zone = {"name": polygon["name"], "type": "polygon", "bbox": list(polygon["bbox"])}
+            if geometry:
+                zone["coordinates"] = [ring.tolist() for ring in polygon["rings"]]
+            zones.append(zone)
+        return zones
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "polygons": len(self.polygons),
+            "species": sorted(self.by_species),
+            "grid_cells": len(self.grid),
+            "cell_degrees": self.cell
+        }
@@ -0,0 +1,133 @@
+"""
+HerBlock Idempotency Keys
+Replay-safe writes for clients that retry after timeouts
+
+A client sends `Idempotency-Key: <unique value>` with a write. The first
+request with that key runs normally and its response is stored; any retry
+with the same key gets the stored response back without running the write
+again. Keys are scoped per client credential (per client address on routes
+that take none), expire after a TTL, and a key reused with a different
+request is rejected.
+
+Record lifecycle: in_progress -> done (response stored), or deleted when the
+write fails so the client may retry it.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import hashlib
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+# Recomputed for the replayed body rather than stored
+UNSTORED_HEADERS = (b"content-length", b"transfer-encoding")
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request that has not finished, or by a different request"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{method} {path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def key_scope(key: str, credential: Optional[str], client: Optional[str] = None) -> str:
+    """
+    Storage id for a key; the owner is hashed so it is never stored.
+    Without a credential the key belongs to the client address, so two
+    anonymous clients choosing the same key never see each other's response.
+    """
+    if credential:
+        owner = f"credential:{credential}"
+    else:
+        owner = f"client:{client or 'unknown'}"
+    return f"{hashlib.sha256(owner.encode()).hexdigest()[:16]}:{key}"
+
+
+class IdempotencyStore:
+    """MongoDB-backed idempotency records (`idempotency_keys`, expired by a TTL index)"""
+
+    def __init__(self, db, lease_seconds: int = 120):
+        self.collection = db.idempotency_keys
+        # An in-progress claim older than this belongs to a crashed worker
+        self.lease_seconds = lease_seconds
+
+    async def begin(self, scope: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a key. Returns None if the caller should run the request, or the
+        stored record ({status_code, body, headers}) to replay.
+        Raises IdempotencyConflict if the key is busy or was used differently.
+        """
+        try:
+            await self.collection.insert_one({
+                "_id": scope,
+                "fingerprint": fingerprint,
+                "status": IN_PROGRESS,
+                "created_at": datetime.now(timezone.utc)
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        record = await self.collection.find_one({"_id": scope})
+        if record is None:
+            # Expired or released between insert and read: claim again
+            return await self.begin(scope, fingerprint)
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+        if record["status"] != DONE:
+            if await self._take_over(record):
+                return None
+            raise IdempotencyConflict(409, "A request with this Idempotency-Key is still being processed")
+        return record
+
+    async def _take_over(self, record: Dict[str, Any]) -> bool:
+        created_at = record["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        if now - created_at < timedelta(seconds=self.lease_seconds):
+            return False
+        result = await self.collection.update_one(
+            {"_id": record["_id"], "status": IN_PROGRESS, "created_at": record["created_at"]},
+            {"$set": {"created_at": now}}
+        )
+        return result.modified_count == 1
+
+    async def complete(self, scope: str, status_code: int, body: bytes, raw_headers: RawHeaders) -> None:
+        # Kept as a list of pairs: repeated headers such as Set-Cookie must survive
+        headers = [[name.decode("latin-1"), value.decode("latin-1")]
+                   for name, value in raw_headers if name.lower() not in UNSTORED_HEADERS]
+        await self.collection.update_one(
+            {"_id": scope},
+            {"$set": {"status": DONE, "status_code": status_code, "body": body, "headers": headers,
+                      "completed_at": datetime.now(timezone.utc)}}
+        )
+
+    @staticmethod
+    def stored_headers(record: Dict[str, Any]) -> RawHeaders:
+        if "headers" not in record:
+            # Stored before headers were kept
+            media_type = record.get("media_type")
+            return [(b"content-type", media_type.encode("latin-1"))] if media_type else []
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+
+    async def release(self, scope: str) -> None:
+        """Forget a key whose request failed, so a retry runs it again"""
+        await self.collection.delete_one({"_id": scope, "status": IN_PROGRESS})
@@ -0,0 +1,234 @@
+"""
+HerBlock Index Manager
+Declares the MongoDB indexes the API's hot queries rely on
+
+INDEXES lists every index, QUERY_SHAPES lists the query shapes the endpoints
+issue. ensure_indexes() builds the indexes (run in the background from
+startup) and find_collscans() explains each registered query shape and
+reports any that would fall back to a collection scan.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+ASC = 1
+DESC = -1
+
+
+class IndexSpec:
+    """One index on one collection"""
+
+    def __init__(self, collection: str, keys: List[tuple], **options):
+        self.collection = collection
+        self.keys = keys
+        self.options = options
+
+    @property
+    def name(self) -> str:
+        return self.options.get("name") or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+class QueryShape:
+    """A representative query an endpoint issues; sample values stand in for real ones"""
+
+    def __init__(self, name: str, collection: str, filter: Dict[str, Any],
+                 sort: Optional[List[tuple]] = None):
+        self.name = name
+        self.collection = collection
+        self.filter = filter
+        self.sort = sort
+
+
+class QueryPlanError(Exception):
+    """Raised when a registered query shape is not served by an index"""
+
+
+INDEXES: List[IndexSpec] = [
+    # collection_events - trace lookups, intake feed, dashboard, collector stats
+    IndexSpec("collection_events", [("product_id", ASC)]),
+    # Outbox read-model writes upsert on `id` - one document per ledger record
+    IndexSpec("collection_events", [("id", ASC)], unique=True, name="id_unique",
+              partialFilterExpression={"id": {"$exists": True}}),
+    IndexSpec("collection_events", [("source", ASC), ("timestamp", DESC)]),
+    IndexSpec("collection_events", [("timestamp", DESC)]),
+    IndexSpec("collection_events", [("collector_id", ASC)]),
+    IndexSpec("collection_events", [("blockchain_collection_id", ASC)], sparse=True),
+    # Offline sync idempotency: one record per phone-side id
+    IndexSpec("collection_events", [("collector_id", ASC), ("local_id", ASC)], unique=True,
+              partialFilterExpression={"local_id": {"$exists": True}}),
+    # Device batch intake idempotency: one record per reading of a device boot
+    IndexSpec("collection_events", [("device_id", ASC), ("device_boot_id", ASC), ("device_seq", ASC)], unique=True,
+              partialFilterExpression={"device_seq": {"$exists": True}}),
+
+    # products - /trace and blockchain trace fallback
+    IndexSpec("products", [("id", ASC)], unique=True, name="id_unique",
+              partialFilterExpression={"id": {"$exists": True}}),
+    IndexSpec("products", [("batch_id", ASC)]),
+    IndexSpec("products", [("blockchain_product_id", ASC)], sparse=True),
+    IndexSpec("products", [("timestamp", DESC)]),
+
+    IndexSpec("processing_steps", [("product_id", ASC)]),
+    IndexSpec("processing_steps", [("id", ASC)], unique=True, name="id_unique",
+              partialFilterExpression={"id": {"$exists": True}}),
+    IndexSpec("quality_tests", [("product_id", ASC)]),
+    IndexSpec("quality_tests", [("id", ASC)], unique=True, name="id_unique",
+              partialFilterExpression={"id": {"$exists": True}}),
+
+    # Hash chain - unique index keeps the chain linear
+    IndexSpec("blockchain_transactions", [("product_id", ASC), ("block_index", ASC)], unique=True),
+
+    # Auth lookups
+    IndexSpec("devices", [("api_key", ASC), ("active", ASC)]),
+    IndexSpec("devices", [("device_id", ASC)], unique=True),
+    IndexSpec("collectors", [("collector_id", ASC)], unique=True),
+    IndexSpec("users", [("username", ASC)]),
+
+    # Per-product Merkle trees
+    IndexSpec("merkle_nodes", [("product_key", ASC), ("level", ASC), ("index", ASC)], unique=True),
+    IndexSpec("merkle_nodes", [("product_key", ASC), ("hash", ASC)]),
+
+    # Analytics rollup range queries
+    IndexSpec("rollups", [("period", ASC), ("dimension", ASC), ("bucket", ASC), ("key", ASC)]),
+
+    # Live event fan-out (LIVE_EVENTS_SOURCE=mongo) - an hour is plenty to resume
+    IndexSpec("live_events", [("time", ASC)], expireAfterSeconds=3600),
+
+    # Resumable sync sessions are kept for a week
+    IndexSpec("sync_sessions", [("created_at", ASC)], expireAfterSeconds=7 * 86400),
+    IndexSpec("sync_chunks", [("received_at", ASC)], expireAfterSeconds=7 * 86400),
+    IndexSpec("sync_chunks", [("session_id", ASC), ("seq", ASC)]),
+
+    # Idempotency-Key replay records expire after a day
+    IndexSpec("idempotency_keys", [("created_at", ASC)], expireAfterSeconds=86400),
+
+    # GridFS photo store (BLOB_STORE=gridfs) - one file per SHA-256
+    IndexSpec("blobs.files", [("filename", ASC)], unique=True),
+
+    # Blockchain outbox worker
+    IndexSpec("outbox", [("tx_ref", ASC)], unique=True),
+    IndexSpec("outbox", [("status", ASC), ("next_attempt_at", ASC)]),
+    # Reclaiming entries whose lease expired (second branch of the claim query)
+    IndexSpec("outbox", [("status", ASC), ("lease_until", ASC)]),
+]
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("trace.product", "products",
+               {"$or": [{"id": "X"}, {"batch_id": "X"}]}),
+    QueryShape("blockchain_trace.product", "products",
+               {"$or": [{"id": "X"}, {"batch_id": "X"}, {"blockchain_product_id": "X"}]}),
+    QueryShape("trace.hardware_event", "collection_events",
+               {"$or": [{"product_id": "X"}, {"id": "X"}]}),
+    QueryShape("trace.collection_events", "collection_events",
+               {"product_id": {"$in": ["X", "Y"]}}),
+    QueryShape("trace.processing_steps", "processing_steps",
+               {"product_id": {"$in": ["X", "Y"]}}),
+    QueryShape("trace.quality_tests", "quality_tests",
+               {"product_id": {"$in": ["X", "Y"]}}),
+    QueryShape("trace.blockchain_transactions", "blockchain_transactions",
+               {"product_id": "X"}, sort=[("block_index", ASC)]),
+    QueryShape("chain.latest_transaction", "blockchain_transactions",
+               {"product_id": "X"}, sort=[("block_index", DESC)]),
+    QueryShape("blockchain.collection_fallback", "collection_events",
+               {"$or": [{"id": "X"}, {"blockchain_collection_id": "X"}]}),
+    QueryShape("intake.events", "collection_events",
+               {"source": "hardware_device"}, sort=[("timestamp", DESC)]),
+    QueryShape("dashboard.recent_collections", "collection_events",
+               {}, sort=[("timestamp", DESC)]),
+    QueryShape("dashboard.recent_products", "products",
+               {}, sort=[("timestamp", DESC)]),
+    QueryShape("intake.device_auth", "devices",
+               {"api_key": "X", "active": True}),
+    QueryShape("devices.register", "devices",
+               {"device_id": "X"}),
+    QueryShape("collector.lookup", "collectors",
+               {"collector_id": "X"}),
+    QueryShape("collector.collection_count", "collection_events",
+               {"collector_id": "X"}),
+    QueryShape("auth.user", "users",
+               {"username": "X"}),
+    QueryShape("merkle.leaf", "merkle_nodes",
+               {"product_key": "X", "level": 0, "hash": "H"}),
+    QueryShape("merkle.siblings", "merkle_nodes",
+               {"product_key": "X", "$or": [{"level": 0, "index": 1}, {"level": 1, "index": 0}]}),
+    QueryShape("analytics.rollups", "rollups",
+               {"period": "day", "dimension": "species", "bucket": {"$gte": "2026-01-01", "$lte": "2026-01-31"}},
+               sort=[("bucket", ASC), ("key", ASC)]),
+    QueryShape("sync.originals", "collection_events",
+               {"collector_id": "X", "local_id": {"$in": ["L1", "L2"]}}),
+    QueryShape("intake.originals", "collection_events",
+               {"device_id": "X", "device_boot_id": "B", "device_seq": {"$in": [1, 2]}}),
+    QueryShape("sync.session_chunks", "sync_chunks",
+               {"session_id": "X", "status": "acknowledged"}, sort=[("seq", ASC)]),
+    QueryShape("outbox.status", "outbox",
+               {"tx_ref": "X"}),
+    QueryShape("outbox.claim", "outbox",
+               {"$or": [
+                   {"status": "pending", "next_attempt_at": {"$lte": datetime(2026, 1, 1, tzinfo=timezone.utc)}},
+                   {"status": "processing", "lease_until": {"$lt": datetime(2026, 1, 1, tzinfo=timezone.utc)}}
+               ]},
+               sort=[("next_attempt_at", ASC)]),
+]
+
+
+async def ensure_indexes(db, indexes: Optional[List[IndexSpec]] = None) -> Dict[str, str]:
+    """
+    Create every declared index. Failures are reported per index (e.g. a
+    unique index over existing duplicates) instead of aborting the rest.
+    """
+    results = {}
+    for spec in indexes or INDEXES:
+        key = f"{spec.collection}.{spec.name}"
+        try:
+            await db[spec.collection].create_index(spec.keys, background=True, **spec.options)
+            results[key] = "ok"
+        except Exception as e:
+            results[key] = f"error: {e}"
+            print(f"⚠️  Index {key} not built: {e}")
+    return results
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for child_key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+            if child_key in node:
+                pending.append(node[child_key])
+        pending.extend(node.get("inputStages", []))
+    return stages
+
+
+async def explain_shape(db, shape: QueryShape) -> List[str]:
+    """Stages of the winning plan for one query shape"""
+    cursor = db[shape.collection].find(shape.filter)
+    if shape.sort:
+        cursor = cursor.sort(shape.sort)
+    explanation = await cursor.explain()
+    return _plan_stages(explanation.get("queryPlanner", {}).get("winningPlan", {}))
+
+
+async def find_collscans(db, shapes: Optional[List[QueryShape]] = None) -> List[Dict[str, Any]]:
+    """Registered query shapes whose winning plan contains a COLLSCAN"""
+    problems = []
+    for shape in shapes or QUERY_SHAPES:
+        stages = await explain_shape(db, shape)
+        if "COLLSCAN" in stages:
+            problems.append({"query": shape.name, "collection": shape.collection, "stages": stages})
+    return problems
+
+
+async def verify_query_plans(db, shapes: Optional[List[QueryShape]] = None) -> None:
+    """Raise QueryPlanError if any registered query shape does a COLLSCAN"""
+    problems = await find_collscans(db, shapes)
+    if problems:
+        names = ", ".join(p["query"] for p in problems)
+        raise QueryPlanError(f"Queries without index support: {names}")
@@ -0,0 +1,132 @@
+"""
+HerBlock Merkle Mountain Range
+Append-only Merkle tree over a product's event fingerprints
+
+PATENT CLAIM 4: Merkle Tree Root Calculation
+
+Leaves are event fingerprints (hex SHA-256). Node (level, index) hashes the
+pair of nodes (level-1, 2*index) and (level-1, 2*index+1), so nodes never
+change once written. A tree of n leaves is a list of perfect subtrees
+("peaks"), one per set bit of n. Appending a leaf only creates the O(log n)
+nodes that merge equal-height peaks, and needs nothing but the current
+peaks. The root bags the peaks right-to-left.
+
+Parent hash: SHA-256(left_hex + right_hex), the same convention as the
+original calculate_merkle_root.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+
+Node = Dict[str, Any]  # {"level": int, "index": int, "hash": str}
+
+
+def hash_pair(left: str, right: str) -> str:
+    return hashlib.sha256((left + right).encode()).hexdigest()
+
+
+def bag_peaks(peak_hashes: List[str]) -> Optional[str]:
+    """Fold peaks (left to right order) into one root"""
+    if not peak_hashes:
+        return None
+    root = peak_hashes[-1]
+    for peak in reversed(peak_hashes[:-1]):
+        root = hash_pair(peak, root)
+    return root
+
+
+def append_leaf(peaks: List[Node], leaf_count: int, leaf_hash: str) -> Tuple[List[Node], List[Node]]:
+    """
+    Append one leaf to a tree with `leaf_count` leaves and the given peaks.
+    Returns (new_nodes, new_peaks); new_nodes are the nodes to persist.
+    """
+    node = {"level": 0, "index": leaf_count, "hash": leaf_hash}
+    new_nodes = [node]
+    peaks = list(peaks)
+
+    # While the new node is a right child, merge it with the left peak
+    while node["index"] % 2 == 1:
+        left = peaks.pop()
+        node = {
+            "level": node["level"] + 1,
+            "index": node["index"] // 2,
+            "hash": hash_pair(left["hash"], node["hash"])
+        }
+        new_nodes.append(node)
+
+    peaks.append(node)
+    return new_nodes, peaks
+
+
+def build(leaf_hashes: List[str]) -> Tuple[List[Node], List[Node]]:
+    """Build a whole tree in memory; returns (all_nodes, peaks)"""
+    nodes: List[Node] = []
+    peaks: List[Node] = []
+    for count, leaf in enumerate(leaf_hashes):
+        created, peaks = append_leaf(peaks, count, leaf)
+        nodes.extend(created)
+    return nodes, peaks
+
+
+def merkle_root(leaf_hashes: List[str]) -> Optional[str]:
+    """Root over a list of fingerprints (computed in one pass, O(n))"""
+    _, peaks = build(leaf_hashes)
+    return bag_peaks([p["hash"] for p in peaks])
+
+
+def peak_for_leaf(leaf_index: int, leaf_count: int) -> Tuple[int, int]:
+    """(position in the peak list, height) of the peak that contains a leaf"""
+    start = 0
+    position = 0
+    for height in range(leaf_count.bit_length() - 1, -1, -1):
+        if leaf_count & (1 << height):
+            if leaf_index < start + (1 << height):
+                return position, height
+            start += 1 << height
+            position += 1
+    raise ValueError(f"Leaf {leaf_index} not in a tree of {leaf_count} leaves")
+
+
+def proof_positions(leaf_index: int, leaf_count: int) -> List[Tuple[int, int]]:
+    """(level, index) of each sibling on the path from a leaf up to its peak"""
+    _, height = peak_for_leaf(leaf_index, leaf_count)
+    return [(level, (leaf_index >> level) ^ 1) for level in range(height)]
+
+
+def build_proof(leaf_index: int, leaf_count: int, siblings: Dict[Tuple[int, int], str],
+                peaks: List[Node]) -> Dict[str, Any]:
+    """
+    Assemble an inclusion proof from sibling hashes (keyed by (level, index))
+    and the tree's peaks. Size is O(log n).
+    """
+    peak_position, _ = peak_for_leaf(leaf_index, leaf_count)
+    path = []
+    for level, index in proof_positions(leaf_index, leaf_count):
+        path.append({
+            "hash": siblings[(level, index)],
+            "side": "left" if index % 2 == 0 else "right"
+        })
+    return {
+        "leaf_index": leaf_index,
+        "leaf_count": leaf_count,
+        "path": path,
+        "peak_position": peak_position,
+        "peaks": [p["hash"] for p in peaks],
+        "root": bag_peaks([p["hash"] for p in peaks])
+    }
+
+
+def verify_proof(leaf_hash: str, proof: Dict[str, Any]) -> bool:
+    """Check an inclusion proof produced by build_proof"""
+    node = leaf_hash
+    for step in proof["path"]:
+        node = hash_pair(step["hash"], node) if step["side"] == "left" else hash_pair(node, step["hash"])
+
+    peaks = list(proof["peaks"])
+    if not 0 <= proof["peak_position"] < len(peaks) or peaks[proof["peak_position"]] != node:
+        return False
+    return bag_peaks(peaks) == proof["root"]
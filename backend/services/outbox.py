@@ -0,0 +1,315 @@
+"""
+HerBlock Blockchain Outbox
+Durable write-ahead queue between the API and Hyperledger Fabric
+
+API write routes persist the request to the MongoDB `outbox` collection and
+acknowledge immediately with a pending tx reference. A background worker
+claims due entries, commits them through a per-kind handler, and retries
+transient failures with exponential backoff.
+
+Handlers commit in two steps: `invoke` submits the entry to the ledger and
+`store` writes the MongoDB read model. The ledger result is saved on the entry
+(ledger_result) before `store` runs, so a retry after a failed read-model
+write skips the invoke instead of submitting the transaction twice.
+
+Entry lifecycle: pending -> processing -> committed | rejected | failed
+
+Failures are classified: OutboxRejected and malformed payloads (KeyError,
+TypeError, ValueError) raised by `invoke` are permanent and rejected at once;
+`unavailable_errors` (the network shedding load or an open circuit breaker) are
+retried without using up an attempt; anything else is retried until
+max_attempts. Once the ledger has committed the entry nothing is rejected: a
+failing `store` is retried, and at worst the entry ends up failed with its
+ledger_result kept for repair.
+
+A claim is a lease: the claiming worker gets a random lease_token, renews
+lease_until while the handler runs, and every later write to the entry is
+fenced on that token. A worker whose lease expired (and was reclaimed by
+another worker) can no longer overwrite the entry's outcome.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Awaitable, Optional, Dict, Any
+
+from pymongo import ReturnDocument
+
+PENDING = "pending"
+PROCESSING = "processing"
+COMMITTED = "committed"
+REJECTED = "rejected"
+FAILED = "failed"
+
+FINAL_STATUSES = (COMMITTED, REJECTED, FAILED)
+
+
+class OutboxRejected(Exception):
+    """Raised by a handler for permanent failures that must not be retried"""
+
+
+# Errors from handler.invoke that retrying cannot fix
+REJECTION_ERRORS = (OutboxRejected, KeyError, TypeError, ValueError)
+
+
+@dataclass
+class OutboxHandler:
+    """Ledger submit and read-model write for one kind of entry"""
+    # entry -> ledger result
+    invoke: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    # (entry, ledger result) -> None; must be idempotent, it reruns on retry
+    store: Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+
+# Called with a status summary when an entry is queued and when it finishes
+Notifier = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class BlockchainOutbox:
+    """MongoDB-backed outbox with a concurrent background drain worker"""
+
+    def __init__(self, db, handlers: Dict[str, OutboxHandler], concurrency: int = 16,
+                 max_attempts: int = 8, lease_seconds: int = 120, poll_interval: float = 2.0,
+                 notify: Optional[Notifier] = None, unavailable_errors: tuple = (),
+                 max_unavailable_backoff: int = 60):
+        self.collection = db.outbox
+        self.handlers = handlers
+        self.notify = notify
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.unavailable_errors = unavailable_errors
+        self.max_unavailable_backoff = max_unavailable_backoff
+
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        # tx_ref -> event set when this process finishes the entry
+        self._waiters: Dict[str, asyncio.Event] = {}
+
+    # ==================== Producer side ====================
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], submitted_by: Optional[str] = None,
+                      context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Persist a write and return its outbox entry (status: pending)"""
+        if kind not in self.handlers:
+            raise ValueError(f"No outbox handler for '{kind}'")
+
+        now = datetime.now(timezone.utc)
+        entry = {
+            "tx_ref": f"TX-{uuid.uuid4().hex[:12].upper()}",
+            "kind": kind,
+            "payload": payload,
+            "context": context or {},
+            "submitted_by": submitted_by,
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "lease_until": None,
+            "lease_token": None,
+            "created_at": now,
+            "committed_at": None,
+            "ledger_result": None,
+            "result": None,
+            "last_error": None
+        }
+        await self.collection.insert_one(entry)
+        entry.pop("_id", None)
+        self._wakeup.set()
+        await self._notify(entry, entry)
+        return entry
+
+    async def get(self, tx_ref: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"tx_ref": tx_ref}, {"_id": 0})
+
+    async def wait(self, tx_ref: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll until the entry reaches a final status or timeout expires"""
+        entry = await self.get(tx_ref)
+        if entry is None or entry["status"] in FINAL_STATUSES or timeout <= 0:
+            return entry
+
+        event = self._waiters.setdefault(tx_ref, asyncio.Event())
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                # Re-read periodically: another worker process may commit it
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            entry = await self.get(tx_ref)
+            if entry is None or entry["status"] in FINAL_STATUSES:
+                break
+        self._waiters.pop(tx_ref, None)
+        return entry
+
+    # ==================== Worker side ====================
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                # Entries whose worker died mid-flight
+                {"status": PROCESSING, "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": PROCESSING,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "lease_token": uuid.uuid4().hex
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self) -> None:
+        while True:
+            # Clear before claiming so wakeups that arrive mid-claim aren't lost
+            self._wakeup.clear()
+            try:
+                while len(self._in_flight) < self.concurrency:
+                    entry = await self._claim()
+                    if entry is None:
+                        break
+                    task = asyncio.ensure_future(self._process(entry))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._task_done)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Outbox worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        # A slot freed up - look for more work straight away
+        self._wakeup.set()
+
+    async def _renew_lease(self, entry: Dict[str, Any]) -> None:
+        """Keep extending the lease while the handler runs (e.g. queued in the Fabric scheduler)"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            renewed = await self.collection.update_one(
+                {"tx_ref": entry["tx_ref"], "lease_token": entry["lease_token"]},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+            )
+            if renewed.matched_count == 0:
+                print(f"⚠️  Outbox lease on {entry['tx_ref']} was lost")
+                return
+
+    async def _process(self, entry: Dict[str, Any]) -> None:
+        handler = self.handlers[entry["kind"]]
+        update: Dict[str, Any]
+        increments: Dict[str, int] = {}
+
+        heartbeat = asyncio.ensure_future(self._renew_lease(entry))
+        result = entry.get("ledger_result")
+        try:
+            if result is None:
+                result = await handler.invoke(entry)
+                # Saved before the read-model write, so retries don't invoke again
+                await self.collection.update_one(
+                    {"tx_ref": entry["tx_ref"], "lease_token": entry["lease_token"]},
+                    {"$set": {"ledger_result": result, "ledger_committed_at": datetime.now(timezone.utc)}}
+                )
+            await handler.store(entry, result)
+            now = datetime.now(timezone.utc)
+            update = {"status": COMMITTED, "result": result, "committed_at": now, "last_error": None}
+        except REJECTION_ERRORS as e:
+            now = datetime.now(timezone.utc)
+            if result is None:
+                # Retrying cannot fix a rejected or malformed entry
+                update = {"status": REJECTED, "last_error": str(e)}
+            else:
+                # The ledger has it: only the read-model write failed, and that must be retried
+                update = self._retry_update(entry, e, now)
+        except self.unavailable_errors as e:
+            # Not the entry's fault: wait for the network, and give the attempt back
+            now = datetime.now(timezone.utc)
+            backoff = min(2 ** entry.get("deferrals", 0), self.max_unavailable_backoff)
+            update = {
+                "status": PENDING,
+                "last_error": str(e),
+                "next_attempt_at": now + timedelta(seconds=backoff)
+            }
+            increments = {"attempts": -1, "deferrals": 1}
+        except Exception as e:
+            now = datetime.now(timezone.utc)
+            update = self._retry_update(entry, e, now)
+        finally:
+            heartbeat.cancel()
+
+        update["lease_until"] = None
+        update["lease_token"] = None
+        update["updated_at"] = now
+        # Fenced: if the lease was lost, the worker that reclaimed the entry owns its outcome
+        written = await self.collection.update_one(
+            {"tx_ref": entry["tx_ref"], "lease_token": entry["lease_token"]},
+            {"$set": update, **({"$inc": increments} if increments else {})}
+        )
+        if written.matched_count == 0:
+            print(f"⚠️  Outbox result for {entry['tx_ref']} discarded: lease was reclaimed")
+            return
+
+        if update["status"] in FINAL_STATUSES:
+            waiter = self._waiters.get(entry["tx_ref"])
+            if waiter is not None:
+                waiter.set()
+            await self._notify(entry, update)
+
+    def _retry_update(self, entry: Dict[str, Any], error: Exception, now: datetime) -> Dict[str, Any]:
+        """Back off and retry, or give up once max_attempts is spent"""
+        if entry["attempts"] >= self.max_attempts:
+            return {"status": FAILED, "last_error": str(error)}
+        backoff = min(2 ** entry["attempts"], 300)
+        return {
+            "status": PENDING,
+            "last_error": str(error),
+            "next_attempt_at": now + timedelta(seconds=backoff)
+        }
+
+    async def _notify(self, entry: Dict[str, Any], state: Dict[str, Any]) -> None:
+        if self.notify is None:
+            return
+        try:
+            await self.notify({
+                "tx_ref": entry["tx_ref"],
+                "kind": entry["kind"],
+                "status": state["status"],
+                "result": state.get("result"),
+                "error": state.get("last_error")
+            })
+        except Exception as e:
+            print(f"⚠️  Outbox notification failed for {entry['tx_ref']}: {e}")
+
+    async def describe(self) -> Dict[str, Any]:
+        counts = {}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return {"in_flight": len(self._in_flight), "by_status": counts}
@@ -0,0 +1,269 @@
+"""
+HerBlock Analytics Rollups
+Incremental daily/monthly aggregates of collection activity
+
+Each accepted collection event (and each geo-fence rejection) updates one
+bucket per period and dimension in the `rollups` collection with a single
+unordered bulk $inc, so range queries read a handful of small pre-aggregated
+documents instead of scanning collection_events.
+
+History recorded before rollups existed is backfilled once per deployment:
+the worker that inserts the `rollup_backfill` marker document runs it, and
+every other worker skips it.
+
+Bucket document:
+    {period: "day" | "month", bucket: "2026-10-18" | "2026-10",
+     dimension: "species", key: "Tulsi",
+     count, quantity_kg, grades: {"A": n, ...}, geo_rejected}
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+BACKFILL_MARKER_ID = "rollup_backfill"
+
+PERIODS = {
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+# Dimension -> how to read its key from a collection event (None: not applicable)
+DIMENSIONS = {
+    "all": lambda event: "all",
+    "species": lambda event: event.get("species_name") or event.get("species"),
+    "region": lambda event: _region(event),
+    "collector": lambda event: event.get("collector_id"),
+    "device": lambda event: event.get("device_id"),
+}
+
+
+class RollupQueryError(ValueError):
+    """Raised for unknown dimensions/periods or malformed ranges"""
+
+
+def _region(event: Dict[str, Any]) -> Optional[str]:
+    """'state/district' when the event carries them, else its free-form region"""
+    state, district = event.get("state"), event.get("district")
+    if state or district:
+        return f"{state or 'unknown'}/{district or 'unknown'}"
+    return event.get("region")
+
+
+def _as_utc(value: Any) -> Optional[datetime]:
+    """A datetime or ISO-8601 string as an aware UTC datetime (naive values are UTC)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _event_time(event: Dict[str, Any]) -> datetime:
+    """
+    When the herbs were collected. Offline-synced events are stamped with the
+    sync time and keep the field date in collected_at, which wins when valid.
+    """
+    return _as_utc(event.get("collected_at")) or _as_utc(event.get("timestamp")) or datetime.now(timezone.utc)
+
+
+def _grade_field(grade: Any) -> str:
+    # Grades become field names; keep them path-safe
+    return str(grade or "ungraded").replace(".", "_").replace("$", "_")
+
+
+def bucket_keys(event: Dict[str, Any]) -> List[Tuple[str, str, str, str]]:
+    """(period, bucket, dimension, key) for every bucket an event falls into"""
+    when = _event_time(event)
+    keys = []
+    for dimension, read_key in DIMENSIONS.items():
+        key = read_key(event)
+        if key is None or key == "":
+            continue
+        for period, fmt in PERIODS.items():
+            keys.append((period, when.strftime(fmt), dimension, str(key)))
+    return keys
+
+
+def _bucket_update(bucket: Tuple[str, str, str, str], inc: Dict[str, Any]) -> UpdateOne:
+    period, bucket_name, dimension, key = bucket
+    return UpdateOne(
+        {"_id": f"{period}|{bucket_name}|{dimension}|{key}"},
+        {
+            "$inc": inc,
+            "$setOnInsert": {"period": period, "bucket": bucket_name, "dimension": dimension, "key": key}
+        },
+        upsert=True
+    )
+
+
+def collection_increments(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        quantity = float(event.get("quantity_kg") or 0)
+    except (TypeError, ValueError):
+        quantity = 0.0
+    return {"count": 1, "quantity_kg": quantity, f"grades.{_grade_field(event.get('quality_grade'))}": 1}
+
+
+class RollupEngine:
+    """Maintains and queries the `rollups` collection"""
+
+    def __init__(self, db):
+        self.collection = db.rollups
+        self.source = db.collection_events
+
+    async def record_collection(self, events: List[Dict[str, Any]]) -> None:
+        """Add accepted collection events to their buckets"""
+        operations = []
+        for event in events:
+            inc = collection_increments(event)
+            operations.extend(_bucket_update(bucket, inc) for bucket in bucket_keys(event))
+        await self._apply(operations)
+
+    async def record_rejection(self, attempt: Dict[str, Any]) -> None:
+        """Count a collection attempt refused by the geo-fence"""
+        await self._apply([_bucket_update(bucket, {"geo_rejected": 1}) for bucket in bucket_keys(attempt)])
+
+    async def _apply(self, operations: List[UpdateOne]) -> None:
+        if not operations:
+            return
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Analytics must never fail a write; rebuild() recomputes from source
+            print(f"⚠️  Rollup update failed: {e}")
+
+    async def query(self, dimension: str, period: str = "day", start: Optional[str] = None,
+                    end: Optional[str] = None, key: Optional[str] = None, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Buckets for one dimension within [start, end] (bucket names, e.g.
+        2026-10-01 for days or 2026-10 for months), plus totals per key.
+        """
+        if dimension not in DIMENSIONS:
+            raise RollupQueryError(f"Unknown dimension '{dimension}'. Use one of: {', '.join(DIMENSIONS)}")
+        if period not in PERIODS:
+            raise RollupQueryError(f"Unknown period '{period}'. Use one of: {', '.join(PERIODS)}")
+        for bound in (start, end):
+            if bound is not None:
+                try:
+                    datetime.strptime(bound, PERIODS[period])
+                except ValueError:
+                    raise RollupQueryError(f"'{bound}' is not a {period} bucket ({PERIODS[period]})")
+
+        query: Dict[str, Any] = {"period": period, "dimension": dimension}
+        if start or end:
+            query["bucket"] = {}
+            if start:
+                query["bucket"]["$gte"] = start
+            if end:
+                query["bucket"]["$lte"] = end
+        if key is not None:
+            query["key"] = key
+
+        buckets = await self.collection.find(query, {"_id": 0}).sort([("bucket", 1), ("key", 1)]).to_list(limit)
+
+        totals: Dict[str, Dict[str, Any]] = {}
+        for bucket in buckets:
+            bucket.setdefault("count", 0)
+            bucket.setdefault("quantity_kg", 0.0)
+            bucket.setdefault("grades", {})
+            bucket.setdefault("geo_rejected", 0)
+            bucket["quantity_kg"] = round(bucket["quantity_kg"], 3)
+            bucket["geo_rejection_rate"] = _rejection_rate(bucket)
+
+            total = totals.setdefault(bucket["key"], {"count": 0, "quantity_kg": 0.0, "grades": {}, "geo_rejected": 0})
+            total["count"] += bucket["count"]
+            total["quantity_kg"] += bucket["quantity_kg"]
+            total["geo_rejected"] += bucket["geo_rejected"]
+            for grade, n in bucket["grades"].items():
+                total["grades"][grade] = total["grades"].get(grade, 0) + n
+
+        for total in totals.values():
+            total["quantity_kg"] = round(total["quantity_kg"], 3)
+            total["geo_rejection_rate"] = _rejection_rate(total)
+
+        return {
+            "dimension": dimension,
+            "period": period,
+            "range": {"start": start, "end": end},
+            "buckets": buckets,
+            "totals": totals,
+            "truncated": len(buckets) == limit
+        }
+
+    async def rebuild(self, batch_size: int = 1000) -> int:
+        """
+        Recompute collection buckets from collection_events (e.g. for history
+        recorded before rollups existed). Geo-rejection counts are kept, since
+        rejected attempts are not stored anywhere else. Only events stored
+        before the rebuild started are scanned; later ones are counted live.
+        """
+        await self.collection.update_many({}, {"$unset": {"count": "", "quantity_kg": "", "grades": ""}})
+        newest = await self.source.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if newest is None:
+            return 0
+        processed = 0
+        batch: List[Dict[str, Any]] = []
+        projection = {"_id": 0, "timestamp": 1, "collected_at": 1, "quantity_kg": 1, "quality_grade": 1, "state": 1, "district": 1,
+                      "region": 1, "species_name": 1, "species": 1, "collector_id": 1, "device_id": 1}
+        async for event in self.source.find({"_id": {"$lte": newest["_id"]}}, projection):
+            batch.append(event)
+            if len(batch) >= batch_size:
+                await self.record_collection(batch)
+                processed += len(batch)
+                batch = []
+        if batch:
+            await self.record_collection(batch)
+            processed += len(batch)
+        return processed
+
+    async def recorded_count(self) -> int:
+        """Collection events counted in the rollups (the monthly totals)"""
+        months = await self.collection.find({"period": "month", "dimension": "all"}, {"count": 1}).to_list(None)
+        return sum(month.get("count", 0) for month in months)
+
+    async def claim_backfill(self, stale_after: float = 3600) -> bool:
+        """
+        Insert the backfill marker. False once a backfill has completed, or
+        while another worker runs one that started less than `stale_after`
+        seconds ago.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            result = await self.collection.update_one(
+                {"_id": BACKFILL_MARKER_ID, "completed_at": {"$exists": False},
+                 "started_at": {"$lt": now - timedelta(seconds=stale_after)}},
+                {"$set": {"started_at": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return bool(result.modified_count or result.upserted_id is not None)
+
+    async def backfill(self) -> Optional[int]:
+        """
+        Rebuild once, if the rollups do not account for every stored event.
+        Returns the events processed, or None if this worker did not rebuild.
+        """
+        if not await self.claim_backfill():
+            return None
+        processed = None
+        if await self.recorded_count() != await self.source.estimated_document_count():
+            processed = await self.rebuild()
+        await self.collection.update_one({"_id": BACKFILL_MARKER_ID},
+                                         {"$set": {"completed_at": datetime.now(timezone.utc), "processed": processed}})
+        return processed
+
+
+def _rejection_rate(bucket: Dict[str, Any]) -> float:
+    attempts = bucket["count"] + bucket["geo_rejected"]
+    return round(bucket["geo_rejected"] / attempts, 4) if attempts else 0.0
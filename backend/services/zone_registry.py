@@ -0,0 +1,241 @@
+"""
+HerBlock Zone Registry
+One versioned source for geo-fence validation, /api/zones and the chaincode config
+
+data/zones.json (plus, optionally, a GeoJSON polygon file) is read and
+compiled once into an immutable snapshot: the validation zones, the
+GeofenceEngine arrays (centre radians, cosines, bounding boxes), the polygon
+grid index and the pre-encoded /api/zones responses. Requests read the
+current snapshot. A reload compiles a new snapshot from disk and swaps it
+in, so zone changes apply without a restart, and a broken file never
+replaces a working one.
+
+Each snapshot carries an ETag (version plus content digest) so clients can
+cache zone listings and revalidate with If-None-Match.
+
+PATENT PENDING - Indian Patent Office
+
+Copyright (c) 2026 HerBlock India
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+from services.geofence import GeofenceEngine, PolygonZones, PolygonZoneError
+
+BBOX_KEYS = ("minLat", "maxLat", "minLng", "maxLng")
+
+
+class ZoneRegistryError(ValueError):
+    """Raised for an unreadable or malformed zone file"""
+
+
+def _number(value: Any, field: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ZoneRegistryError(f"{field} must be a number")
+    return value
+
+
+def _compile_zone(species: str, zone: Dict[str, Any]) -> Dict[str, Any]:
+    """Validation zone in the shape validate_gps_geofence and GeofenceEngine read"""
+    try:
+        center_lat, center_lon = zone["center"]
+        bbox = {key: _number(zone["bounding_box"][key], f"{species}.bounding_box.{key}") for key in BBOX_KEYS}
+        radius = _number(zone["max_radius_km"], f"{species}.max_radius_km")
+    except (KeyError, TypeError, ValueError) as e:
+        if isinstance(e, ZoneRegistryError):
+            raise
+        raise ZoneRegistryError(f"{species}: zone needs center [lat, lon], max_radius_km and bounding_box ({e})")
+    if bbox["minLat"] > bbox["maxLat"] or bbox["minLng"] > bbox["maxLng"]:
+        raise ZoneRegistryError(f"{species}: bounding box minimum exceeds maximum")
+    return {
+        "center": (_number(center_lat, f"{species}.center"), _number(center_lon, f"{species}.center")),
+        "max_radius_km": radius,
+        "bounding_box": bbox,
+        "bbox": tuple(bbox[key] for key in BBOX_KEYS)
+    }
+
+
+def _compile_regions(species: str, regions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    compiled = []
+    for region in regions:
+        try:
+            compiled.append({
+                "name": str(region["name"]),
+                "lat": _number(region["lat"], f"{species}.regions.lat"),
+                "lon": _number(region["lon"], f"{species}.regions.lon"),
+                "radius_km": _number(region["radius_km"], f"{species}.regions.radius_km")
+            })
+        except (KeyError, TypeError) as e:
+            raise ZoneRegistryError(f"{species}: region needs name, lat, lon and radius_km ({e})")
+    return compiled
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class ZoneSnapshot:
+    """Everything compiled from one version of the zone files"""
+
+    def __init__(self, document: Dict[str, Any], digest: str, polygons: Optional[PolygonZones],
+                 exact_distance: Callable[[float, float, float, float], float]):
+        if not isinstance(document, dict) or "version" not in document or not isinstance(document.get("species"), dict):
+            raise ZoneRegistryError("Zone file needs a version and a species object")
+        self.version = str(document["version"])
+        self.digest = digest
+        self.etag = f'"{self.version}-{digest[:16]}"'
+        self.polygons = polygons
+        self.loaded_at = time.time()
+
+        self.zones: Dict[str, Dict[str, Any]] = {}
+        self.regions: Dict[str, List[Dict[str, Any]]] = {}
+        for species, entry in document["species"].items():
+            if not isinstance(entry, dict):
+                raise ZoneRegistryError(f"{species}: entry must be an object")
+            if "zone" in entry:
+                self.zones[species] = _compile_zone(species, entry["zone"])
+            if entry.get("regions"):
+                self.regions[species] = _compile_regions(species, entry["regions"])
+
+        self.engine = GeofenceEngine(self.zones, exact_distance, polygons)
+
+        # Responses are encoded once per snapshot, not per request
+        self.listings = {species: _encode(self.listing(species)) for species in self.known_species()}
+        self.catalog = _encode({
+            "version": self.version,
+            "species": {species: self.listing(species) for species in self.known_species()}
+        })
+        self.chaincode = _encode(self.chaincode_config())
+
+    def known_species(self) -> List[str]:
+        names = set(self.regions) | set(self.zones)
+        if self.polygons is not None:
+            names |= set(self.polygons.by_species)
+        return sorted(names)
+
+    def listing(self, species: str, geometry: bool = False) -> Dict[str, Any]:
+        """/api/zones/{species} payload"""
+        if self.polygons is not None and self.polygons.covers(species):
+            return {"species": species, "zones": self.polygons.zones_for(species, geometry),
+                    "source": "polygons", "version": self.version}
+        if species not in self.regions:
+            return {"species": species, "zones": [], "message": "No specific zones defined", "version": self.version}
+        return {"species": species, "zones": self.regions[species], "version": self.version}
+
+    def listing_body(self, species: str, geometry: bool = False) -> bytes:
+        if not geometry and species in self.listings:
+            return self.listings[species]
+        return _encode(self.listing(species, geometry))
+
+    def chaincode_config(self) -> Dict[str, Any]:
+        """Circle zones in the chaincode's field naming, so it can be seeded from this file"""
+        return {
+            "version": self.version,
+            "zones": {
+                species: {
+                    "centerLat": zone["center"][0],
+                    "centerLng": zone["center"][1],
+                    "maxRadiusKm": zone["max_radius_km"],
+                    "boundingBox": zone["bounding_box"]
+                }
+                for species, zone in self.zones.items()
+            }
+        }
+
+
+class ZoneRegistry:
+    """Holds the current ZoneSnapshot and reloads it when the files change"""
+
+    def __init__(self, path, exact_distance: Callable[[float, float, float, float], float],
+                 polygon_path=None, polygon_cell_degrees: float = 0.25, reload_interval: float = 30.0):
+        self.path = path
+        self.polygon_path = polygon_path
+        self.polygon_cell_degrees = polygon_cell_degrees
+        self.exact_distance = exact_distance
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._task: Optional[asyncio.Task] = None
+        # Fail at startup on a broken file rather than validate against nothing
+        self._stamp = self._file_stamp()
+        self.current: ZoneSnapshot = self.compile()
+
+    def _paths(self) -> List[Any]:
+        return [self.path] + ([self.polygon_path] if self.polygon_path else [])
+
+    def _file_stamp(self) -> tuple:
+        try:
+            return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in self._paths())
+        except OSError as e:
+            raise ZoneRegistryError(f"Zone file missing: {e}")
+
+    def compile(self) -> ZoneSnapshot:
+        """Read and compile the zone files into a new snapshot"""
+        digest = hashlib.sha256()
+        documents = []
+        for path in self._paths():
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                documents.append(json.loads(raw))
+            except (OSError, ValueError) as e:
+                raise ZoneRegistryError(f"Cannot read zone file {path}: {e}")
+            digest.update(raw)
+
+        polygons = None
+        if self.polygon_path:
+            try:
+                polygons = PolygonZones.from_document(documents[1], self.polygon_cell_degrees,
+                                                      source=str(self.polygon_path))
+            except PolygonZoneError as e:
+                raise ZoneRegistryError(str(e))
+        return ZoneSnapshot(documents[0], digest.hexdigest(), polygons, self.exact_distance)
+
+    def reload(self, force: bool = False) -> bool:
+        """Swap in a new snapshot if the files changed; raises ZoneRegistryError and keeps the old one"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp and not force:
+            return False
+        snapshot = self.compile()
+        self._stamp = stamp
+        if snapshot.digest == self.current.digest:
+            return False
+        self.current = snapshot
+        self.reloads += 1
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                # Compiling a large polygon file must not stall the event loop
+                if await asyncio.to_thread(self.reload):
+                    print(f"🔄 Zone registry reloaded: version {self.current.version}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Zone registry reload failed, keeping version {self.current.version}: {e}")
+
+    def start(self) -> None:
+        if self.reload_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def describe(self) -> Dict[str, Any]:
+        snapshot = self.current
+        return {
+            "version": snapshot.version,
+            "etag": snapshot.etag,
+            "species": snapshot.known_species(),
+            "validation_zones": len(snapshot.zones),
+            "polygons": len(snapshot.polygons.polygons) if snapshot.polygons is not None else 0,
+            "reloads": self.reloads
+        }
@@ -0,0 +1,41 @@
+"""
+Test setup: run from backend/ (pip install -r requirement.txt, then python -m pytest -q tests)
+
+server.py reads MONGO_URL/DB_NAME at import; tests that need it swap
+server.db for an in-memory mongomock-motor database. Tests that need the
+real query planner run only when HERBLOCK_TEST_MONGO_URL points at a server.
+"""
+
+import os
+import sys
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "herblock_test")
+
+
+@pytest.fixture
+def mock_db():
+    """Fresh in-memory database"""
+    return AsyncMongoMockClient()["herblock_test"]
+
+
+@pytest.fixture
+def server_db(mock_db, monkeypatch):
+    """server.py, and the services it built at import, with their db swapped for mock_db"""
+    import server
+    monkeypatch.setattr(server, "db", mock_db)
+    monkeypatch.setattr(server.dashboard_stats, "db", mock_db)
+    monkeypatch.setattr(server.rollup_engine, "collection", mock_db.rollups)
+    monkeypatch.setattr(server.rollup_engine, "source", mock_db.collection_events)
+    monkeypatch.setattr(server.device_registry, "collection", mock_db.devices)
+    monkeypatch.setattr(server.live_events, "collection", mock_db.live_events)
+    monkeypatch.setattr(server.idempotency_store, "collection", mock_db.idempotency_keys)
+    monkeypatch.setattr(server.blockchain_outbox, "collection", mock_db.outbox)
+    return mock_db
@@ -0,0 +1,123 @@
+"""Photo blob stores (services/blob_store.py): off-loop disk I/O and duplicate uploads"""
+
+import asyncio
+import hashlib
+import os
+import threading
+
+import pytest
+from gridfs.errors import FileExists
+
+from services import blob_store
+from services.blob_store import BlobDigestMismatch, GridFSBlobStore, LocalBlobStore, iterate_bytes
+
+PHOTO = os.urandom(3 * blob_store.CHUNK_SIZE + 17)
+PHOTO_SHA256 = hashlib.sha256(PHOTO).hexdigest()
+
+
+async def read_all(store, sha256: str) -> bytes:
+    return b"".join([chunk async for chunk in store.read(sha256)])
+
+
+def test_local_round_trip_and_dedup(tmp_path):
+    store = LocalBlobStore(str(tmp_path), max_bytes=len(PHOTO))
+
+    async def scenario():
+        first = await store.put(iterate_bytes(PHOTO), PHOTO_SHA256)
+        second = await store.put(iterate_bytes(PHOTO))
+        return first, second, await store.exists(PHOTO_SHA256), await read_all(store, PHOTO_SHA256)
+
+    first, second, exists, stored = asyncio.run(scenario())
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert exists and stored == PHOTO
+    # No spool files left behind
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".upload-")]
+
+
+def test_local_mismatch_leaves_nothing(tmp_path):
+    store = LocalBlobStore(str(tmp_path), max_bytes=len(PHOTO))
+    with pytest.raises(BlobDigestMismatch):
+        asyncio.run(store.put(iterate_bytes(PHOTO), "0" * 64))
+    assert os.listdir(tmp_path) == []
+
+
+def test_local_disk_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path), max_bytes=len(PHOTO))
+    io_threads = set()
+    fdopen, replace = os.fdopen, os.replace
+
+    class RecordingFile:
+        def __init__(self, file):
+            self._file = file
+
+        def write(self, data):
+            io_threads.add(threading.current_thread())
+            return self._file.write(data)
+
+        def __getattr__(self, name):
+            return getattr(self._file, name)
+
+    def recording_replace(*args):
+        io_threads.add(threading.current_thread())
+        return replace(*args)
+
+    monkeypatch.setattr(blob_store.os, "fdopen", lambda *args: RecordingFile(fdopen(*args)))
+    monkeypatch.setattr(blob_store.os, "replace", recording_replace)
+
+    async def scenario():
+        await store.put(iterate_bytes(PHOTO))
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+    assert io_threads and loop_thread not in io_threads
+
+
+def test_concurrent_local_uploads_store_once(tmp_path):
+    store = LocalBlobStore(str(tmp_path), max_bytes=len(PHOTO))
+
+    async def scenario():
+        return await asyncio.gather(*(store.put(iterate_bytes(PHOTO)) for _ in range(8)))
+
+    results = asyncio.run(scenario())
+    assert sum(not result["deduplicated"] for result in results) >= 1
+    assert {result["sha256"] for result in results} == {PHOTO_SHA256}
+
+
+class FakeBucket:
+    """Loses the unique filename index race on every upload"""
+
+    def __init__(self):
+        self.file_ids = []
+
+    async def upload_from_stream_with_id(self, file_id, filename, source):
+        self.file_ids.append(file_id)
+        source.read()
+        raise FileExists(f"file {filename} already exists")
+
+
+class FakeCollection:
+    def __init__(self):
+        self.deleted = []
+
+    async def find_one(self, *args):
+        return None  # the winner had not finished when we checked
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+
+
+def test_gridfs_duplicate_upload_drops_its_chunks(tmp_path):
+    store = object.__new__(GridFSBlobStore)
+    store.bucket, store.files, store.chunks = FakeBucket(), FakeCollection(), FakeCollection()
+    store.max_bytes, store.spool_dir = len(PHOTO), str(tmp_path)
+
+    result = asyncio.run(store.put(iterate_bytes(PHOTO)))
+    assert result == {"sha256": PHOTO_SHA256, "size": len(PHOTO), "deduplicated": True}
+    assert store.chunks.deleted == [{"files_id": store.bucket.file_ids[0]}]
+    assert os.listdir(tmp_path) == []
+
+
+def test_gridfs_filename_index_is_unique():
+    from services.index_manager import INDEXES
+    assert any(spec.collection == "blobs.files" and spec.keys == [("filename", 1)] and spec.options.get("unique")
+               for spec in INDEXES)
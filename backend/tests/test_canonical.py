@@ -0,0 +1,125 @@
+"""Tests for services/canonical.py: the orjson fast path must match the stdlib encoding byte for byte"""
+
+import dataclasses
+import enum
+import hashlib
+import json
+import math
+import random
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from pydantic import BaseModel
+
+from services import canonical
+
+pytestmark = pytest.mark.skipif(canonical.orjson is None, reason="orjson not installed")
+
+
+class Grade(enum.Enum):
+    A = "A"
+
+
+@dataclasses.dataclass
+class Reading:
+    sensor: str
+    value: float
+
+
+class Sample(BaseModel):
+    id: str
+    moisture: float
+    tested_at: datetime
+
+
+def reference_bytes(value, monkeypatch) -> bytes:
+    """canonical_bytes with orjson disabled: the stdlib encoder every hash is defined by"""
+    with monkeypatch.context() as patched:
+        patched.setattr(canonical, "orjson", None)
+        return canonical.canonical_bytes(value)
+
+
+def reference_hash(value, monkeypatch) -> str:
+    with monkeypatch.context() as patched:
+        patched.setattr(canonical, "orjson", None)
+        return canonical.canonical_hash(value)
+
+
+EDGE_FLOATS = [
+    0.0, -0.0, 1.0, 12.5, 0.1, 1 / 3, 1e-4, 9.99e-5, 1e-5, 1.5e-7, 5e-324, 123456.789,
+    1e15, 9999999999999998.0, 1e16, 1.5e16, 1e22, 1.7976931348623157e308, -2.5e-9,
+    float("nan"), float("inf"), float("-inf"),
+]
+
+EDGE_VALUES = [
+    {"float": value} for value in EDGE_FLOATS
+] + [
+    [value, {"nested": [value]}] for value in EDGE_FLOATS
+] + [
+    {"int": 2 ** 63 - 1}, {"big_int": 2 ** 64}, {"negative": -(2 ** 70)},
+    {"text": "अश्वगंधा चूर्ण", "emoji": "🌿", "escapes": 'quote " backslash \\ newline \n tab \t  '},
+    {"control": "\x00\x1f\x7f"},
+    {"naive": datetime(2026, 1, 15, 9, 30, 0, 123456), "aware": datetime(2026, 1, 15, 15, 0, tzinfo=timezone(timedelta(hours=5, minutes=30)))},
+    {"date": date(2026, 1, 15), "uuid": uuid.UUID(int=7), "enum": Grade.A, "bytes": b"\x00\xff"},
+    {"set": {"b", "a", "c"}, "frozenset": frozenset({3, 1, 2}), "tuple": (1, "x")},
+    {"dataclass": Reading("moisture", 11.5), "model": Sample(id="QT-1", moisture=9.75, tested_at=datetime(2026, 1, 1))},
+    {"z": 1, "a": {"y": [], "b": {}}, "m": None, "t": True, "f": False},
+    {1: "non-string key"},
+    [],
+    "plain string",
+]
+
+
+@pytest.mark.parametrize("value", EDGE_VALUES, ids=repr)
+def test_fast_path_matches_stdlib_on_edge_cases(value, monkeypatch):
+    assert canonical.canonical_bytes(value) == reference_bytes(value, monkeypatch)
+    assert canonical.canonical_hash(value) == reference_hash(value, monkeypatch)
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kinds = ["float", "int", "str", "bool", "none", "datetime"] + (["dict", "list"] if depth < 3 else [])
+    kind = rng.choice(kinds)
+    if kind == "float":
+        return rng.choice([rng.uniform(-1e3, 1e3), rng.uniform(-1, 1) * 10 ** rng.randint(-12, 25), rng.random()])
+    if kind == "int":
+        return rng.randint(-(2 ** 70), 2 ** 70) if rng.random() < 0.1 else rng.randint(-10 ** 6, 10 ** 6)
+    if kind == "str":
+        return "".join(rng.choice('abcअशगं"\\\n🌿 ') for _ in range(rng.randint(0, 12)))
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "none":
+        return None
+    if kind == "datetime":
+        return datetime(2026, 1, 1) + timedelta(microseconds=rng.randint(0, 10 ** 13))
+    if kind == "dict":
+        return {f"k{rng.randint(0, 50)}": random_value(rng, depth + 1) for _ in range(rng.randint(0, 6))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 6))]
+
+
+def test_fast_path_matches_stdlib_on_random_documents(monkeypatch):
+    rng = random.Random(13)
+    for _ in range(2000):
+        document = {"id": "DOC", "payload": random_value(rng)}
+        assert canonical.canonical_bytes(document) == reference_bytes(document, monkeypatch), document
+
+
+def test_encoding_rules():
+    assert canonical.canonical_bytes({"b": 1, "a": [1.5, None]}) == b'{"a":[1.5,null],"b":1}'
+    assert canonical.canonical_bytes({"name": "तुलसी"}) == '{"name":"तुलसी"}'.encode("utf-8")
+    assert canonical.canonical_bytes({"x": float("nan")}) == b'{"x":null}'
+    # A naive datetime is UTC; Mongo keeps milliseconds, so microseconds are dropped
+    naive = datetime(2026, 1, 15, 9, 30, 0, 123999)
+    aware = datetime(2026, 1, 15, 15, 0, 0, 123000, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    assert canonical.canonical_bytes(naive) == canonical.canonical_bytes(aware) == b'"2026-01-15T09:30:00.123Z"'
+
+
+def test_hash_is_sha256_of_the_canonical_bytes():
+    document = {"id": "COLL-1", "quantity_kg": 12.5, "when": datetime(2026, 1, 1)}
+    assert canonical.canonical_hash(document) == hashlib.sha256(canonical.canonical_bytes(document)).hexdigest()
+    assert canonical.canonical_hash(document) == canonical.canonical_hash(dict(reversed(list(document.items()))))
+
+
+def test_non_finite_floats_hash_as_null(monkeypatch):
+    assert reference_bytes({"x": [math.inf]}, monkeypatch) == b'{"x":[null]}'
+    assert json.loads(canonical.canonical_bytes({"x": [math.inf, 1]})) == {"x": [None, 1]}
@@ -0,0 +1,111 @@
+"""Concurrency stress test for create_blockchain_transaction (chain_heads sequencing)"""
+
+import asyncio
+import random
+
+import pytest
+
+from services.index_manager import INDEXES, ensure_indexes
+
+
+def assert_linear_chain(transactions):
+    """Block indexes 0..n-1 with no gaps or forks, each linked to its predecessor's hash"""
+    transactions = sorted(transactions, key=lambda tx: tx["block_index"])
+    assert [tx["block_index"] for tx in transactions] == list(range(len(transactions)))
+    previous_hash = "0"
+    for tx in transactions:
+        assert tx["previous_hash"] == previous_hash, f"fork at block {tx['block_index']}"
+        previous_hash = tx["data_hash"]
+
+
+class InterleavingCollection:
+    """
+    Collection proxy that yields to the event loop a random number of times
+    around every operation. mongomock runs operations synchronously, so
+    without this concurrent writers would never interleave as they do over a
+    real driver.
+    """
+
+    def __init__(self, collection, rng: random.Random):
+        self._collection = collection
+        self._rng = rng
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        async def interleaved(*args, **kwargs):
+            for _ in range(self._rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            result = await attribute(*args, **kwargs)
+            for _ in range(self._rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            return result
+        return interleaved
+
+
+class InterleavingDatabase:
+    def __init__(self, db, seed: int = 8):
+        self._db = db
+        self._rng = random.Random(seed)
+
+    def __getitem__(self, name):
+        return InterleavingCollection(self._db[name], self._rng)
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def chain_db(mock_db, monkeypatch):
+    import server
+    interleaving = InterleavingDatabase(mock_db)
+    monkeypatch.setattr(server, "db", interleaving)
+    monkeypatch.setattr(server.dashboard_stats, "db", interleaving)
+    asyncio.run(ensure_indexes(mock_db, [spec for spec in INDEXES if spec.collection == "blockchain_transactions"]))
+    return mock_db
+
+
+@pytest.mark.parametrize("writers", [2, 50, 200])
+def test_concurrent_appends_build_one_chain(chain_db, writers):
+    import server
+
+    async def scenario():
+        # All writers race on a product with no chain head yet, so the seed races too
+        await asyncio.gather(*[
+            server.create_blockchain_transaction("BATCH-1", "collection", {"event": i})
+            for i in range(writers)
+        ])
+        return await chain_db.blockchain_transactions.find({"product_id": "BATCH-1"}).to_list(None)
+
+    transactions = asyncio.run(scenario())
+    assert len(transactions) == writers
+    assert_linear_chain(transactions)
+
+
+def test_concurrent_appends_across_products_and_existing_history(chain_db):
+    import server
+
+    async def scenario():
+        # Existing history written before chain_heads existed: the head is seeded from it
+        for i in range(3):
+            await server.create_blockchain_transaction("BATCH-OLD", "collection", {"event": f"old-{i}"})
+        await chain_db.chain_heads.delete_many({})
+
+        await asyncio.gather(*[
+            server.create_blockchain_transaction(product, "processing", {"event": i, "product": product})
+            for i in range(100)
+            for product in ("BATCH-OLD", "BATCH-A", "BATCH-B")
+        ])
+        return {
+            product: await chain_db.blockchain_transactions.find({"product_id": product}).to_list(None)
+            for product in ("BATCH-OLD", "BATCH-A", "BATCH-B")
+        }
+
+    chains = asyncio.run(scenario())
+    assert len(chains["BATCH-OLD"]) == 103
+    for transactions in chains.values():
+        assert_linear_chain(transactions)
+    stats = asyncio.run(chain_db.stats.find_one({}))
+    assert stats["total_blockchain_transactions"] == 303
@@ -0,0 +1,117 @@
+"""Circuit breaker (services/circuit_breaker.py) and the hang guard in CLIFabricBackend"""
+
+import asyncio
+import os
+import stat
+import time
+
+import pytest
+
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from services.fabric_backends import CLIFabricBackend, FabricTimeoutError
+from services.fabric_service import HerBlockFabricService
+
+
+def test_trips_after_threshold_consecutive_failures():
+    async def probe():
+        return False
+
+    async def scenario():
+        breaker = CircuitBreaker(probe, failure_threshold=3, probe_interval=60)
+        breaker.record_failure(ConnectionError("peer down"))
+        breaker.record_failure(ConnectionError("peer down"))
+        breaker.record_success()  # a success resets the run
+        for _ in range(2):
+            breaker.record_failure(ConnectionError("peer down"))
+        states = [breaker.state]
+        breaker.record_failure(ConnectionError("peer down"))
+        states.append(breaker.state)
+        with pytest.raises(CircuitOpenError):
+            breaker.check()
+        await breaker.close()
+        return breaker, states
+
+    breaker, states = asyncio.run(scenario())
+    assert states == [CLOSED, OPEN]
+    assert breaker.trips == 1 and breaker.short_circuited == 1
+
+
+def test_half_open_probe_closes_the_breaker():
+    probes = []
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def probe():
+            probes.append(breaker.state)
+            if len(probes) < 3:
+                return False
+            done.set()
+            return True
+
+        breaker = CircuitBreaker(probe, failure_threshold=1, probe_interval=0.01)
+        breaker.record_failure(ConnectionError("peer down"))
+        await asyncio.wait_for(done.wait(), timeout=2)
+        breaker.check()  # closed again: calls go through
+        await breaker.close()
+        return breaker
+
+    breaker = asyncio.run(scenario())
+    # Every probe runs half-open; failed probes re-open the breaker
+    assert probes == [HALF_OPEN] * 3
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+
+def test_chaincode_errors_do_not_trip_the_breaker():
+    service = HerBlockFabricService()
+    service.breaker.failure_threshold = 1
+
+    async def rejected(function, args):
+        raise Exception("status:500 message:INVALID LOCATION")
+
+    service.backend.query = rejected
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(Exception, match="INVALID LOCATION"):
+                await service._run_query("getCollection", ["COLL-1"])
+
+    asyncio.run(scenario())
+    assert service.breaker.state == CLOSED and service.breaker.trips == 0
+
+
+def hung_peer(tmp_path) -> CLIFabricBackend:
+    """CLI backend whose `peer` binary never answers"""
+    peer = tmp_path / "peer"
+    peer.write_text("#!/bin/sh\nexec sleep 30\n")
+    peer.chmod(peer.stat().st_mode | stat.S_IEXEC)
+    env = {**os.environ, "PATH": f"{tmp_path}:{os.environ.get('PATH', '')}"}
+    return CLIFabricBackend(env, str(tmp_path), "herblock", "herblock", "", "", "", timeout=0.2)
+
+
+def test_hung_peer_is_killed(tmp_path):
+    backend = hung_peer(tmp_path)
+    started = time.monotonic()
+    with pytest.raises(FabricTimeoutError):
+        asyncio.run(backend.query("getCollection", ["COLL-1"]))
+    assert time.monotonic() - started < 5
+
+
+def test_hangs_trip_the_breaker_and_free_scheduler_slots(tmp_path):
+    service = HerBlockFabricService()
+    service.backend = hung_peer(tmp_path)
+    service.breaker.failure_threshold = 2
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(Exception, match="timed out"):
+                await service._run_query("getCollection", ["COLL-1"])
+        try:
+            with pytest.raises(CircuitOpenError):
+                await service._run_query("getCollection", ["COLL-1"])
+        finally:
+            await service.breaker.close()
+
+    asyncio.run(scenario())
+    assert service.breaker.trips == 1
+    assert service.scheduler.running == {"query": 0, "invoke": 0}
@@ -0,0 +1,78 @@
+"""DashboardStats reconciliation (services/dashboard_stats.py): one leader, drift applied as deltas"""
+
+import asyncio
+from datetime import datetime
+
+from services.dashboard_stats import STATS_ID, DashboardStats
+
+
+class WriteDuringCount:
+    """Database proxy that stores and records a product right after `products` is counted"""
+
+    def __init__(self, db):
+        self._db = db
+        self.recorder = None
+
+    def __getitem__(self, name):
+        collection = self._db[name]
+        if name != "products":
+            return collection
+        owner = self
+
+        class Products:
+            async def estimated_document_count(self):
+                count = await collection.estimated_document_count()
+                doc = {"id": "PROD-LATE"}
+                await collection.insert_one(doc)
+                await owner.recorder.record("products", [doc])
+                return count
+
+            def __getattr__(self, attribute):
+                return getattr(collection, attribute)
+        return Products()
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def test_reconcile_repairs_drift(mock_db):
+    stats = DashboardStats(mock_db)
+
+    async def scenario():
+        await mock_db.products.insert_many([{"id": f"P{i}"} for i in range(3)])
+        await mock_db.stats.insert_one({"_id": STATS_ID, "total_products": 10, "total_collections": 2})
+        await stats.reconcile()
+        return await mock_db.stats.find_one({"_id": STATS_ID})
+
+    counters = asyncio.run(scenario())
+    assert counters["total_products"] == 3 and counters["total_collections"] == 0
+    assert counters.get("total_quality_tests", 0) == 0 and counters["reconciled_at"]
+
+
+def test_reconcile_keeps_increments_made_while_counting(mock_db):
+    proxy = WriteDuringCount(mock_db)
+    proxy.recorder = stats = DashboardStats(proxy)
+
+    async def scenario():
+        await mock_db.products.insert_many([{"id": f"P{i}"} for i in range(3)])
+        await mock_db.stats.insert_one({"_id": STATS_ID, "total_products": 3})
+        await stats.reconcile()
+        return await mock_db.stats.find_one({"_id": STATS_ID}), await mock_db.products.count_documents({})
+
+    counters, products = asyncio.run(scenario())
+    assert products == 4
+    assert counters["total_products"] == 4
+
+
+def test_only_one_worker_reconciles_per_interval(mock_db):
+    workers = [DashboardStats(mock_db, reconcile_interval=600) for _ in range(4)]
+
+    async def scenario():
+        first = [await worker.claim_reconcile() for worker in workers]
+        # Expire the lease
+        await mock_db.stats.update_one({"_id": "dashboard_reconcile"}, {"$set": {"lease_until": datetime(2000, 1, 1)}})
+        return first, await workers[1].claim_reconcile()
+
+    first, after_expiry = asyncio.run(scenario())
+    assert first == [True, False, False, False]
+    assert after_expiry
@@ -0,0 +1,54 @@
+"""DeviceRegistry (services/device_registry.py): per-client miss budgets"""
+
+import asyncio
+import uuid
+
+from services.device_registry import DeviceRegistry
+
+
+def new_key() -> str:
+    return f"hb-device-{uuid.uuid4().hex}"
+
+
+def test_guessing_client_does_not_starve_a_new_device(mock_db):
+    registry = DeviceRegistry(mock_db, misses_per_second=5)
+
+    async def scenario():
+        await registry.load()
+        # A flood of random keys from one address uses up that address's budget
+        flood = [await registry.authenticate(new_key(), "203.0.113.9") for _ in range(50)]
+        # Meanwhile another worker registers a device
+        key = new_key()
+        await mock_db.devices.insert_one({"device_id": "hb-7", "api_key": key, "active": True})
+        return flood, await registry.authenticate(key, "198.51.100.4")
+
+    flood, device = asyncio.run(scenario())
+    assert not any(flood)
+    assert device is not None and device["device_id"] == "hb-7"
+    assert registry.db_lookups == 6 and registry.throttled == 45
+    assert registry.describe()["throttled_clients"] == 1
+
+
+def test_flooding_client_is_throttled(mock_db):
+    registry = DeviceRegistry(mock_db, misses_per_second=5)
+
+    async def scenario():
+        key = new_key()
+        await mock_db.devices.insert_one({"device_id": "hb-8", "api_key": key, "active": True})
+        for _ in range(10):
+            await registry.authenticate(new_key(), "203.0.113.9")
+        return await registry.authenticate(key, "203.0.113.9")
+
+    # Same address as the flood: answered from the cache alone until its budget refills
+    assert asyncio.run(scenario()) is None
+
+
+def test_client_table_is_bounded(mock_db):
+    registry = DeviceRegistry(mock_db, client_capacity=3)
+
+    async def scenario():
+        for i in range(10):
+            await registry.authenticate(new_key(), f"10.0.0.{i}")
+
+    asyncio.run(scenario())
+    assert list(registry._miss_budgets) == ["10.0.0.7", "10.0.0.8", "10.0.0.9"]
@@ -0,0 +1,139 @@
+"""EventBus change-stream sourcing (services/event_bus.py): restarts, resume tokens and resets"""
+
+import asyncio
+from types import SimpleNamespace
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from services.event_bus import SOURCE_MONGO, EventBus
+
+
+def change(n: int) -> dict:
+    return {
+        "_id": {"_data": f"token-{n}"},
+        "clusterTime": SimpleNamespace(time=1_700_000_000, inc=n),
+        "fullDocument": {"type": "intake.accepted", "data": {"n": n}},
+    }
+
+
+class FakeStream:
+    """Yields its changes, then raises `error` (or waits forever if there is none)"""
+
+    def __init__(self, changes, error=None):
+        self.changes = list(changes)
+        self.error = error
+        self.resume_token = None
+        self.closed = False
+
+    async def try_next(self):
+        return self._next() if self.changes else None
+
+    def _next(self):
+        item = self.changes.pop(0)
+        self.resume_token = item["_id"]
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.changes:
+            return self._next()
+        if self.error is not None:
+            raise self.error
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.opened = []
+
+    def watch(self, pipeline, resume_after=None):
+        self.opened.append(resume_after)
+        return self.streams.pop(0)
+
+
+def bus_with(streams) -> tuple:
+    collection = FakeCollection(streams)
+    bus = EventBus(SimpleNamespace(live_events=collection), source=SOURCE_MONGO, restart_backoff=0)
+    return bus, collection
+
+
+async def drain(bus: EventBus, subscription, count: int) -> list:
+    events = []
+    while len(events) < count:
+        event = await bus.next_event(subscription, timeout=1)
+        assert event is not None, f"only {len(events)} of {count} events arrived"
+        events.append(event)
+    return events
+
+
+def test_failed_stream_resumes_after_its_last_token():
+    first = FakeStream([change(1), change(2)], error=AutoReconnect("primary stepped down"))
+    second = FakeStream([change(3)])
+    bus, collection = bus_with([first, second])
+
+    async def scenario():
+        subscription = bus.subscribe()
+        await bus.start()
+        events = await drain(bus, subscription, 3)
+        await bus.stop()
+        return events
+
+    events = asyncio.run(scenario())
+    assert [event["data"]["n"] for event in events] == [1, 2, 3]
+    assert collection.opened == [None, {"_data": "token-2"}]
+    assert first.closed and bus.stream_restarts == 1
+
+
+def test_lost_history_resets_subscribers_and_restarts_from_now():
+    lost = OperationFailure("resume point no longer in the oplog", code=286)
+    first = FakeStream([change(1)], error=lost)
+    second = FakeStream([change(2)])
+    bus, collection = bus_with([first, second])
+
+    async def scenario():
+        subscription = bus.subscribe(types={"intake.accepted", "reset"})
+        await bus.start()
+        events = await drain(bus, subscription, 3)
+        await bus.stop()
+        return events
+
+    events = asyncio.run(scenario())
+    assert [event["type"] for event in events] == ["intake.accepted", "reset", "intake.accepted"]
+    assert events[1]["data"] == {"reason": "stream_restarted"}
+    assert events[0]["id"] < events[1]["id"] < events[2]["id"]
+    assert collection.opened == [None, None]
+    # A client resuming from before the reset is told to reload as well
+    replay = bus.subscribe(last_event_id=events[0]["id"])
+    assert replay.queue.get_nowait()["type"] == "reset"
+
+
+def test_repeated_failures_back_off():
+    failures = [FakeStream([], error=AutoReconnect("no primary")) for _ in range(4)]
+    bus, collection = bus_with(failures + [FakeStream([change(1)])])
+    bus.restart_backoff, bus.max_restart_backoff = 0.01, 0.02
+    sleeps = []
+
+    async def scenario():
+        sleep = asyncio.sleep
+
+        async def recording_sleep(delay):
+            sleeps.append(delay)
+            await sleep(0)
+
+        asyncio.sleep = recording_sleep
+        try:
+            subscription = bus.subscribe()
+            await bus.start()
+            await drain(bus, subscription, 1)
+        finally:
+            asyncio.sleep = sleep
+            await bus.stop()
+
+    asyncio.run(scenario())
+    assert sleeps[:4] == [0.01, 0.02, 0.02, 0.02]
@@ -0,0 +1,130 @@
+"""InvokeBatcher (services/fabric_batcher.py): coalesced record writes"""
+
+import asyncio
+import json
+
+import pytest
+
+from services.fabric_batcher import InvokeBatcher
+
+
+class FakeChaincode:
+    """Answers batch calls per record; `batch_error` fails the whole batch call"""
+
+    def __init__(self, batch_error=None):
+        self.calls = []
+        self.batch_error = batch_error
+
+    async def invoke(self, function, args):
+        self.calls.append((function, args))
+        if function.endswith("Batch"):
+            if self.batch_error is not None:
+                raise Exception(self.batch_error)
+            return {"results": [{"id": r["id"], "success": True, "result": {"stored": r["id"]}}
+                                for r in json.loads(args[0])]}
+        return {"stored": args[0]}
+
+
+async def submit_all(batcher: InvokeBatcher, ids):
+    return await asyncio.gather(*(batcher.submit("recordCollection", record_id, "{}") for record_id in ids),
+                                return_exceptions=True)
+
+
+def test_record_error_does_not_disable_batching():
+    # A chaincode rejection that happens to say "does not exist"
+    chaincode = FakeChaincode(batch_error="Blockchain invoke error: status:500 message:product BATCH-9 does not exist")
+    batcher = InvokeBatcher(chaincode.invoke, window_ms=5)
+
+    async def scenario():
+        first = await submit_all(batcher, ["COLL-1", "COLL-2"])
+        chaincode.batch_error = None
+        return first, await submit_all(batcher, ["COLL-3", "COLL-4"])
+
+    first, second = asyncio.run(scenario())
+    assert all("does not exist" in str(result) for result in first)
+    assert second == [{"stored": "COLL-3"}, {"stored": "COLL-4"}]
+    assert [function for function, _ in chaincode.calls] == ["recordCollectionsBatch"] * 2
+    assert batcher.stats["single_invokes"] == 0
+
+
+def test_missing_batch_function_falls_back_to_single_invokes():
+    chaincode = FakeChaincode(batch_error="Function recordCollectionsBatch not found in contract HerBlockContract")
+    batcher = InvokeBatcher(chaincode.invoke, window_ms=5)
+
+    async def scenario():
+        first = await submit_all(batcher, ["COLL-1", "COLL-2"])
+        return first, await submit_all(batcher, ["COLL-3"])
+
+    first, later = asyncio.run(scenario())
+    assert first == [{"stored": "COLL-1"}, {"stored": "COLL-2"}] and later == [{"stored": "COLL-3"}]
+    # One batch attempt, then single invokes only
+    assert [function for function, _ in chaincode.calls] == ["recordCollectionsBatch"] + ["recordCollection"] * 3
+
+
+def test_malformed_batch_response_fails_callers():
+    async def invoke(function, args):
+        return None
+
+    batcher = InvokeBatcher(invoke, window_ms=5)
+
+    async def scenario():
+        results = await submit_all(batcher, ["COLL-1", "COLL-2"])
+        await asyncio.sleep(0)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, AttributeError) for result in results)
+    assert not batcher._tasks
+
+
+@pytest.mark.parametrize("message", [
+    "Function recordCollectionsBatch not found in contract HerBlockContract",
+    "You've asked to invoke a function that does not exist: recordCollectionsBatch",
+])
+def test_missing_function_messages(message):
+    assert InvokeBatcher._is_missing_function("recordCollectionsBatch", Exception(message))
+    assert not InvokeBatcher._is_missing_function("recordCollectionsBatch", Exception("collection COLL-1 not found"))
+
+
+def test_batch_results_map_back_to_each_record():
+    calls = []
+
+    async def invoke(function, args):
+        calls.append(function)
+        records = json.loads(args[0])
+        # Answered out of order, one record refused, one missing from the reply
+        results = [{"id": r["id"], "success": True, "result": {"stored": r["id"]}} for r in reversed(records[:2])]
+        results.append({"id": records[2]["id"], "success": False, "error": "INVALID LOCATION"})
+        return {"results": results}
+
+    batcher = InvokeBatcher(invoke, window_ms=5)
+    results = asyncio.run(submit_all(batcher, ["COLL-1", "COLL-2", "COLL-3", "COLL-4"]))
+    assert results[:2] == [{"stored": "COLL-1"}, {"stored": "COLL-2"}]
+    assert str(results[2]) == "INVALID LOCATION"
+    assert "No result for COLL-4" in str(results[3])
+    assert calls == ["recordCollectionsBatch"]
+    assert batcher.stats["batches"] == 1 and batcher.stats["batched_records"] == 4
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    chaincode = FakeChaincode()
+    batcher = InvokeBatcher(chaincode.invoke, window_ms=60_000, max_batch_size=3)
+
+    async def scenario():
+        return await asyncio.wait_for(submit_all(batcher, ["COLL-1", "COLL-2", "COLL-3"]), timeout=2)
+
+    assert asyncio.run(scenario()) == [{"stored": "COLL-1"}, {"stored": "COLL-2"}, {"stored": "COLL-3"}]
+    assert len(json.loads(chaincode.calls[0][1][0])) == 3
+
+
+def test_lone_record_and_unbatched_functions_use_single_invokes():
+    chaincode = FakeChaincode()
+    batcher = InvokeBatcher(chaincode.invoke, window_ms=5)
+
+    async def scenario():
+        lone = await batcher.submit("recordCollection", "COLL-1", "{}")
+        other = await batcher.submit("updateStatus", "COLL-1", "{}")
+        return lone, other
+
+    assert asyncio.run(scenario()) == ({"stored": "COLL-1"}, {"stored": "COLL-1"})
+    assert [function for function, _ in chaincode.calls] == ["recordCollection", "updateStatus"]
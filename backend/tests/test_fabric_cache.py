@@ -0,0 +1,98 @@
+"""Query cache (services/fabric_cache.py) as used by HerBlockFabricService"""
+
+import asyncio
+import json
+
+from services.fabric_backends import FabricBackend
+from services.fabric_cache import QueryCache
+from services.fabric_service import HerBlockFabricService
+
+
+class FakeLedger(FabricBackend):
+    """In-memory chaincode: queries read `state`, invokes write it"""
+
+    name = "fake"
+
+    def __init__(self):
+        self.height = 10
+        self.state = {"COLL-1": {"id": "COLL-1", "quantity_kg": "5"}}
+        self.queries = 0
+
+    async def query(self, function, args):
+        self.queries += 1
+        return dict(self.state.get(args[0], {}))
+
+    async def invoke(self, function, args):
+        record_id, payload = args
+        self.state[record_id] = {"id": record_id, **json.loads(payload)}
+        return {"success": True}
+
+    async def block_height(self):
+        return self.height
+
+
+def cached_service() -> tuple:
+    service = HerBlockFabricService()
+    service.backend = ledger = FakeLedger()
+    service.query_cache = QueryCache(max_entries=16, ttl_seconds=60)
+    service.height_check_interval = 0
+    service.batcher.max_batch_size = 1
+    return service, ledger
+
+
+def test_new_block_flushes_cached_queries():
+    service, ledger = cached_service()
+
+    async def scenario():
+        first = await service.get_collection("COLL-1")
+        await service.get_collection("COLL-1")
+        # Another node commits a change
+        ledger.state["COLL-1"]["quantity_kg"] = "7"
+        ledger.height += 1
+        return first, await service.get_collection("COLL-1")
+
+    first, after_block = asyncio.run(scenario())
+    assert first["quantity_kg"] == "5" and after_block["quantity_kg"] == "7"
+    assert ledger.queries == 2
+    assert service.query_cache.stats["height_resets"] == 1
+
+
+def test_own_invoke_invalidates_the_records_it_touches():
+    service, ledger = cached_service()
+
+    async def scenario():
+        await service.get_collection("COLL-1")
+        await service.get_history("BATCH-9")
+        await service.get_history("BATCH-2")
+        # Same block height: only our own write can tell the cache
+        await service.record_collection({"id": "COLL-1", "product_id": "BATCH-9", "quantity_kg": 9})
+        return await service.get_collection("COLL-1")
+
+    refreshed = asyncio.run(scenario())
+    assert refreshed["quantity_kg"] == "9"
+    cache = service.query_cache
+    assert cache.get("getHistory", ["BATCH-2"])[0]
+    assert not cache.get("getHistory", ["BATCH-9"])[0]
+    assert ledger.queries == 4
+
+
+def test_cached_results_are_private_copies():
+    cache = QueryCache(max_entries=4, ttl_seconds=60)
+    cache.set("getCollection", ["COLL-1"], {"id": "COLL-1"})
+    cache.get("getCollection", ["COLL-1"])[1]["blockchain_verified"] = True
+    assert cache.get("getCollection", ["COLL-1"])[1] == {"id": "COLL-1"}
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    from services import fabric_cache
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    for key in ("A", "B"):
+        cache.set("getCollection", [key], key)
+    cache.get("getCollection", ["A"])
+    cache.set("getCollection", ["C"], "C")
+    assert not cache.get("getCollection", ["B"])[0]
+    assert cache.get("getCollection", ["A"]) == (True, "A")
+
+    now = fabric_cache.time.monotonic()
+    monkeypatch.setattr(fabric_cache.time, "monotonic", lambda: now + 61)
+    assert not cache.get("getCollection", ["A"])[0]
@@ -0,0 +1,110 @@
+"""Tests for services/fabric_decoder.py"""
+
+import json
+
+import pytest
+
+from services.fabric_decoder import (
+    ProposalResponseError, decode_invoke_output, decode_invoke_result, decode_payload, unescape_text
+)
+
+
+def proto_text_escape(data: bytes) -> str:
+    """Escape bytes the way the peer CLI prints a protobuf bytes field"""
+    out = []
+    for byte in data:
+        char = chr(byte)
+        if char == '"':
+            out.append('\\"')
+        elif char == "\\":
+            out.append("\\\\")
+        elif char == "\n":
+            out.append("\\n")
+        elif 0x20 <= byte < 0x7f:
+            out.append(char)
+        else:
+            out.append("\\%03o" % byte)
+    return "".join(out)
+
+
+def invoke_output(payload: bytes, status: int = 200, message: str = "") -> str:
+    fields = f"status:{status}"
+    if message:
+        fields += f' message:"{proto_text_escape(message.encode())}"'
+    if payload:
+        fields += f' payload:"{proto_text_escape(payload)}"'
+    return ("2026-10-18 12:00:00.000 UTC 0001 INFO [chaincodeCmd] chaincodeInvokeOrQuery -> "
+            f"Chaincode invoke successful. result: {fields}\n")
+
+
+def test_octal_escaped_utf8_survives():
+    record = {"id": "PROD-1", "name": "अश्वगंधा चूर्ण", "origin": "Mysuru"}
+    output = invoke_output(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+    assert "\\340" in output  # the CLI really escapes every non-ASCII byte in octal
+
+    response = decode_invoke_output(output)
+    assert response.status == 200
+    assert response.json() == record
+
+
+def test_nested_payload_with_escaped_quotes_and_backslashes():
+    record = {
+        "id": "COLL-9",
+        "gps": {"lat": 12.97, "lon": 77.59},
+        "tests": [{"name": "moisture", "notes": 'said "dry"\nline two'}, {"path": "C:\\lab\\r1"}],
+        "empty": {}
+    }
+    response = decode_invoke_output(invoke_output(json.dumps(record).encode()))
+    assert response.json() == record
+
+
+@pytest.mark.parametrize("status", [400, 404, 500])
+def test_error_status_raises(status):
+    output = invoke_output(b"", status=status, message='asset "COLL-1" already exists')
+    with pytest.raises(ProposalResponseError) as raised:
+        decode_invoke_output(output)
+    assert raised.value.status == status
+    assert raised.value.message == 'asset "COLL-1" already exists'
+
+
+def test_output_without_response_line():
+    assert decode_invoke_output("Error: endorsement failure during invoke") is None
+
+
+def test_status_only_response():
+    response = decode_invoke_output(invoke_output(b""))
+    assert response.ok and response.payload == b"" and response.json() is None
+
+
+def test_decode_payload_variants():
+    assert decode_payload(None) is None
+    assert decode_payload(b"") is None
+    assert decode_payload(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    assert decode_payload("not json") == {"raw": "not json"}
+
+
+def test_unescape_hex_and_plain():
+    assert unescape_text("plain") == b"plain"
+    assert unescape_text("\\x41\\101\\\\") == b"AA\\"
+
+
+@pytest.mark.parametrize("record", [
+    {"id": "COLL-1", "species": "Tulsi", "quantity_kg": 12.5},
+    {"id": "PROD-1", "name": "अश्वगंधा चूर्ण"},
+    {"id": "QT-1", "notes": 'said "dry"\nline two', "path": "C:\\lab\\r1", "tests": [{"k": 1}]},
+])
+def test_fast_result_matches_the_full_decoder(record):
+    output = invoke_output(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+    assert decode_invoke_result(output) == decode_invoke_output(output).json() == record
+    # Without the trailing newline, and with a log line after the response
+    assert decode_invoke_result(output.rstrip("\n")) == record
+    assert decode_invoke_result(output + "2026-10-18 12:00:01.000 UTC 0002 INFO [main] done\n") == record
+
+
+def test_fast_result_falls_back_for_other_responses():
+    assert decode_invoke_result(invoke_output(b"")) is None
+    assert decode_invoke_result("Error: endorsement failure during invoke") is None
+    assert decode_invoke_result(invoke_output(b'{"ok": true}', status=201)) == {"ok": True}
+    assert decode_invoke_result(invoke_output(b"plain text")) == {"raw": "plain text"}
+    with pytest.raises(ProposalResponseError):
+        decode_invoke_result(invoke_output(b"", status=500, message="INVALID LOCATION"))
@@ -0,0 +1,84 @@
+"""FabricScheduler (services/fabric_scheduler.py): admission order and backpressure"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.fabric_scheduler import INVOKE, QUERY, FabricOverloadedError, FabricScheduler
+
+
+def test_queued_queries_are_admitted_before_queued_invokes():
+    scheduler = FabricScheduler(max_queries=4, max_invokes=4, max_total=1)
+    admitted = []
+
+    async def call(kind, name):
+        async with scheduler.slot(kind):
+            admitted.append(name)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await scheduler.acquire(INVOKE)
+        # Invokes queued first, then a query
+        waiting = [asyncio.ensure_future(call(INVOKE, "invoke-1")), asyncio.ensure_future(call(INVOKE, "invoke-2")),
+                   asyncio.ensure_future(call(QUERY, "query-1"))]
+        await asyncio.sleep(0)
+        assert scheduler.metrics()["waiting"] == {QUERY: 1, INVOKE: 2}
+        scheduler.release(INVOKE)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(scenario())
+    assert admitted == ["query-1", "invoke-1", "invoke-2"]
+    assert scheduler.running == {QUERY: 0, INVOKE: 0}
+
+
+def test_per_kind_limit_leaves_room_for_the_other_kind():
+    scheduler = FabricScheduler(max_queries=4, max_invokes=1, max_total=4)
+
+    async def scenario():
+        await scheduler.acquire(INVOKE)
+        queued = asyncio.ensure_future(scheduler.acquire(INVOKE))
+        await asyncio.sleep(0)
+        # The invoke limit is reached, but queries still start straight away
+        await asyncio.wait_for(scheduler.acquire(QUERY), timeout=1)
+        assert not queued.done()
+        scheduler.release(INVOKE)
+        await asyncio.wait_for(queued, timeout=1)
+
+    asyncio.run(scenario())
+    assert scheduler.running == {QUERY: 1, INVOKE: 1}
+
+
+def test_full_queue_is_rejected():
+    scheduler = FabricScheduler(max_queries=1, max_invokes=1, max_total=1, max_queue=1)
+
+    async def scenario():
+        await scheduler.acquire(QUERY)
+        queued = asyncio.ensure_future(scheduler.acquire(QUERY))
+        await asyncio.sleep(0)
+        with pytest.raises(FabricOverloadedError) as overloaded:
+            await scheduler.acquire(INVOKE)
+        queued.cancel()
+        return overloaded.value
+
+    error = asyncio.run(scenario())
+    assert error.to_dict()["error"] == "blockchain_overloaded"
+    assert scheduler.rejected == {QUERY: 0, INVOKE: 1}
+    # The cancelled waiter left the queue
+    assert scheduler.queue_depth == 0
+
+
+def test_full_queue_answers_503(monkeypatch):
+    import server
+    scheduler = FabricScheduler(max_queries=1, max_invokes=1, max_total=1, max_queue=0)
+    monkeypatch.setattr(server.fabric_service, "scheduler", scheduler)
+
+    async def scenario():
+        await scheduler.acquire(QUERY)
+        with pytest.raises(HTTPException) as unavailable:
+            await server.get_blockchain_history("COLL-1")
+        return unavailable.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503 and error.headers["Retry-After"] == "1"
+    assert error.detail["error"] == "blockchain_overloaded"
@@ -0,0 +1,54 @@
+"""Transport selection in HerBlockFabricService (gateway pool with peer CLI fallback)"""
+
+import asyncio
+import importlib
+
+from services.fabric_backends import BACKEND_CLI, BACKEND_GATEWAY, CLIFabricBackend, GatewayFabricBackend
+from services.fabric_service import HerBlockFabricService
+
+# services/__init__ re-exports the fabric_service instance under the module's name
+fabric_module = importlib.import_module("services.fabric_service")
+
+
+def gateway_service(monkeypatch, installed: bool = True) -> HerBlockFabricService:
+    monkeypatch.setenv("FABRIC_BACKEND", "gateway")
+    monkeypatch.setattr(fabric_module, "gateway_sdk_installed", lambda: installed)
+    return HerBlockFabricService()
+
+
+def test_cli_is_the_default(monkeypatch):
+    monkeypatch.delenv("FABRIC_BACKEND", raising=False)
+    assert isinstance(HerBlockFabricService().backend, CLIFabricBackend)
+
+
+def test_gateway_without_sdk_uses_cli(monkeypatch):
+    service = gateway_service(monkeypatch, installed=False)
+    assert service.backend.name == BACKEND_CLI
+
+
+def test_start_falls_back_to_cli_when_gateway_cannot_connect(monkeypatch):
+    service = gateway_service(monkeypatch)
+    assert isinstance(service.backend, GatewayFabricBackend)
+
+    def unreadable_msp(self):
+        raise FileNotFoundError("msp/signcerts")
+
+    monkeypatch.setattr(GatewayFabricBackend, "_load_admin", unreadable_msp)
+    asyncio.run(service.start())
+    assert service.backend.name == BACKEND_CLI
+    assert "msp/signcerts" in service.last_error
+
+
+def test_started_gateway_keeps_a_warm_pool(monkeypatch):
+    service = gateway_service(monkeypatch)
+    service.backend.pool_size = 3
+    monkeypatch.setattr(GatewayFabricBackend, "_load_admin", lambda self: "admin")
+    monkeypatch.setattr(GatewayFabricBackend, "_new_client", lambda self: object())
+
+    async def scenario():
+        await service.start()
+        await service.start()  # a second start reuses the pool
+        return service.backend.describe()
+
+    described = asyncio.run(scenario())
+    assert described == {"backend": BACKEND_GATEWAY, "pool_size": 3, "idle_connections": 3}
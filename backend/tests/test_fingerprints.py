@@ -0,0 +1,86 @@
+"""Write-time digital fingerprints (server.upsert_fingerprinted, insert_many_fingerprinted) survive the Mongo round trip"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+def collection_event(server, record_id: str, product_id: str = "BATCH-1") -> dict:
+    """A collection event as the API stores it: microsecond datetimes, aware and naive, some nested"""
+    event = server.CollectionEvent(
+        id=record_id, product_id=product_id, collector_id="COL-7", collector_name="Field Unit 7",
+        species_name="Ashwagandha", latitude=23.25, longitude=77.41, location_name="Bhopal",
+        harvest_date=datetime(2026, 3, 1, 6, 30, 15, 123456, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        quantity_kg=12.5, quality_grade="A", weather_conditions="dry"
+    ).dict()
+    event["collected_at"] = datetime(2026, 3, 1, 1, 0, 15, 999999)
+    event["readings"] = [{"at": datetime(2026, 3, 1, 1, 0, 16, 1), "moisture": 8.4}]
+    return event
+
+
+def recomputed(server, stored: dict) -> str:
+    return server.calculate_hash({k: v for k, v in stored.items() if k not in server.FINGERPRINT_EXCLUDED_FIELDS})
+
+
+def assert_fingerprint_survives(server, written: dict, stored: dict) -> None:
+    # The round trip did drop the microseconds...
+    assert stored["collected_at"] != written["collected_at"]
+    assert stored["collected_at"].microsecond == 999000
+    # ...and the fingerprint taken before it still matches the stored document
+    assert stored["digital_fingerprint"] == written["digital_fingerprint"] == recomputed(server, stored)
+    assert stored["fingerprint_algorithm"] == "SHA-256"
+
+
+def test_upsert_fingerprint_matches_the_stored_document(server_db):
+    import server
+
+    async def scenario():
+        written = collection_event(server, "COLL-1")
+        await server.upsert_fingerprinted(server_db.collection_events, written, "BATCH-1")
+        return written, await server_db.collection_events.find_one({"id": "COLL-1"})
+
+    written, stored = asyncio.run(scenario())
+    assert_fingerprint_survives(server, written, stored)
+    assert "aggregates_pending" not in stored
+
+
+def test_bulk_insert_fingerprints_match_the_stored_documents(server_db):
+    import server
+
+    async def scenario():
+        written = [collection_event(server, f"COLL-{i}") for i in range(3)]
+        errors = await server.insert_many_fingerprinted(server_db.collection_events, written, ["BATCH-1"] * 3)
+        stored = await server_db.collection_events.find({}).sort("id", 1).to_list(10)
+        return errors, written, stored
+
+    errors, written, stored = asyncio.run(scenario())
+    assert errors == {} and len(stored) == 3
+    for doc, stored_doc in zip(written, stored):
+        assert_fingerprint_survives(server, doc, stored_doc)
+
+
+def test_trace_returns_stored_fingerprints_without_hashing(server_db, monkeypatch):
+    import server
+
+    async def seed():
+        product = {"id": "PROD-1", "batch_id": "BATCH-1", "product_name": "Ashwagandha Churna",
+                   "manufacturing_date": datetime(2026, 3, 2, 9, 15, 0, 654321)}
+        await server.upsert_fingerprinted(server_db.products, product, "BATCH-1")
+        await server.insert_many_fingerprinted(
+            server_db.collection_events, [collection_event(server, f"COLL-{i}") for i in range(2)], ["BATCH-1"] * 2)
+        stored = [await server_db.products.find_one({"id": "PROD-1"}),
+                  *await server_db.collection_events.find({}).sort("id", 1).to_list(10)]
+        return {doc["id"]: doc["digital_fingerprint"] for doc in stored}
+
+    stored = asyncio.run(seed())
+
+    def no_hashing(data):
+        pytest.fail("/trace recomputed a fingerprint that was stored at write time")
+
+    monkeypatch.setattr(server, "calculate_hash", no_hashing)
+    trace = asyncio.run(server.trace_product("PROD-1"))
+    returned = {doc["id"]: doc["digital_fingerprint"] for doc in [trace["product"], *trace["collection_events"]]}
+    assert returned == stored
+    tree = asyncio.run(server_db.merkle_trees.find_one({"_id": "BATCH-1"}))
+    assert trace["digital_fingerprints"]["master_fingerprint"] == tree["root"]
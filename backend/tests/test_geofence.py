@@ -0,0 +1,192 @@
+"""GeofenceEngine (services/geofence.py) must give the scalar validate_gps_geofence results exactly"""
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from services.geofence import VECTORISE_MIN_POINTS
+from services.zone_registry import ZoneRegistry
+
+
+@pytest.fixture(scope="module")
+def server():
+    import server
+    return server
+
+
+@pytest.fixture
+def polygon_registry(server, monkeypatch):
+    """The registry with data/geofence_zones.geojson loaded, as GEOFENCE_POLYGONS would"""
+    registry = ZoneRegistry(server.ROOT_DIR / "data" / "zones.json", server.calculate_haversine_distance,
+                            polygon_path=server.ROOT_DIR / "data" / "geofence_zones.geojson", reload_interval=0)
+    monkeypatch.setattr(server, "zone_registry", registry)
+    return registry
+
+
+def sample_points(snapshot, count: int, seed: int = 23):
+    """Points in, near and far outside every zone, plus species with no zone"""
+    rng = random.Random(seed)
+    species = list(snapshot.zones) + ["Unlisted Herb"]
+    if snapshot.polygons is not None:
+        species += sorted(snapshot.polygons.by_species)
+    latitudes, longitudes, names = [], [], []
+    for _ in range(count):
+        name = rng.choice(species)
+        zone = snapshot.zones.get(name)
+        if zone is not None and rng.random() < 0.8:
+            min_lat, max_lat, min_lng, max_lng = zone["bbox"]
+            lat = rng.uniform(min_lat - 1, max_lat + 1)
+            lon = rng.uniform(min_lng - 1, max_lng + 1)
+        else:
+            lat, lon = rng.uniform(6, 37), rng.uniform(68, 98)
+        latitudes.append(round(lat, rng.choice([2, 4, 6])))
+        longitudes.append(round(lon, rng.choice([2, 4, 6])))
+        names.append(name)
+    return latitudes, longitudes, names
+
+
+@pytest.mark.parametrize("size", [1, 20, VECTORISE_MIN_POINTS - 1, VECTORISE_MIN_POINTS, 20000])
+def test_validate_many_matches_scalar_path(server, size):
+    snapshot = server.zone_registry.current
+    latitudes, longitudes, names = sample_points(snapshot, size, seed=size)
+    bulk = snapshot.engine.validate_many(latitudes, longitudes, names)
+    scalar = [server.validate_gps_geofence(lat, lon, name) for lat, lon, name in zip(latitudes, longitudes, names)]
+    assert bulk == scalar
+    if size == 20000:
+        methods = {result["method"] for result in bulk}
+        assert {"bounding_box", "haversine", "no_zone_defined"} <= methods
+        assert any(result["valid"] for result in bulk) and not all(result["valid"] for result in bulk)
+
+
+def test_validate_many_matches_scalar_path_with_polygons(server, polygon_registry):
+    snapshot = polygon_registry.current
+    assert snapshot.polygons is not None and snapshot.polygons.by_species
+    latitudes, longitudes, names = sample_points(snapshot, 5000, seed=29)
+    bulk = snapshot.engine.validate_many(latitudes, longitudes, names)
+    scalar = [server.validate_gps_geofence(lat, lon, name) for lat, lon, name in zip(latitudes, longitudes, names)]
+    assert bulk == scalar
+    assert "polygon" in {result["method"] for result in bulk}
+
+
+def test_distance_matrix_matches_scalar_haversine(server):
+    engine = server.zone_registry.current.engine
+    latitudes, longitudes, _ = sample_points(server.zone_registry.current, 500, seed=31)
+    matrix = engine.distance_matrix(latitudes, longitudes)
+    for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+        for j, species in enumerate(engine.species):
+            center_lat, center_lon = engine.zones[species]["center"]
+            assert matrix[i, j] == server.calculate_haversine_distance(lat, lon, center_lat, center_lon)
+
+
+def rounding_boundary_latitude(distance, center_lat: float, center_lon: float, lon: float) -> float:
+    """A latitude whose distance to the centre is within 1e-9 km of an x.xx5 rounding step"""
+    low, high = center_lat + 0.5, center_lat + 2.0
+    target = math.floor(distance(low, lon, center_lat, center_lon) * 100) / 100 + 0.005
+    for _ in range(200):
+        middle = (low + high) / 2
+        km = 6371 * 2 * math.asin(math.sqrt(
+            math.sin(math.radians(center_lat - middle) / 2) ** 2 +
+            math.cos(math.radians(middle)) * math.cos(math.radians(center_lat)) *
+            math.sin(math.radians(center_lon - lon) / 2) ** 2
+        ))
+        low, high = (middle, high) if km < target else (low, middle)
+    return low
+
+
+def test_rounding_boundary_uses_the_scalar_distance(server):
+    snapshot = server.zone_registry.current
+    species, zone = next(iter(snapshot.zones.items()))
+    center_lat, center_lon = zone["center"]
+    lat = rounding_boundary_latitude(server.calculate_haversine_distance, center_lat, center_lon, center_lon)
+
+    calls = []
+
+    def exact(*args):
+        calls.append(args)
+        return server.calculate_haversine_distance(*args)
+
+    from services.geofence import GeofenceEngine
+    engine = GeofenceEngine(snapshot.zones, exact)
+    distances = engine.distance_matrix([lat], [center_lon])
+    assert calls, "boundary distance was not recomputed with the scalar haversine"
+    assert distances[0, engine.index[species]] == server.calculate_haversine_distance(lat, center_lon, center_lat, center_lon)
+
+
+def test_contains_agrees_with_validation(server):
+    engine = server.zone_registry.current.engine
+    latitudes, longitudes, _ = sample_points(server.zone_registry.current, 2000, seed=37)
+    contains = engine.contains(latitudes, longitudes)
+    for j, species in enumerate(engine.species):
+        expected = [server.validate_gps_geofence(lat, lon, species)["valid"] for lat, lon in zip(latitudes, longitudes)]
+        assert contains[:, j].tolist() == expected
+
+
+def test_empty_batch():
+    from services.geofence import GeofenceEngine
+    engine = GeofenceEngine({}, lambda *args: 0.0)
+    assert engine.validate_many([], [], []) == []
+    assert engine.distance_matrix(np.array([1.0]), np.array([2.0])).shape == (1, 0)
+
+
+def square(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> list:
+    return [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+
+
+def polygon_feature(geometry_type: str, coordinates: list, name: str = "test zone") -> dict:
+    return {
+        "type": "Feature",
+        "properties": {"species": "Brahmi", "name": name},
+        "geometry": {"type": geometry_type, "coordinates": coordinates}
+    }
+
+
+def test_point_in_a_hole_is_outside():
+    from services.geofence import PolygonZones
+    zones = PolygonZones([polygon_feature("Polygon", [square(76.0, 22.0, 78.0, 24.0), square(76.8, 22.8, 77.2, 23.2)])])
+    assert zones.validate(23.0, 77.0, "Brahmi")["valid"] is False
+    assert zones.validate(22.5, 76.5, "Brahmi") == {"valid": True, "method": "polygon", "zone": "test zone"}
+
+
+def test_multipolygon_parts_are_all_covered():
+    from services.geofence import PolygonZones
+    zones = PolygonZones([polygon_feature("MultiPolygon", [
+        [square(76.0, 22.0, 76.5, 22.5)],
+        [square(80.0, 25.0, 80.5, 25.5), square(80.2, 25.2, 80.3, 25.3)]
+    ], name="two districts")])
+    assert zones.validate(22.25, 76.25, "Brahmi")["zone"] == "two districts"
+    assert zones.validate(25.1, 80.1, "Brahmi")["zone"] == "two districts"
+    # Between the parts, and in the second part's hole
+    assert zones.validate(24.0, 78.0, "Brahmi")["valid"] is False
+    assert zones.validate(25.25, 80.25, "Brahmi")["valid"] is False
+    assert [zone["name"] for zone in zones.zones_for("Brahmi")] == ["two districts"] * 2
+
+
+def test_points_on_grid_cell_boundaries():
+    from services.geofence import PolygonZones
+    # Spans several 0.25 degree cells; its bbox also ends exactly on a cell line
+    zones = PolygonZones([polygon_feature("Polygon", [[[76.9, 22.9], [77.5, 22.9], [77.5, 23.5], [76.9, 22.9]]])],
+                         cell_degrees=0.25)
+    for lat, lon in [(23.0, 77.25), (23.25, 77.4), (22.95, 77.0), (23.25, 77.5 - 1e-9)]:
+        assert zones.validate(lat, lon, "Brahmi")["valid"], (lat, lon)
+    # In a cell the bbox overlaps, but above the diagonal edge
+    assert zones.validate(23.25, 77.0, "Brahmi")["valid"] is False
+
+
+def test_unclosed_ring_in_the_file_is_closed(tmp_path):
+    import json
+    from services.geofence import PolygonZoneError, PolygonZones
+    closed = square(76.0, 22.0, 78.0, 24.0)
+    path = tmp_path / "zones.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection",
+                                "features": [polygon_feature("Polygon", [closed[:-1]])]}))
+    zones = PolygonZones.from_file(path)
+    assert np.array_equal(zones.polygons[0]["rings"][0], np.asarray(closed))
+    assert zones.validate(23.0, 77.0, "Brahmi")["valid"]
+    assert zones.validate(23.0, 78.5, "Brahmi")["valid"] is False
+
+    path.write_text(json.dumps({"type": "FeatureCollection",
+                                "features": [polygon_feature("Polygon", [closed[:2]])]}))
+    with pytest.raises(PolygonZoneError, match="Feature 0"):
+        PolygonZones.from_file(path)
@@ -0,0 +1,115 @@
+"""Idempotency-Key middleware (server.honor_idempotency_key, services/idempotency.py)"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+
+@pytest.fixture
+def app(server_db):
+    """A small app behind the real middleware; each route counts how often it ran"""
+    import server
+    app = FastAPI()
+    app.middleware("http")(server.honor_idempotency_key)
+    app.state.runs = {"record": 0, "flaky": 0}
+
+    @app.post("/record")
+    async def record(payload: dict):
+        app.state.runs["record"] += 1
+        return {"run": app.state.runs["record"], "payload": payload}
+
+    @app.post("/flaky")
+    async def flaky():
+        app.state.runs["flaky"] += 1
+        if app.state.runs["flaky"] == 1:
+            return JSONResponse(status_code=503, content={"detail": "overloaded"})
+        return {"run": app.state.runs["flaky"]}
+
+    @app.post("/session")
+    async def session():
+        response = JSONResponse(status_code=201, content={"tx_ref": "TX-1"}, headers={"Location": "/outbox/TX-1"})
+        response.set_cookie("session", "abc")
+        response.set_cookie("csrf", "xyz")
+        return response
+
+    return app
+
+
+async def post(app, path, body=None, key="key-1", address="10.0.0.1", **headers):
+    transport = httpx.ASGITransport(app=app, client=(address, 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await client.post(path, json=body or {}, headers={"Idempotency-Key": key, **headers})
+
+
+def test_retry_gets_the_stored_response(app):
+    async def scenario():
+        return [await post(app, "/record", {"id": "COLL-1"}) for _ in range(2)]
+
+    first, retry = asyncio.run(scenario())
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() == {"run": 1, "payload": {"id": "COLL-1"}}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert app.state.runs["record"] == 1
+
+
+def test_same_key_with_a_different_body_is_refused(app):
+    async def scenario():
+        await post(app, "/record", {"id": "COLL-1"})
+        return await post(app, "/record", {"id": "COLL-2"})
+
+    conflict = asyncio.run(scenario())
+    assert conflict.status_code == 422
+    assert app.state.runs["record"] == 1
+
+
+def test_server_error_releases_the_key(app):
+    async def scenario():
+        return [await post(app, "/flaky") for _ in range(3)]
+
+    overloaded, retried, replayed = asyncio.run(scenario())
+    assert overloaded.status_code == 503
+    assert retried.json() == replayed.json() == {"run": 2}
+    assert app.state.runs["flaky"] == 2
+
+
+def test_keys_are_scoped_per_credential(app):
+    async def scenario():
+        alice = await post(app, "/record", {"id": "COLL-1"}, authorization="Bearer alice")
+        bob = await post(app, "/record", {"id": "COLL-1"}, authorization="Bearer bob")
+        device = await post(app, "/record", {"id": "COLL-1"}, **{"X-Device-Key": "hb-device-1"})
+        return alice, bob, device
+
+    alice, bob, device = asyncio.run(scenario())
+    assert [r.json()["run"] for r in (alice, bob, device)] == [1, 2, 3]
+    assert not any("idempotent-replayed" in r.headers for r in (alice, bob, device))
+
+
+def test_unauthenticated_keys_are_scoped_per_client(app):
+    async def scenario():
+        first = await post(app, "/record", {"id": "COLL-1"}, address="10.0.0.1")
+        other_client = await post(app, "/record", {"id": "COLL-1"}, address="10.0.0.2")
+        retry = await post(app, "/record", {"id": "COLL-1"}, address="10.0.0.1")
+        return first, other_client, retry
+
+    first, other_client, retry = asyncio.run(scenario())
+    # The second client must not be handed the first client's response
+    assert other_client.json()["run"] == 2 and "idempotent-replayed" not in other_client.headers
+    assert retry.json() == first.json()
+
+
+def test_replay_keeps_the_original_headers(app):
+    async def scenario():
+        return [await post(app, "/session") for _ in range(2)]
+
+    first, replay = asyncio.run(scenario())
+    for response in (first, replay):
+        assert response.status_code == 201
+        assert response.headers["location"] == "/outbox/TX-1"
+        assert response.headers["content-type"] == "application/json"
+        # Both cookies, not one merged header
+        assert sorted(cookie.split(";")[0] for cookie in response.headers.get_list("set-cookie")) == ["csrf=xyz", "session=abc"]
+        assert response.headers["content-length"] == str(len(response.content))
+    assert replay.json() == first.json()
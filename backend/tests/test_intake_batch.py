@@ -0,0 +1,111 @@
+"""Device batch intake (server.hardware_intake_batch): retried flushes and reboots are not stored twice"""
+
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from services.index_manager import INDEXES, ensure_indexes
+
+DEVICE_KEY = "hb-device-00000000000000000000000000000001"
+
+
+def http_request(accept: str = "application/json") -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/api/intake/batch",
+                    "headers": [(b"accept", accept.encode())], "client": ("10.0.0.7", 4000)})
+
+
+def batch(server, seqs, boot_id="boot-1"):
+    return server.HardwareIntakeBatchRequest(device_id="INTAKE_HUB_01", boot_id=boot_id, readings=[
+        server.HardwareReading(seq=seq, herb_type="Ashwagandha", weight_grams=500 + seq, moisture_percent=11,
+                               latitude=13.0326, longitude=77.5354, collector_id="COL-001", quality_grade="A")
+        for seq in seqs
+    ])
+
+
+@pytest.fixture
+def intake_db(server_db, monkeypatch):
+    import server
+    monkeypatch.setenv("DEMO_MODE", "true")  # accept out of season
+
+    async def prepare():
+        await ensure_indexes(server_db, [spec for spec in INDEXES if spec.collection in ("collection_events", "blockchain_transactions")])
+        await server_db.devices.insert_one({"device_id": "INTAKE_HUB_01", "api_key": DEVICE_KEY, "active": True,
+                                            "location": "CMTI", "default_collector": "COL-001"})
+        await server.device_registry.load()
+
+    asyncio.run(prepare())
+    return server_db
+
+
+async def send(server, request, accept: str = "application/json"):
+    return await server.hardware_intake_batch(request, http_request(accept), x_device_key=DEVICE_KEY)
+
+
+def test_retried_flush_is_answered_from_the_original_records(intake_db):
+    import server
+
+    async def scenario():
+        first = await send(server, batch(server, [0, 1, 2]))
+        # The reply was lost; the device resends the buffer with one new reading
+        second = await send(server, batch(server, [0, 1, 2, 3]))
+        return first, second, await intake_db.collection_events.count_documents({}), \
+            await intake_db.blockchain_transactions.count_documents({})
+
+    first, second, events, transactions = asyncio.run(scenario())
+    assert first["accepted"] == 3 and events == 4 and transactions == 4
+    for original, replay in zip(first["results"], second["results"]):
+        assert replay["duplicate"] and replay["event_id"] == original["event_id"]
+        assert replay["batch_id"] == original["batch_id"] and replay["grade"] == "A"
+    assert second["accepted"] == 4 and "duplicate" not in second["results"][3]
+
+
+def test_sequence_numbers_restart_after_a_reboot(intake_db):
+    import server
+
+    async def scenario():
+        await send(server, batch(server, [0, 1], boot_id="boot-1"))
+        after_reboot = await send(server, batch(server, [0, 1], boot_id="boot-2"))
+        return after_reboot, await intake_db.collection_events.count_documents({})
+
+    after_reboot, events = asyncio.run(scenario())
+    assert events == 4
+    assert not any(r.get("duplicate") for r in after_reboot["results"])
+
+
+def test_repeated_seq_in_one_request_is_stored_once(intake_db):
+    import server
+
+    async def scenario():
+        response = await send(server, batch(server, [5, 5]), accept="text/plain")
+        return response.body.decode(), await intake_db.collection_events.find({}, {"device_seq": 1}).to_list(None)
+
+    body, events = asyncio.run(scenario())
+    assert [e["device_seq"] for e in events] == [5]
+    lines = body.splitlines()
+    assert lines[0] == "OK 2 0"
+    assert lines[1] == lines[2] and lines[1].startswith("5,A,")
+
+
+def test_unique_index_settles_a_concurrent_retry(intake_db, monkeypatch):
+    import server
+
+    async def scenario():
+        first = await send(server, batch(server, [0, 1]))
+        find_intake_originals = server.find_intake_originals
+        calls = []
+
+        async def lookup_before_first_stored(*args):
+            # The retry's lookup ran before the first request stored anything
+            calls.append(args)
+            return {} if len(calls) == 1 else await find_intake_originals(*args)
+
+        monkeypatch.setattr(server, "find_intake_originals", lookup_before_first_stored)
+        second = await send(server, batch(server, [0, 1]))
+        return first, second, await intake_db.collection_events.count_documents({})
+
+    first, second, events = asyncio.run(scenario())
+    assert events == 2
+    assert [r["event_id"] for r in second["results"]] == [r["event_id"] for r in first["results"]]
+    assert all(r["duplicate"] for r in second["results"])
+
@@ -0,0 +1,142 @@
+"""Incremental Merkle trees (server.append_merkle_leaf) under concurrency, crashes and contention"""
+
+import asyncio
+
+import pytest
+
+from services import merkle
+from services.index_manager import INDEXES, ensure_indexes
+from tests.test_chain_concurrency import InterleavingDatabase
+
+
+async def prepare(db):
+    await ensure_indexes(db, [spec for spec in INDEXES if spec.collection in ("merkle_nodes", "products")])
+
+
+async def stored_leaves(db, product_key: str) -> list:
+    leaves = await db.merkle_nodes.find({"product_key": product_key, "level": 0}).sort("index", 1).to_list(None)
+    return [leaf["hash"] for leaf in leaves]
+
+
+async def assert_complete_tree(server, db, product_key: str, fingerprints: list):
+    """Every fingerprint is a leaf exactly once, the root matches and every proof verifies"""
+    tree = await db.merkle_trees.find_one({"_id": product_key})
+    leaves = await stored_leaves(db, product_key)
+    assert sorted(leaves) == sorted(fingerprints)
+    assert tree["leaf_count"] == len(fingerprints) and not tree.get("backlog")
+    assert tree["root"] == merkle.merkle_root(leaves)
+    for index, leaf in enumerate(leaves):
+        await db.products.insert_one({"id": f"LEAF-{index}", "batch_id": product_key, "digital_fingerprint": leaf})
+        proof = (await server.get_trace_inclusion_proof(product_key, f"LEAF-{index}"))["proof"]
+        assert merkle.verify_proof(leaf, proof)
+
+
+@pytest.mark.parametrize("writers", [2, 40])
+def test_concurrent_appends_build_one_tree(server_db, monkeypatch, writers):
+    import server
+    monkeypatch.setattr(server, "db", InterleavingDatabase(server_db, seed=writers))
+    fingerprints = [f"{i:064x}" for i in range(writers)]
+
+    async def scenario():
+        await prepare(server_db)
+        await asyncio.gather(*(server.append_merkle_leaf("BATCH-1", fp) for fp in fingerprints))
+        monkeypatch.setattr(server, "db", server_db)
+        await assert_complete_tree(server, server_db, "BATCH-1", fingerprints)
+
+    asyncio.run(scenario())
+
+
+def test_nodes_survive_a_crash_after_the_claim(server_db, monkeypatch):
+    import server
+    fingerprints = [f"{i:064x}" for i in range(6)]
+    store_merkle_nodes = server.store_merkle_nodes
+
+    async def crash_once(product_key, nodes):
+        if not nodes:
+            return
+        monkeypatch.setattr(server, "store_merkle_nodes", store_merkle_nodes)
+        raise ConnectionError("worker died")
+
+    async def scenario():
+        await prepare(server_db)
+        for fp in fingerprints[:4]:
+            await server.append_merkle_leaf("BATCH-1", fp)
+        monkeypatch.setattr(server, "store_merkle_nodes", crash_once)
+        with pytest.raises(ConnectionError):
+            await server.append_merkle_leaf("BATCH-1", fingerprints[4])
+        tree = await server_db.merkle_trees.find_one({"_id": "BATCH-1"})
+        assert tree["leaf_count"] == 5 and tree["pending_nodes"]
+        # The proof for the crashed leaf is served from the pending nodes
+        await server_db.products.insert_one({"id": "CRASHED", "batch_id": "BATCH-1", "digital_fingerprint": fingerprints[4]})
+        proof = (await server.get_trace_inclusion_proof("BATCH-1", "CRASHED"))["proof"]
+        assert merkle.verify_proof(fingerprints[4], proof)
+        await server_db.products.delete_many({})
+
+        await server.append_merkle_leaf("BATCH-1", fingerprints[5])
+        assert "pending_nodes" not in await server_db.merkle_trees.find_one({"_id": "BATCH-1"})
+        await assert_complete_tree(server, server_db, "BATCH-1", fingerprints)
+
+    asyncio.run(scenario())
+
+
+def test_contended_leaf_is_queued_not_dropped(server_db, monkeypatch):
+    import server
+    fingerprints = [f"{i:064x}" for i in range(3)]
+
+    async def scenario():
+        await prepare(server_db)
+        await server.append_merkle_leaf("BATCH-1", fingerprints[0])
+        # No attempts left: the leaf loses every claim
+        monkeypatch.setattr(server, "MERKLE_APPEND_ATTEMPTS", 0)
+        await server.append_merkle_leaf("BATCH-1", fingerprints[1])
+        monkeypatch.setattr(server, "MERKLE_APPEND_ATTEMPTS", 10)
+        assert (await server_db.merkle_trees.find_one({"_id": "BATCH-1"}))["backlog"] == [fingerprints[1]]
+
+        await server.append_merkle_leaf("BATCH-1", fingerprints[2])
+        await assert_complete_tree(server, server_db, "BATCH-1", fingerprints)
+        assert await stored_leaves(server_db, "BATCH-1") == fingerprints
+
+    asyncio.run(scenario())
+
+
+def test_resumed_write_does_not_append_twice(server_db, monkeypatch):
+    import server
+
+    async def scenario():
+        await prepare(server_db)
+        await ensure_indexes(server_db, [spec for spec in INDEXES if spec.collection == "quality_tests"])
+        record = server.dashboard_stats.record
+
+        async def fail(*args):
+            raise ConnectionError("stats unavailable")
+
+        monkeypatch.setattr(server.dashboard_stats, "record", fail)
+        with pytest.raises(ConnectionError):
+            await server.upsert_fingerprinted(server_db.quality_tests, {"id": "QT-1", "product_id": "BATCH-1"}, "BATCH-1")
+        monkeypatch.setattr(server.dashboard_stats, "record", record)
+        await server.upsert_fingerprinted(server_db.quality_tests, {"id": "QT-1", "product_id": "BATCH-1"}, "BATCH-1")
+        stored = await server_db.quality_tests.find_one({"id": "QT-1"})
+        assert "aggregates_pending" not in stored
+        await assert_complete_tree(server, server_db, "BATCH-1", [stored["digital_fingerprint"]])
+
+    asyncio.run(scenario())
+
+
+def test_fallback_root_uses_insertion_order(server_db):
+    import server
+
+    async def scenario():
+        await prepare(server_db)
+        # Interleave document types so type order and insertion order differ
+        await server.insert_fingerprinted(server_db.quality_tests, {"id": "QT-1", "product_id": "BATCH-1"}, "BATCH-1")
+        await server.insert_fingerprinted(server_db.collection_events, {"id": "COLL-1", "product_id": "BATCH-1"}, "BATCH-1")
+        await server.insert_fingerprinted(server_db.products, {"id": "PROD-1", "batch_id": "BATCH-1"}, "BATCH-1")
+        await server.insert_fingerprinted(server_db.processing_steps, {"id": "PROC-1", "product_id": "BATCH-1"}, "BATCH-1")
+        await server.insert_fingerprinted(server_db.collection_events, {"id": "COLL-2", "product_id": "BATCH-1"}, "BATCH-1")
+        incremental = (await server.trace_product("BATCH-1"))["digital_fingerprints"]["merkle_root"]
+        # Without the stored state the trace recomputes the root from the documents
+        await server_db.merkle_trees.delete_many({})
+        return incremental, (await server.trace_product("BATCH-1"))["digital_fingerprints"]["merkle_root"]
+
+    incremental, recomputed = asyncio.run(scenario())
+    assert recomputed == incremental
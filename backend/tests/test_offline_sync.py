@@ -0,0 +1,184 @@
+"""Bulk offline sync (server.sync_offline_collections) vs storing the same records one at a time"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from services.index_manager import INDEXES, ensure_indexes
+
+GENERATED_FIELDS = ("_id", "id", "product_id", "timestamp", "blockchain_hash", "digital_fingerprint")
+
+
+def offline_collections(server, count: int, prefix: str = "L"):
+    return [
+        server.OfflineCollection(
+            local_id=f"{prefix}{i}", species=("Tulsi", "Ashwagandha", "Brahmi")[i % 3], quantity_kg=1.5 + i,
+            gps_lat=12.97 + i / 1000, gps_lon=77.59, collected_at=f"2026-10-18T06:{i % 60:02d}:00Z", notes=f"plot {i}"
+        )
+        for i in range(count)
+    ]
+
+
+async def legacy_sync(server, collector_id: str, collections) -> list:
+    """The same records stored the pre-bulk way: one insert, chain write and counter update each"""
+    results = []
+    for collection in collections:
+        event = {
+            "id": str(uuid.uuid4()),
+            "local_id": collection.local_id,
+            "product_id": f"HB-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}",
+            "event_type": "COLLECTION",
+            "species_name": collection.species,
+            "quantity_kg": collection.quantity_kg,
+            "gps": {"lat": collection.gps_lat, "lon": collection.gps_lon},
+            "collector_id": collector_id,
+            "timestamp": datetime.now(timezone.utc),
+            "collected_at": collection.collected_at,
+            "notes": collection.notes or "",
+            "is_offline_sync": True,
+            "blockchain_hash": ""
+        }
+        event["blockchain_hash"] = server.calculate_hash({k: v for k, v in event.items() if k != "blockchain_hash"})
+        await server.insert_fingerprinted(server.db.collection_events, event, event["product_id"])
+        await server.create_blockchain_transaction(event["product_id"], "offline_collection", server.without_mongo_id(event))
+        await server.db.collectors.update_one({"collector_id": collector_id}, {"$inc": {"total_collections": 1}})
+        results.append({"local_id": collection.local_id, "server_id": event["id"],
+                        "product_id": event["product_id"], "status": "success"})
+    return results
+
+
+async def prepare(db):
+    await ensure_indexes(db, [spec for spec in INDEXES if spec.collection in ("collection_events", "blockchain_transactions")])
+    await db.collectors.insert_one({"collector_id": "farmer-1", "total_collections": 0})
+
+
+async def stored_state(db) -> dict:
+    events = await db.collection_events.find({}).to_list(None)
+    return {
+        "events": sorted(({k: v for k, v in e.items() if k not in GENERATED_FIELDS} for e in events),
+                         key=lambda e: e["local_id"]),
+        "chains": sorted([tx["block_index"], tx["transaction_type"]] for tx in await db.blockchain_transactions.find({}).to_list(None)),
+        "collector": (await db.collectors.find_one({"collector_id": "farmer-1"}))["total_collections"],
+        "stats": {k: v for k, v in (await db.stats.find_one({}) or {}).items() if k != "_id"},
+        "rollups": sorted(str({k: v for k, v in r.items() if k != "_id"}) for r in await db.rollups.find({}).to_list(None)),
+        "merkle_trees": await db.merkle_trees.count_documents({}),
+    }
+
+
+def test_bulk_sync_stores_the_same_state_as_per_record_writes(server_db, monkeypatch):
+    import server
+    from mongomock_motor import AsyncMongoMockClient
+
+    async def scenario():
+        await prepare(server_db)
+        response = await server.sync_offline_collections("farmer-1", offline_collections(server, 25))
+        bulk = await stored_state(server_db)
+
+        legacy_db = AsyncMongoMockClient()["herblock_legacy"]
+        for target, attribute in ((server, "db"), (server.dashboard_stats, "db")):
+            monkeypatch.setattr(target, attribute, legacy_db)
+        monkeypatch.setattr(server.rollup_engine, "collection", legacy_db.rollups)
+        await prepare(legacy_db)
+        legacy_results = await legacy_sync(server, "farmer-1", offline_collections(server, 25))
+        return response, bulk, legacy_results, await stored_state(legacy_db)
+
+    response, bulk, legacy_results, legacy = asyncio.run(scenario())
+    assert response["success"]
+    assert [r["local_id"] for r in response["results"]] == [r["local_id"] for r in legacy_results]
+    assert {r["status"] for r in response["results"]} == {"success"}
+    assert bulk == legacy
+    assert bulk["collector"] == 25 and bulk["stats"]["total_collections"] == 25
+
+
+def test_retried_sync_is_not_stored_twice(server_db):
+    import server
+
+    async def scenario():
+        await prepare(server_db)
+        first = await server.sync_offline_collections("farmer-1", offline_collections(server, 10))
+        # The retry repeats the batch, with one new record and a local duplicate
+        retry = offline_collections(server, 11)
+        retry.append(retry[-1])
+        second = await server.sync_offline_collections("farmer-1", retry)
+        return first, second, retry, await stored_state(server_db)
+
+    first, second, retry, state = asyncio.run(scenario())
+    assert len(state["events"]) == 11 and state["collector"] == 11 and len(state["chains"]) == 11
+    by_local_id = {r["local_id"]: r for r in second["results"]}
+    for original in first["results"]:
+        replay = by_local_id[original["local_id"]]
+        assert replay["duplicate"] and replay["server_id"] == original["server_id"]
+    assert "duplicate" not in by_local_id["L10"]
+    assert [r["local_id"] for r in second["results"]] == [c.local_id for c in retry]
+
+
+def test_rejected_photo_fails_only_its_record(server_db):
+    import server
+
+    async def scenario():
+        await prepare(server_db)
+        collections = offline_collections(server, 3)
+        collections[1].photo_sha256 = "not-a-digest"
+        return await server.sync_offline_collections("farmer-1", collections), await stored_state(server_db)
+
+    response, state = asyncio.run(scenario())
+    assert not response["success"]
+    assert [r["status"] for r in response["results"]] == ["success", "error", "success"]
+    assert [e["local_id"] for e in state["events"]] == ["L0", "L2"]
+
+
+def test_session_is_not_completed_while_a_chunk_is_processing(server_db):
+    import server
+    from fastapi import HTTPException
+
+    async def scenario():
+        await prepare(server_db)
+        # total_chunks unknown: only in-flight claims can show the session is unfinished
+        session = await server.open_sync_session(server.SyncSessionOpen(collector_id="farmer-1"))
+        session_id = session["session_id"]
+        await server.upload_sync_chunk(session_id, 0, server.SyncChunk(collections=offline_collections(server, 2)))
+        await server_db.sync_chunks.insert_one({
+            "_id": f"{session_id}:1", "session_id": session_id, "seq": 1,
+            "status": "processing", "received_at": datetime.now(timezone.utc)
+        })
+        try:
+            await server.complete_sync_session(session_id)
+        except HTTPException as e:
+            refused = e
+        reopened = (await server_db.sync_sessions.find_one({"_id": session_id}))["status"]
+        await server_db.sync_chunks.delete_one({"_id": f"{session_id}:1"})
+        await server.upload_sync_chunk(session_id, 1, server.SyncChunk(collections=offline_collections(server, 3, prefix="M")))
+        return refused, reopened, await server.complete_sync_session(session_id)
+
+    refused, reopened, completed = asyncio.run(scenario())
+    assert refused.status_code == 409 and refused.detail == {"error": "chunks_processing", "processing_chunks": [1]}
+    assert reopened == "open"
+    assert completed["status"] == "completed" and len(completed["results"]) == 5
+
+
+def test_chunk_claimed_while_completing_is_refused(server_db, monkeypatch):
+    import server
+    from fastapi import HTTPException
+
+    async def scenario():
+        await prepare(server_db)
+        session = await server.open_sync_session(server.SyncSessionOpen(collector_id="farmer-1"))
+        session_id = session["session_id"]
+        # The upload read the session as open, then completion closed it before the claim
+        get_sync_session = server.get_sync_session
+
+        async def read_then_complete(sid):
+            snapshot = await get_sync_session(sid)
+            monkeypatch.setattr(server, "get_sync_session", get_sync_session)
+            await server.complete_sync_session(sid)
+            return snapshot
+
+        monkeypatch.setattr(server, "get_sync_session", read_then_complete)
+        try:
+            await server.upload_sync_chunk(session_id, 0, server.SyncChunk(collections=offline_collections(server, 2)))
+        except HTTPException as e:
+            return e, await server_db.sync_chunks.count_documents({}), await server_db.collection_events.count_documents({})
+
+    refused, chunks, events = asyncio.run(scenario())
+    assert refused.status_code == 409 and "completed" in refused.detail
+    assert chunks == 0 and events == 0
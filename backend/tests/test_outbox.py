@@ -0,0 +1,224 @@
+"""Tests for services/outbox.py and the outbox commit handlers in server.py"""
+
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from services.index_manager import INDEXES, ensure_indexes
+from services.outbox import BlockchainOutbox, OutboxHandler, COMMITTED, PENDING, PROCESSING
+
+
+async def noop_store(entry, result):
+    pass
+
+
+def test_lease_is_renewed_while_handler_runs(mock_db):
+    async def scenario():
+        async def slow(entry):
+            await asyncio.sleep(0.35)
+            return {"ok": True}
+
+        outbox = BlockchainOutbox(mock_db, {"slow": OutboxHandler(slow, noop_store)}, lease_seconds=0.15)
+        entry = await outbox.enqueue("slow", {"id": "COLL-1"})
+        claimed = await outbox._claim()
+        task = asyncio.ensure_future(outbox._process(claimed))
+
+        await asyncio.sleep(0.25)
+        # Past the original lease, but renewed: another worker cannot reclaim it
+        assert await outbox._claim() is None
+        await task
+        return await outbox.get(entry["tx_ref"])
+
+    stored = asyncio.run(scenario())
+    assert stored["status"] == COMMITTED
+    assert stored["attempts"] == 1
+    assert stored["lease_token"] is None
+
+
+def test_stale_worker_cannot_overwrite_reclaimed_entry(mock_db):
+    async def scenario():
+        calls = []
+
+        async def invoke(entry):
+            calls.append(entry["lease_token"])
+            return {"worker": len(calls)}
+
+        outbox = BlockchainOutbox(mock_db, {"collection": OutboxHandler(invoke, noop_store)})
+        entry = await outbox.enqueue("collection", {"id": "COLL-1"})
+        stale = await outbox._claim()
+
+        # The first worker stalls past its lease and a second worker reclaims the entry
+        await mock_db.outbox.update_one(
+            {"tx_ref": entry["tx_ref"]},
+            {"$set": {"lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        fresh = await outbox._claim()
+        assert fresh["status"] == PROCESSING and fresh["lease_token"] != stale["lease_token"]
+
+        await outbox._process(fresh)
+        await outbox._process(stale)
+        return await outbox.get(entry["tx_ref"])
+
+    stored = asyncio.run(scenario())
+    assert stored["status"] == COMMITTED
+    assert stored["result"] == {"worker": 1}
+
+
+def test_retry_after_store_failure_does_not_invoke_again(mock_db):
+    async def scenario():
+        invokes, stores = [], []
+
+        async def invoke(entry):
+            invokes.append(entry["tx_ref"])
+            return {"collection_id": entry["payload"]["id"]}
+
+        async def store(entry, result):
+            stores.append(result)
+            if len(stores) == 1:
+                raise ConnectionError("read model unavailable")
+
+        outbox = BlockchainOutbox(mock_db, {"collection": OutboxHandler(invoke, store)})
+        entry = await outbox.enqueue("collection", {"id": "COLL-1"})
+        await outbox._process(await outbox._claim())
+        after_failure = await outbox.get(entry["tx_ref"])
+
+        await mock_db.outbox.update_one({"tx_ref": entry["tx_ref"]}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+        await outbox._process(await outbox._claim())
+        return after_failure, await outbox.get(entry["tx_ref"]), invokes, stores
+
+    after_failure, stored, invokes, stores = asyncio.run(scenario())
+    assert after_failure["status"] == PENDING
+    assert after_failure["ledger_result"] == {"collection_id": "COLL-1"}
+    assert stored["status"] == COMMITTED and stored["attempts"] == 2
+    assert len(invokes) == 1
+    assert stores == [{"collection_id": "COLL-1"}] * 2
+
+
+def test_store_bug_after_ledger_commit_is_retried_not_rejected(mock_db):
+    from services.outbox import FAILED
+
+    async def scenario():
+        invokes = []
+
+        async def invoke(entry):
+            invokes.append(entry["tx_ref"])
+            return {"collection_id": entry["payload"]["id"]}
+
+        async def store(entry, result):
+            raise KeyError("product_id")  # a bug in the read-model write, not a bad entry
+
+        outbox = BlockchainOutbox(mock_db, {"collection": OutboxHandler(invoke, store)}, max_attempts=2)
+        entry = await outbox.enqueue("collection", {"id": "COLL-1"})
+        await outbox._process(await outbox._claim())
+        after_first = await outbox.get(entry["tx_ref"])
+
+        await mock_db.outbox.update_one({"tx_ref": entry["tx_ref"]}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+        await outbox._process(await outbox._claim())
+        return after_first, await outbox.get(entry["tx_ref"]), invokes
+
+    after_first, stored, invokes = asyncio.run(scenario())
+    assert after_first["status"] == PENDING and after_first["next_attempt_at"] is not None
+    assert stored["status"] == FAILED and stored["attempts"] == 2
+    # The ledger commit is kept for repair, and was not submitted twice
+    assert stored["ledger_result"] == {"collection_id": "COLL-1"}
+    assert len(invokes) == 1
+
+
+def test_upsert_fingerprinted_stores_once_and_finishes_aggregates(server_db, monkeypatch):
+    import server
+    recorded = []
+
+    async def record_stored(collection, docs, product_keys, resumed=False):
+        recorded.append((docs[0]["id"], resumed))
+        if len(recorded) == 1:
+            raise ConnectionError("merkle update failed")
+
+    monkeypatch.setattr(server, "record_stored", record_stored)
+
+    async def scenario():
+        await ensure_indexes(server_db, [spec for spec in INDEXES if spec.collection == "collection_events"])
+        doc = {"id": "COLL-1", "product_id": "BATCH-1", "quantity_kg": 5}
+        try:
+            await server.upsert_fingerprinted(server_db.collection_events, dict(doc), "BATCH-1")
+        except ConnectionError:
+            pass
+        # Retry: the document is not stored twice, but the aggregates are finished
+        await server.upsert_fingerprinted(server_db.collection_events, dict(doc), "BATCH-1")
+        await server.upsert_fingerprinted(server_db.collection_events, dict(doc), "BATCH-1")
+        return await server_db.collection_events.find({"id": "COLL-1"}).to_list(None)
+
+    stored = asyncio.run(scenario())
+    assert len(stored) == 1
+    assert "aggregates_pending" not in stored[0]
+    assert recorded == [("COLL-1", False), ("COLL-1", True)]
+
+
+def test_ledger_invoke_treats_duplicate_on_retry_as_committed(monkeypatch):
+    import server
+
+    async def record_collection(payload):
+        raise Exception('Blockchain invoke error: chaincode response 500, the asset COLL-1 already exists')
+
+    monkeypatch.setattr(server.fabric_service, "record_collection", record_collection)
+    entry = {"tx_ref": "TX-1", "attempts": 2, "payload": {"id": "COLL-1", "product_id": "BATCH-1"}}
+    result = asyncio.run(server.invoke_collection(entry))
+    assert result["success"] and result["already_on_ledger"]
+    assert result["collection_id"] == "COLL-1" and result["product_id"] == "BATCH-1"
+
+    # On the first attempt it is a genuine ID conflict
+    entry["attempts"] = 1
+    try:
+        asyncio.run(server.invoke_collection(entry))
+    except Exception as e:
+        assert "already exists" in str(e)
+    else:
+        raise AssertionError("first-attempt duplicate was accepted")
+
+
+def test_error_classification(mock_db):
+    from services.circuit_breaker import CircuitOpenError
+    from services.outbox import FAILED, REJECTED, OutboxRejected
+
+    errors = {
+        "rejected": OutboxRejected("status:500 message:INVALID LOCATION"),
+        "malformed": KeyError("product_id"),
+        "unavailable": CircuitOpenError({"consecutive_failures": 5}),
+        "transient": ConnectionError("peer reset"),
+    }
+
+    async def scenario():
+        async def invoke(entry):
+            raise errors[entry["payload"]["case"]]
+
+        outbox = BlockchainOutbox(mock_db, {"kind": OutboxHandler(invoke, noop_store)},
+                                  max_attempts=2, unavailable_errors=(CircuitOpenError,))
+        refs = {case: (await outbox.enqueue("kind", {"case": case}))["tx_ref"] for case in errors}
+        for _ in range(4):
+            await mock_db.outbox.update_many({}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+            while (entry := await outbox._claim()) is not None:
+                await outbox._process(entry)
+        return {case: await outbox.get(ref) for case, ref in refs.items()}
+
+    entries = asyncio.run(scenario())
+    assert entries["rejected"]["status"] == REJECTED and entries["rejected"]["attempts"] == 1
+    assert entries["malformed"]["status"] == REJECTED
+    # Deferred four times without using up any of its two attempts
+    assert entries["unavailable"]["status"] == PENDING
+    assert entries["unavailable"]["attempts"] == 0 and entries["unavailable"]["deferrals"] == 4
+    assert entries["transient"]["status"] == FAILED and entries["transient"]["attempts"] == 2
+
+
+def test_ledger_invoke_rejects_chaincode_errors(monkeypatch):
+    import server
+    from services.outbox import OutboxRejected
+
+    async def record_quality_test(payload):
+        raise Exception("Failed to record quality test: Blockchain invoke error: status:500 message:product PROD-9 does not exist")
+
+    monkeypatch.setattr(server.fabric_service, "record_quality_test", record_quality_test)
+    entry = {"tx_ref": "TX-1", "attempts": 1, "payload": {"id": "QT-1", "product_id": "PROD-9"}}
+    try:
+        asyncio.run(server.invoke_quality_test(entry))
+    except OutboxRejected as e:
+        assert "does not exist" in str(e)
+    else:
+        raise AssertionError("chaincode error was not rejected")
@@ -0,0 +1,110 @@
+"""Every registered query shape must be served by an index (services/index_manager.py)"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from services.index_manager import (
+    INDEXES, QUERY_SHAPES, QueryPlanError, QueryShape, ensure_indexes, find_collscans, verify_query_plans
+)
+
+
+def filter_branches(query: dict) -> list:
+    """The conjunctions the planner serves separately: one per $or branch"""
+    common = {k: v for k, v in query.items() if k != "$or"}
+    return [{**common, **branch} for branch in query.get("$or", [])] or [common]
+
+
+def partial_filter_satisfied(spec, branch: dict) -> bool:
+    partial = spec.options.get("partialFilterExpression", {})
+    return all(field in branch for field in partial)
+
+
+def serving_index(shape: QueryShape, branch: dict):
+    """The declared index with the longest key prefix over the branch's fields (or the sort, for {})"""
+    fields = set(branch) or ({shape.sort[0][0]} if shape.sort else set())
+    best, best_prefix = None, 0
+    for spec in INDEXES:
+        if spec.collection != shape.collection or not partial_filter_satisfied(spec, branch):
+            continue
+        prefix = 0
+        while prefix < len(spec.keys) and spec.keys[prefix][0] in fields:
+            prefix += 1
+        if prefix > best_prefix:
+            best, best_prefix = spec, prefix
+    return best
+
+
+@pytest.mark.parametrize("shape", QUERY_SHAPES, ids=lambda shape: shape.name)
+def test_every_query_branch_has_an_index_prefix(shape):
+    for branch in filter_branches(shape.filter):
+        assert serving_index(shape, branch) is not None, f"{shape.name}: no index leads with a field of {sorted(branch)}"
+
+
+def test_outbox_claim_shape_is_registered():
+    claim = next(shape for shape in QUERY_SHAPES if shape.name == "outbox.claim")
+    served_by = [serving_index(claim, branch).keys for branch in filter_branches(claim.filter)]
+    assert served_by == [[("status", 1), ("next_attempt_at", 1)], [("status", 1), ("lease_until", 1)]]
+
+
+class ExplainCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, *args):
+        return self
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+
+class ExplainDatabase:
+    """Returns a canned winning plan for every find()"""
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def __getitem__(self, name):
+        return self
+
+    def find(self, query):
+        return ExplainCursor(self.plan)
+
+
+def test_find_collscans_sees_a_scan_under_an_or():
+    plan = {"stage": "SUBPLAN", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "IXSCAN", "indexName": "status_1_next_attempt_at_1"},
+        {"stage": "COLLSCAN"}
+    ]}}}
+    shape = QueryShape("outbox.claim", "outbox", {"$or": [{"a": 1}, {"b": 1}]}, sort=[("a", 1)])
+    problems = asyncio.run(find_collscans(ExplainDatabase(plan), [shape]))
+    assert problems == [{"query": "outbox.claim", "collection": "outbox",
+                         "stages": ["SUBPLAN", "FETCH", "OR", "COLLSCAN", "IXSCAN"]}]
+    with pytest.raises(QueryPlanError, match="outbox.claim"):
+        asyncio.run(verify_query_plans(ExplainDatabase(plan), [shape]))
+
+    indexed = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+    assert asyncio.run(find_collscans(ExplainDatabase(indexed), [shape])) == []
+
+
+def test_no_collscan_against_mongodb():
+    """Explains every shape with the real query planner (needs a MongoDB server)"""
+    url = os.environ.get("HERBLOCK_TEST_MONGO_URL")
+    if not url:
+        pytest.skip("set HERBLOCK_TEST_MONGO_URL to explain query shapes against a real MongoDB")
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(url, serverSelectionTimeoutMS=5000)
+        name = f"herblock_plans_{uuid.uuid4().hex[:8]}"
+        try:
+            results = await ensure_indexes(client[name])
+            assert all(status == "ok" for status in results.values()), results
+            await verify_query_plans(client[name])
+        finally:
+            await client.drop_database(name)
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,131 @@
+"""One-time rollup backfill (RollupEngine.backfill in services/rollups.py)"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from services.rollups import BACKFILL_MARKER_ID, RollupEngine
+from tests.test_chain_concurrency import InterleavingDatabase
+
+WHEN = datetime(2026, 10, 18, 6, 0, tzinfo=timezone.utc)
+
+
+def events(count: int, prefix: str = "COLL"):
+    return [{"id": f"{prefix}-{i}", "species_name": "Tulsi", "quantity_kg": 2.0, "timestamp": WHEN} for i in range(count)]
+
+
+async def month_total(engine: RollupEngine) -> dict:
+    return (await engine.query("all", period="month"))["totals"]["all"]
+
+
+class LiveWriteAfterCutoff:
+    """collection_events proxy: an event is stored and counted live just after the rebuild picks its cutoff"""
+
+    def __init__(self, source, engine: RollupEngine):
+        self._source = source
+        self._engine = engine
+
+    async def find_one(self, *args, **kwargs):
+        newest = await self._source.find_one(*args, **kwargs)
+        live = events(1, prefix="LIVE")
+        await self._source.insert_many(live)
+        await self._engine.record_collection(live)
+        return newest
+
+    def __getattr__(self, name):
+        return getattr(self._source, name)
+
+
+def test_backfill_runs_even_if_a_rejection_landed_first(mock_db):
+    engine = RollupEngine(mock_db)
+
+    async def scenario():
+        await mock_db.collection_events.insert_many(events(5))
+        await engine.record_rejection({"species_name": "Tulsi", "timestamp": WHEN})
+        processed = await engine.backfill()
+        return processed, await month_total(engine)
+
+    processed, total = asyncio.run(scenario())
+    assert processed == 5
+    assert total["count"] == 5 and total["geo_rejected"] == 1
+
+
+def test_concurrent_workers_backfill_once(mock_db):
+    workers = [RollupEngine(InterleavingDatabase(mock_db, seed=i)) for i in range(4)]
+
+    async def scenario():
+        await mock_db.collection_events.insert_many(events(7))
+        results = await asyncio.gather(*(worker.backfill() for worker in workers))
+        # Later restarts see the completed marker
+        return results, await workers[0].backfill(), await month_total(RollupEngine(mock_db))
+
+    results, restart, total = asyncio.run(scenario())
+    assert sorted(results, key=str) == [7, None, None, None]
+    assert restart is None
+    assert total["count"] == 7
+
+
+def test_live_writes_during_backfill_are_counted_once(mock_db):
+    engine = RollupEngine(mock_db)
+    engine.source = LiveWriteAfterCutoff(mock_db.collection_events, engine)
+
+    async def scenario():
+        await mock_db.collection_events.insert_many(events(4))
+        processed = await engine.backfill()
+        return processed, await month_total(engine)
+
+    processed, total = asyncio.run(scenario())
+    assert processed == 4
+    assert total["count"] == 5
+
+
+def test_backfill_skips_rebuild_when_rollups_already_account_for_events(mock_db):
+    engine = RollupEngine(mock_db)
+
+    async def scenario():
+        stored = events(3)
+        await mock_db.collection_events.insert_many(stored)
+        await engine.record_collection(stored)
+        return await engine.backfill(), await mock_db.rollups.find_one({"_id": BACKFILL_MARKER_ID})
+
+    processed, marker = asyncio.run(scenario())
+    assert processed is None and marker["completed_at"]
+
+
+def test_stale_backfill_is_taken_over(mock_db):
+    engine = RollupEngine(mock_db)
+
+    async def scenario():
+        await mock_db.collection_events.insert_many(events(2))
+        # A worker that died mid-backfill two hours ago
+        await mock_db.rollups.insert_one({"_id": BACKFILL_MARKER_ID, "started_at": datetime.now(timezone.utc) - timedelta(hours=2)})
+        return await engine.backfill()
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_offline_events_count_on_the_day_they_were_collected(mock_db):
+    engine = RollupEngine(mock_db)
+    # Collected in the field over two earlier days, synced on WHEN
+    synced = [
+        {"id": "OFF-1", "species_name": "Tulsi", "quantity_kg": 1.0, "timestamp": WHEN,
+         "collected_at": "2026-10-11T09:30:00Z", "is_offline_sync": True},
+        {"id": "OFF-2", "species_name": "Tulsi", "quantity_kg": 1.0, "timestamp": WHEN,
+         "collected_at": "2026-09-30T23:00:00-02:00", "is_offline_sync": True},
+        {"id": "OFF-3", "species_name": "Tulsi", "quantity_kg": 1.0, "timestamp": WHEN,
+         "collected_at": "not a date", "is_offline_sync": True},
+    ]
+
+    async def days() -> dict:
+        result = await engine.query("all", period="day")
+        return {bucket["bucket"]: bucket["count"] for bucket in result["buckets"]}
+
+    async def scenario():
+        await mock_db.collection_events.insert_many([dict(event) for event in synced])
+        await engine.record_collection(synced)
+        live = await days()
+        await engine.rebuild()
+        return live, await days()
+
+    live, rebuilt = asyncio.run(scenario())
+    # The unparseable date falls back to the sync time
+    assert live == rebuilt == {"2026-10-01": 1, "2026-10-11": 1, "2026-10-18": 1}
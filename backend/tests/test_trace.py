@@ -0,0 +1,159 @@
+"""Trace fan-out (server.trace_product) returns the same documents as the old sequential lookups"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+
+class DelayedDatabase:
+    """Database proxy that adds a fixed round-trip delay to every operation"""
+
+    def __init__(self, db, delay: float):
+        self._db = db
+        self.delay = delay
+        self.round_trips = 0
+
+    def __getitem__(self, name):
+        return DelayedCollection(self, self._db[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class DelayedCollection:
+    def __init__(self, owner: DelayedDatabase, collection):
+        self._owner = owner
+        self._collection = collection
+
+    async def _round_trip(self, result):
+        self._owner.round_trips += 1
+        await asyncio.sleep(self._owner.delay)
+        return await result
+
+    def find(self, *args, **kwargs):
+        return DelayedCursor(self, self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+        return lambda *args, **kwargs: self._round_trip(attribute(*args, **kwargs))
+
+
+class DelayedCursor:
+    def __init__(self, collection: DelayedCollection, cursor):
+        self._collection = collection
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def to_list(self, length):
+        return self._collection._round_trip(self._cursor.to_list(length))
+
+
+async def seed_trace(server, events_per_kind: int = 5, transactions: int = 5) -> dict:
+    """One product with collection events, processing steps, quality tests and chain transactions"""
+    db = server.db
+    product = {"id": "PROD-1", "batch_id": "BATCH-1", "product_name": "Ashwagandha Churna", "mrp": 120}
+    await server.insert_fingerprinted(db.products, product, "BATCH-1")
+    for i in range(events_per_kind):
+        # Events are keyed by the batch id or, for some sources, by the product id
+        key = "BATCH-1" if i % 2 == 0 else "PROD-1"
+        await server.insert_fingerprinted(db.collection_events, {"id": f"COLL-{i}", "product_id": key, "quantity_kg": i}, key)
+        await server.insert_fingerprinted(db.processing_steps, {"id": f"PROC-{i}", "product_id": key, "step": "drying"}, key)
+        await server.insert_fingerprinted(db.quality_tests, {"id": f"QT-{i}", "product_id": key, "pass_fail": "pass"}, key)
+    for i in range(transactions):
+        await server.create_blockchain_transaction("PROD-1", "formulation", {"step": i})
+    # A hardware intake event with no product record
+    await server.insert_fingerprinted(db.collection_events, {
+        "id": "HW-1", "product_id": "HW-BATCH-1", "source": "hardware_device", "species_name": "Tulsi",
+        "collector_name": "Field Unit 7", "quantity_kg": 2.5, "device_id": "hb-device-1"
+    }, "HW-BATCH-1")
+    return product
+
+
+async def legacy_trace_documents(db, trace_id: str) -> dict:
+    """The documents the pre-fan-out /api/trace handler read, one sequential round trip at a time"""
+    product = await db.products.find_one({"$or": [{"id": trace_id}, {"batch_id": trace_id}]})
+    if not product:
+        hw_event = await db.collection_events.find_one({"$or": [{"product_id": trace_id}, {"id": trace_id}]})
+        if not hw_event:
+            return None
+        product = {"id": trace_id, "batch_id": trace_id, "source": "hardware_device"}
+    key = product.get("batch_id", product.get("id", trace_id))
+    query = {"$or": [{"product_id": key}, {"product_id": trace_id}]}
+    return {
+        "product": product,
+        "collection_events": await db.collection_events.find(query).to_list(1000),
+        "processing_steps": await db.processing_steps.find(query).to_list(1000),
+        "quality_tests": await db.quality_tests.find(query).to_list(1000),
+        "blockchain_transactions": await db.blockchain_transactions.find({"product_id": product["id"]}).sort("block_index", 1).to_list(1000),
+    }
+
+
+def comparable(docs):
+    docs = [{k: v for k, v in doc.items() if k != "_id"} for doc in docs]
+    return sorted(docs, key=lambda doc: (doc.get("id", ""), doc.get("block_index", 0)))
+
+
+@pytest.mark.parametrize("trace_id", ["PROD-1", "BATCH-1"])
+def test_trace_returns_the_same_documents_as_sequential_lookups(server_db, trace_id):
+    import server
+
+    async def scenario():
+        await seed_trace(server)
+        return await server.trace_product(trace_id), await legacy_trace_documents(server_db, trace_id)
+
+    trace, legacy = asyncio.run(scenario())
+    assert "_id" not in trace["product"]
+    assert trace["product"] == {k: v for k, v in legacy["product"].items() if k != "_id"}
+    for field in ("collection_events", "processing_steps", "quality_tests", "blockchain_transactions"):
+        assert comparable(trace[field]) == comparable(legacy[field]), field
+    # By product id both keys match; by batch id only the batch-keyed events do
+    events = 5 if trace_id == "PROD-1" else 3
+    assert len(trace["collection_events"]) == events and len(trace["blockchain_transactions"]) == 5
+    assert trace["digital_fingerprints"]["total_events"] == 3 * events
+
+
+def test_trace_synthesizes_product_from_hardware_event(server_db):
+    import server
+
+    async def scenario():
+        await seed_trace(server)
+        return await server.trace_product("HW-BATCH-1")
+
+    trace = asyncio.run(scenario())
+    assert trace["product"]["source"] == "hardware_device"
+    assert trace["product"]["manufacturer"] == "Field Device — Field Unit 7"
+    assert [event["id"] for event in trace["collection_events"]] == ["HW-1"]
+    # The synthesized product is the intake event: same fingerprint, counted once
+    assert trace["product"]["digital_fingerprint"] == trace["collection_events"][0]["digital_fingerprint"]
+
+
+def test_trace_unknown_product_is_404(server_db):
+    import server
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.trace_product("NOPE"))
+    assert raised.value.status_code == 404
+
+
+def test_trace_fans_out_in_two_round_trip_phases(server_db, monkeypatch):
+    import server
+
+    async def scenario():
+        await seed_trace(server)
+        delayed = DelayedDatabase(server_db, delay=0.05)
+        monkeypatch.setattr(server, "db", delayed)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await server.trace_product("BATCH-1")
+        return loop.time() - started, delayed.round_trips
+
+    elapsed, round_trips = asyncio.run(scenario())
+    # product + hardware lookup, then events x3 + transactions + merkle state
+    assert round_trips == 7
+    # Two phases of concurrent round trips, not seven sequential ones
+    assert elapsed < 0.05 * 4
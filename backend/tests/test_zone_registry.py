@@ -0,0 +1,144 @@
+"""ZoneRegistry (services/zone_registry.py): ETags, hot reload and keeping the last good zones"""
+
+import asyncio
+import json
+import os
+import shutil
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from services.zone_registry import ZoneRegistry, ZoneRegistryError
+
+
+@pytest.fixture
+def zone_file(tmp_path):
+    import server
+    path = tmp_path / "zones.json"
+    shutil.copy(server.ROOT_DIR / "data" / "zones.json", path)
+    return path
+
+
+@pytest.fixture
+def registry(zone_file, monkeypatch):
+    import server
+    registry = ZoneRegistry(zone_file, server.calculate_haversine_distance, reload_interval=0)
+    monkeypatch.setattr(server, "zone_registry", registry)
+    return registry
+
+
+def rewrite(path, edit) -> None:
+    document = json.loads(path.read_text())
+    edit(document)
+    path.write_text(json.dumps(document))
+    # Make the change visible even within one mtime tick
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def zone_request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/api/zones", "headers": headers})
+
+
+def move_tulsi(document) -> None:
+    document["version"] = "2026.10.2"
+    document["species"]["Tulsi"]["regions"] = [{"name": "Kerala", "lat": 10.5, "lon": 76.2, "radius_km": 120}]
+
+
+def test_matching_etag_answers_304(registry):
+    import server
+    etag = registry.current.etag
+
+    async def scenario():
+        fresh = await server.get_zone_catalog(zone_request())
+        revalidated = await server.get_zone_catalog(zone_request(f'W/"other", {etag}'))
+        species = await server.get_approved_zones("Tulsi", zone_request(etag))
+        return fresh, revalidated, species
+
+    fresh, revalidated, species = asyncio.run(scenario())
+    assert fresh.status_code == 200 and fresh.headers["etag"] == etag
+    assert json.loads(fresh.body)["version"] == registry.current.version
+    assert revalidated.status_code == 304 and revalidated.body == b""
+    assert species.status_code == 304 and species.headers["etag"] == etag
+
+
+def test_changed_file_gets_a_new_etag(registry, zone_file):
+    import server
+    old_etag = registry.current.etag
+    assert registry.reload() is False  # nothing changed on disk
+
+    rewrite(zone_file, move_tulsi)
+    assert registry.reload() is True
+    new_etag = registry.current.etag
+    assert new_etag != old_etag and new_etag.startswith('"2026.10.2-')
+
+    async def scenario():
+        return await server.get_approved_zones("Tulsi", zone_request(old_etag))
+
+    response = asyncio.run(scenario())
+    # A client holding the old version gets the new listing, not a 304
+    assert response.status_code == 200 and response.headers["etag"] == new_etag
+    assert [zone["name"] for zone in json.loads(response.body)["zones"]] == ["Kerala"]
+    assert registry.describe()["reloads"] == 1
+
+
+@pytest.mark.parametrize("broken", [
+    "{ not json",
+    json.dumps({"species": {}}),
+    json.dumps({"version": "2026.10.3", "species": {"Tulsi": {"zone": {"center": [20, 78], "max_radius_km": 50}}}}),
+    json.dumps({"version": "2026.10.3", "species": {"Tulsi": {"regions": [{"name": "Kerala"}]}}}),
+])
+def test_malformed_file_keeps_the_previous_zones(registry, zone_file, broken):
+    previous = registry.current
+    zone_file.write_text(broken)
+    with pytest.raises(ZoneRegistryError):
+        registry.reload()
+    assert registry.current is previous
+    assert registry.current.engine.validate_many([26.0], [75.0], ["Ashwagandha"])[0]["valid"]
+
+
+def test_reload_endpoint_reports_a_rejected_file(registry, zone_file, monkeypatch):
+    import server
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    version = registry.current.version
+    zone_file.write_text("{ not json")
+
+    async def scenario():
+        with pytest.raises(HTTPException) as rejected:
+            await server.reload_zones(admin_key="test-admin")
+        return rejected.value
+
+    assert asyncio.run(scenario()).status_code == 400
+    assert registry.current.version == version
+
+
+def test_background_reload_picks_up_changes_and_survives_bad_files(zone_file):
+    import server
+    registry = ZoneRegistry(zone_file, server.calculate_haversine_distance, reload_interval=0.01)
+
+    async def wait_for(condition) -> None:
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("registry did not reload")
+
+    async def scenario():
+        registry.start()
+        try:
+            rewrite(zone_file, move_tulsi)
+            await wait_for(lambda: registry.current.version == "2026.10.2")
+            zone_file.write_text("{ not json")
+            await asyncio.sleep(0.1)
+            served = registry.current.version
+            zone_file.write_text(json.dumps({"version": "2026.10.4", "species": {}}))
+            await wait_for(lambda: registry.current.version == "2026.10.4")
+            return served
+        finally:
+            await registry.stop()
+
+    served = asyncio.run(scenario())
+    # The broken file was skipped; the loop kept running and took the next good one
+    assert served == "2026.10.2"
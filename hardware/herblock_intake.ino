@@ -72,6 +72,27 @@ float moisturePct  = 0.0;
 char  gradeSelected = 0;
 bool  submitted     = false;
 
+// Readings waiting to be sent — kept while WiFi is down, sent as one batch
+#define MAX_PENDING  20
+struct Reading {
+  uint32_t seq;
+  float    weight;
+  float    moisture;
+  char     grade;
+};
+Reading  pending[MAX_PENDING];
+int      pendingCount = 0;
+uint32_t nextSeq      = 0;
+
+// seq restarts at 0 on every boot; the random boot id keeps
+// (device, boot, seq) unique so the server can drop resent readings
+char     bootId[17];
+
+// A batch the server refused outright (4xx other than 408/409/429) is moved
+// here instead of being retried forever; it is dumped to Serial for recovery
+Reading  quarantined[MAX_PENDING];
+int      quarantinedCount = 0;
+
 // ─────────────────────────────────────────────
 //  READ WEIGHT via I2C load cell
 // ─────────────────────────────────────────────
@@ -195,6 +216,8 @@ void setup() {
   Serial.begin(115200);
   delay(500);
   Serial.println("\n===== HerBlock Booting =====");
+  snprintf(bootId, sizeof(bootId), "%08lx%08lx", (unsigned long)esp_random(), (unsigned long)esp_random());
+  Serial.printf("[BOOT] id=%s\n", bootId);
 
   // SPI OLED — init before I2C, no manual SPI.begin()
   if (!display.begin(SSD1306_SWITCHCAPVCC)) {
@@ -292,6 +315,13 @@ void loop() {
     submitToBackend();
   }
 
+  // Retry buffered readings every 10s once WiFi is back
+  static unsigned long lastFlush = 0;
+  if (pendingCount > 0 && millis() - lastFlush > 10000) {
+    flushPending(false);
+    lastFlush = millis();
+  }
+
   delay(200);
 }
 
@@ -299,58 +329,122 @@ void loop() {
 //  SUBMIT TO BACKEND
 // ─────────────────────────────────────────────
 void submitToBackend() {
+  // Queue the reading; if the buffer is full the oldest is dropped
+  if (pendingCount == MAX_PENDING) {
+    memmove(&pending[0], &pending[1], sizeof(Reading) * (MAX_PENDING - 1));
+    pendingCount--;
+  }
+  pending[pendingCount++] = { nextSeq++, weightGrams, moisturePct, gradeSelected };
+
   if (WiFi.status() != WL_CONNECTED) {
-    oledMessage("No WiFi", "Can't submit");
-    flashLED(LED_RED, 3);
-    return;
+    oledMessage("No WiFi", "Buffered " + String(pendingCount));
+    flashLED(LED_RED, 1);
+  } else {
+    oledMessage("Sending...", String(pendingCount) + " reading(s)");
+    flushPending(true);
   }
 
-  oledMessage("Sending...", "Please wait");
+  submitted     = true;
+  gradeSelected = 0;
+  delay(3000);
+  submitted = false;
+  oledDashboard();
+}
+
+// ─────────────────────────────────────────────
+//  SEND BUFFERED READINGS — POST /api/intake/batch
+//  Compact reply (Accept: text/plain), one line per reading:
+//    OK <accepted> <rejected>
+//    <seq>,<A|B|C or R>,<batch_id or GPS|SEASON|ERR>
+//  The Idempotency-Key names the buffer contents, so resending the same
+//  buffer after a lost reply returns the first answer instead of storing
+//  the readings again.
+// ─────────────────────────────────────────────
+bool isRetryable(int code) {
+  // Negative codes are connection errors from HTTPClient
+  return code < 0 || code == 408 || code == 409 || code == 429 || code >= 500;
+}
+
+void quarantinePending(int code) {
+  memcpy(quarantined, pending, sizeof(Reading) * pendingCount);
+  quarantinedCount = pendingCount;
+  pendingCount = 0;
+  Serial.printf("[QUARANTINE] HTTP %d — %d reading(s) set aside (boot %s):\n", code, quarantinedCount, bootId);
+  for (int i = 0; i < quarantinedCount; i++) {
+    Serial.printf("  seq=%lu wt=%.1fg moist=%.1f%% grade=%c\n", (unsigned long)quarantined[i].seq,
+      quarantined[i].weight, quarantined[i].moisture, quarantined[i].grade);
+  }
+}
 
-  String payload = "{";
-  payload += "\"device_id\":\""      + String(DEVICE_ID)      + "\",";
-  payload += "\"herb_type\":\""      + String(HERB_TYPE)       + "\",";
-  payload += "\"weight_grams\":"     + String(weightGrams, 1)  + ",";
-  payload += "\"moisture_percent\":" + String(moisturePct, 1)  + ",";
-  payload += "\"latitude\":"         + String(GPS_LAT, 4)      + ",";
-  payload += "\"longitude\":"        + String(GPS_LON, 4)      + ",";
-  payload += "\"collector_id\":\""   + String(COLLECTOR_ID)    + "\",";
-  payload += "\"quality_grade\":\""  + String(gradeSelected)   + "\",";
-  payload += "\"notes\":\"CMTI DIC 2026 Demo\"";
-  payload += "}";
+void flushPending(bool showResult) {
+  if (pendingCount == 0 || WiFi.status() != WL_CONNECTED) return;
+
+  String payload = "{\"device_id\":\"" + String(DEVICE_ID) + "\",\"boot_id\":\"" + String(bootId) + "\",\"readings\":[";
+  for (int i = 0; i < pendingCount; i++) {
+    if (i > 0) payload += ",";
+    payload += "{\"seq\":"              + String(pending[i].seq)         + ",";
+    payload += "\"herb_type\":\""        + String(HERB_TYPE)              + "\",";
+    payload += "\"weight_grams\":"       + String(pending[i].weight, 1)   + ",";
+    payload += "\"moisture_percent\":"   + String(pending[i].moisture, 1) + ",";
+    payload += "\"latitude\":"           + String(GPS_LAT, 4)             + ",";
+    payload += "\"longitude\":"          + String(GPS_LON, 4)             + ",";
+    payload += "\"collector_id\":\""     + String(COLLECTOR_ID)           + "\",";
+    payload += "\"quality_grade\":\""    + String(pending[i].grade)       + "\",";
+    payload += "\"notes\":\"CMTI DIC 2026 Demo\"}";
+  }
+  payload += "]}";
 
-  String url = "http://" + String(SERVER_IP) + ":" + String(SERVER_PORT) + "/api/intake";
-  Serial.printf("[HTTP] POST → %s\n", url.c_str());
-  Serial.println(payload);
+  String url = "http://" + String(SERVER_IP) + ":" + String(SERVER_PORT) + "/api/intake/batch";
+  Serial.printf("[HTTP] POST → %s (%d readings)\n", url.c_str(), pendingCount);
 
   HTTPClient http;
   http.begin(url);
   http.addHeader("Content-Type", "application/json");
+  http.addHeader("Accept", "text/plain");
   http.addHeader("X-Device-Key",  DEVICE_KEY);
+  String idempotencyKey = String(DEVICE_ID) + "-" + String(bootId) + "-" + String(pending[0].seq)
+                        + "-" + String(pending[pendingCount - 1].seq) + "-" + String(pendingCount);
+  http.addHeader("Idempotency-Key", idempotencyKey);
 
   int    code     = http.POST(payload);
   String response = http.getString();
   http.end();
 
-  Serial.printf("[HTTP] code=%d  response=%s\n", code, response.c_str());
+  Serial.printf("[HTTP] code=%d\n%s", code, response.c_str());
 
-  if (code == 200) {
-    // Quick parse — look for "accepted"
-    if (response.indexOf("accepted") >= 0) {
-      oledMessage("ACCEPTED", "Blockchain OK!");
-      flashLED(LED_GREEN, 3);
-    } else {
-      oledMessage("REJECTED", "GPS/Zone fail");
-      flashLED(LED_RED, 5);
+  if (code != 200 && isRetryable(code)) {
+    // Keep the buffer; it is retried on the next press or flush
+    if (showResult) {
+      oledMessage("HTTP Error", String(code));
+      flashLED(LED_RED, 3);
     }
-  } else {
-    oledMessage("HTTP Error", String(code));
-    flashLED(LED_RED, 3);
+    return;
+  }
+  if (code != 200) {
+    // Resending would fail the same way and block every later reading
+    quarantinePending(code);
+    oledMessage("BATCH HELD", "HTTP " + String(code) + " see serial");
+    flashLED(LED_RED, 5);
+    return;
   }
 
-  submitted     = true;
-  gradeSelected = 0;
-  delay(3000);
-  submitted = false;
-  oledDashboard();
+  // Every reading was answered (accepted or rejected) — clear the buffer
+  uint32_t lastSeq = pending[pendingCount - 1].seq;
+  pendingCount = 0;
+
+  // Find the line for the latest reading: "<seq>,<grade>,..."
+  String prefix = "\n" + String(lastSeq) + ",";
+  int at = response.indexOf(prefix);
+  char grade = at >= 0 ? response.charAt(at + prefix.length()) : 'R';
+
+  if (!showResult) return;
+  if (grade == 'A' || grade == 'B' || grade == 'C') {
+    oledMessage("ACCEPTED", "Grade " + String(grade));
+    flashLED(LED_GREEN, 3);
+  } else {
+    int reasonAt = at >= 0 ? at + prefix.length() + 2 : -1;
+    String reason = reasonAt >= 0 ? response.substring(reasonAt, response.indexOf('\n', reasonAt)) : "ERR";
+    oledMessage("REJECTED", reason + " fail");
+    flashLED(LED_RED, 5);
+  }
 }